@@ -0,0 +1,51 @@
+import numpy as np
+from functools import reduce
+
+#Políticas disponibles para alinear por fecha las series de una cartera:
+#Interseccion: Solo las fechas en las que cotizan todos los activos
+#Union: Todas las fechas en las que cotiza algún activo, rellenando los huecos de cada activo con su último precio conocido. Antes de la primera fecha de
+#cada activo no hay precio conocido, así que esos días quedan vacíos (NaN) en lugar de tomar un precio posterior
+#Habiles: Todos los días hábiles (de lunes a viernes) entre la primera y la última fecha de las series, rellenando igual que en la unión
+politicasAlineacion = ["interseccion", "union", "habiles"]
+
+#Función que devuelve las fechas comunes (datetime64[D], ordenadas) a las que se alinean un conjunto de series, según la política de alineación
+#ListaFechas: Lista con las fechas (ordenadas) de cada serie
+def get_fechas_alineadas(listaFechas, politica="interseccion"):
+    listaFechas = [np.asarray(fechas, dtype='datetime64[D]') for fechas in listaFechas]
+    if politica == "interseccion":
+        return reduce(np.intersect1d, listaFechas)
+    if politica == "union":
+        return np.unique(np.concatenate(listaFechas))
+    #Días hábiles entre la primera fecha de todas las series y la última
+    inicio = min(fechas[0] for fechas in listaFechas)
+    fin = max(fechas[-1] for fechas in listaFechas)
+    dias = np.arange(inicio, fin + np.timedelta64(1, 'D'), dtype='datetime64[D]')
+    return dias[np.is_busday(dias)]
+
+#Función que devuelve, para cada fecha alineada, la posición en una serie de su última fecha anterior o igual a ella. Las fechas alineadas anteriores al
+#comienzo de la serie no tienen ninguna, por lo que toman la posición -1
+#Fechas: Fechas (ordenadas) de la serie
+#FechasAlineadas: Fechas a las que se quiere alinear la serie
+def get_posiciones_alineadas(fechas, fechasAlineadas):
+    return np.searchsorted(np.asarray(fechas, dtype='datetime64[D]'), fechasAlineadas, side="right") - 1
+
+#Función que construye la matriz alineada de dimensiones (días, activos) de un conjunto de series. Cada columna se obtiene con una única indexación de los
+#valores de su serie, sin construir un dataframe por activo
+#ListaFechas: Lista con las fechas (ordenadas) de cada serie
+#ListaValores: Lista con los valores de cada serie, de la misma longitud que sus fechas
+#FechasAlineadas: Fechas comunes, obtenidas con get_fechas_alineadas
+#Los días anteriores al comienzo de cada serie quedan a NaN, ya que solo se rellena hacia delante
+def get_matriz_alineada(listaFechas, listaValores, fechasAlineadas):
+    matriz = np.empty((fechasAlineadas.shape[0], len(listaValores)))
+    for i, (fechas, valores) in enumerate(zip(listaFechas, listaValores)):
+        posiciones = get_posiciones_alineadas(fechas, fechasAlineadas)
+        matriz[:, i] = np.asarray(valores, dtype=float)[np.maximum(posiciones, 0)]
+        matriz[posiciones < 0, i] = np.nan
+    return matriz
+
+#Función que devuelve la posición de la primera fila de una matriz alineada en la que todos los activos tienen precio. Como solo se rellena hacia delante,
+#a partir de ella no falta ningún valor, por lo que es el comienzo del período que pueden usar los cálculos que necesitan todos los activos a la vez
+#Devuelve el número de filas de la matriz si no hay ninguna completa
+def get_inicio_comun(matriz):
+    completas = ~np.isnan(matriz).any(axis=1)
+    return int(np.argmax(completas)) if completas.any() else matriz.shape[0]
@@ -0,0 +1,249 @@
+import argparse
+import sys
+import numpy as np
+import pandas as pd
+from data_utils import exists_route
+from cartera import cargar_cartera
+from graficas import configurar_graficas, formatosGraficas, grafica_backtest
+from simulacion import get_secuencia_semillas
+from riesgo import get_drawdowns_maximos
+from formatos import save_tabla, formatosSalida, formato_disponible
+from optimizador import get_pesos_aleatorios, ELEMENTOS_BLOQUE
+from perfil import etapa
+
+#Reglas de rebalanceo disponibles:
+#Mantener: Compra y mantenimiento, los pesos derivan con los precios y nunca se vuelve a los iniciales
+#Diario, Semanal, Mensual: Se vuelve a los pesos iniciales el primer día de cotización de cada día, semana o mes
+#Umbral: Se vuelve a los pesos iniciales cuando el peso de algún activo se aleja de su objetivo más que el umbral indicado
+reglasRebalanceo = ["mantener", "diario", "semanal", "mensual", "umbral"]
+#Umbrales por defecto de la regla umbral, como diferencia absoluta de pesos
+UMBRALES_REBALANCEO = [0.05]
+#Número de días de cotización de un año, con el que se anualizan la volatilidad y el ratio de Sharpe
+DIAS_ANIO = 252
+
+#Función que calcula, para cada regla de calendario, en qué días de una serie de fechas se rebalancea: el primero de cada día, semana o mes distinto del
+#anterior. El primer día nunca se rebalancea, ya que es cuando se compra la cartera
+#Fechas: Vector de fechas (datetime64) de los precios
+#Devuelve un diccionario que asocia a cada regla un vector booleano con un elemento por fecha
+def get_calendario_rebalanceo(fechas):
+    fechas = np.asarray(fechas, dtype='datetime64[D]')
+    calendario = {"mantener": np.zeros(fechas.shape[0], dtype=bool), "umbral": np.zeros(fechas.shape[0], dtype=bool)}
+    for regla, unidad in [("diario", "D"), ("semanal", "W"), ("mensual", "M")]:
+        periodos = fechas.astype("datetime64[" + unidad + "]")
+        #Las semanas de numpy empiezan en jueves, así que desplazamos las fechas para que empiecen en lunes
+        if unidad == "W":
+            periodos = (fechas + np.timedelta64(3, 'D')).astype("datetime64[W]")
+        calendario[regla] = np.concatenate([[False], periodos[1:] != periodos[:-1]])
+    return calendario
+
+#Función que realiza el backtest de un bloque de carteras con la misma regla de rebalanceo sobre la misma matriz de precios. Sin rebalanceos el valor de cada
+#cartera es directamente el producto de sus pesos por los precios relativos al primer día, para todas a la vez. Con rebalanceos los días se recorren uno a
+#uno, ya que cada rebalanceo depende del valor alcanzado hasta entonces, pero cada día se actualizan a la vez todas las carteras con operaciones sobre
+#matrices de dimensiones (carteras, activos)
+#Al rebalancear, el coste es proporcional al valor negociado, calculado sobre el valor antes de costes; la diferencia con el coste exacto es del orden del
+#cuadrado del coste, despreciable para costes realistas
+#PreciosNormalizados: Matriz de dimensiones (días, activos) con los precios divididos por los del primer día
+#Pesos: Matriz de pesos objetivo de dimensiones (carteras, activos)
+#Rebalanceos: Vector booleano indicando qué días se rebalancean todas las carteras por calendario
+#Umbral: Desviación máxima de los pesos respecto de los objetivo a partir de la cual se rebalancea cada cartera, o None si no se rebalancea por umbral
+#Coste: Coste de transacción como fracción del valor negociado (0.001 son 10 puntos básicos)
+#Devuelve la matriz de valores de dimensiones (carteras, días), con valor inicial 1, el número de rebalanceos de cada cartera y el total pagado en costes,
+#como fracción del valor inicial
+def simular_backtest_bloque(preciosNormalizados, pesos, rebalanceos, umbral, coste):
+    numCarteras = pesos.shape[0]
+    numRebalanceos = np.zeros(numCarteras, dtype=np.int64)
+    costes = np.zeros(numCarteras)
+    if umbral is None and not rebalanceos.any():
+        return pesos @ preciosNormalizados.T, numRebalanceos, costes
+
+    relativos = preciosNormalizados[1:] / preciosNormalizados[:-1]
+    valores = np.empty((numCarteras, preciosNormalizados.shape[0]))
+    valores[:, 0] = 1
+    posiciones = pesos.copy()
+    for t in range(1, valores.shape[1]):
+        posiciones *= relativos[t-1]
+        valor = posiciones.sum(axis=1)
+        if rebalanceos[t]:
+            costeRebalanceo = coste * np.abs(pesos * valor[:, None] - posiciones).sum(axis=1)
+            valor -= costeRebalanceo
+            np.multiply(pesos, valor[:, None], out=posiciones)
+            numRebalanceos += 1
+            costes += costeRebalanceo
+        elif umbral is not None:
+            indices = np.flatnonzero(np.abs(posiciones / valor[:, None] - pesos).max(axis=1) > umbral)
+            if indices.shape[0] > 0:
+                costeRebalanceo = coste * np.abs(pesos[indices] * valor[indices, None] - posiciones[indices]).sum(axis=1)
+                valor[indices] -= costeRebalanceo
+                posiciones[indices] = pesos[indices] * valor[indices, None]
+                numRebalanceos[indices] += 1
+                costes[indices] += costeRebalanceo
+        valores[:, t] = valor
+
+    return valores, numRebalanceos, costes
+
+#Función que calcula las métricas de rendimiento de un conjunto de series de valores de carteras, todas a la vez
+#Valores: Matriz de valores de dimensiones (configuraciones, días)
+#Anios: Años naturales entre la primera y la última fecha, para la tasa de crecimiento anual compuesta
+#TasaLibreRiesgo: Rendimiento diario del activo libre de riesgo, como en optimizador.py
+#Devuelve un diccionario con un vector por métrica
+def get_metricas_backtest(valores, anios, tasaLibreRiesgo=0):
+    retornos = valores[:, 1:] / valores[:, :-1] - 1
+    medias = retornos.mean(axis=1)
+    desviaciones = retornos.std(axis=1, ddof=1) if retornos.shape[1] > 1 else np.full(valores.shape[0], np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpes = (medias - tasaLibreRiesgo) / desviaciones * np.sqrt(DIAS_ANIO)
+    return {"Valor final": valores[:, -1],
+            "CAGR": (valores[:, -1] / valores[:, 0]) ** (1 / anios) - 1,
+            "Volatilidad": desviaciones * np.sqrt(DIAS_ANIO),
+            "Sharpe": sharpes,
+            "Drawdown máximo": get_drawdowns_maximos(valores, valores[:, :1])}
+
+#Función que realiza el backtest de todas las combinaciones de un conjunto de vectores de pesos y de reglas de rebalanceo sobre los precios históricos.
+#Para cada regla, las carteras se simulan por bloques, para que la memoria no dependa de su número
+#Precios: Matriz de precios alineados de dimensiones (días, activos), sin huecos (desde la primera fecha en la que cotizan todos los activos)
+#Fechas: Fechas de los precios
+#Pesos: Matriz de pesos objetivo de dimensiones (carteras, activos)
+#Reglas: Lista de tuplas (nombre, regla, umbral) con las reglas de rebalanceo a probar (ver get_reglas)
+#Devuelve un dataframe con una fila por cartera y regla (con la posición de la cartera en la matriz de pesos) y sus métricas, y la matriz de valores de
+#dimensiones (reglas, días) de la primera cartera con cada regla
+def get_backtest(precios, fechas, pesos, reglas, coste=0, tasaLibreRiesgo=0):
+    precios = np.asarray(precios, dtype=float)
+    pesos = np.atleast_2d(np.asarray(pesos, dtype=float))
+    preciosNormalizados = precios / precios[0]
+    calendario = get_calendario_rebalanceo(fechas)
+    anios = (np.datetime64(fechas[-1], 'D') - np.datetime64(fechas[0], 'D')).astype(float) / 365.25
+
+    #Cada bloque guarda los valores de todas sus carteras en todos los días
+    tamanioBloque = max(1, ELEMENTOS_BLOQUE // max(precios.shape[0], pesos.shape[1]))
+    resultados = []
+    valoresPrimera = np.empty((len(reglas), precios.shape[0]))
+    for r, (nombre, regla, umbral) in enumerate(reglas):
+        for inicio in range(0, pesos.shape[0], tamanioBloque):
+            tramo = slice(inicio, min(inicio + tamanioBloque, pesos.shape[0]))
+            valores, numRebalanceos, costes = simular_backtest_bloque(preciosNormalizados, pesos[tramo], calendario[regla],
+                                                                      umbral if regla == "umbral" else None, coste)
+            if inicio == 0:
+                valoresPrimera[r] = valores[0]
+            metricas = get_metricas_backtest(valores, anios, tasaLibreRiesgo)
+            metricas["Rebalanceos"] = numRebalanceos
+            metricas["Costes"] = costes
+            resultados.append(pd.DataFrame({"Cartera": np.arange(tramo.start, tramo.stop), "Regla": nombre, **metricas}))
+
+    #Ordenamos las filas por cartera y, dentro de cada una, por regla
+    resultado = pd.concat(resultados, ignore_index=True).sort_values("Cartera", kind="stable", ignore_index=True)
+    return resultado, valoresPrimera
+
+#Función que construye la lista de reglas de rebalanceo a probar, con una regla umbral por cada umbral
+#Devuelve la lista de tuplas (nombre, regla, umbral), o None si alguna regla no existe
+def get_reglas(nombresReglas, umbrales=UMBRALES_REBALANCEO):
+    reglas = []
+    for regla in nombresReglas:
+        if not (regla in reglasRebalanceo):
+            print("Las reglas de rebalanceo deben ser mantener, diario, semanal, mensual o umbral")
+            return None
+        if regla == "umbral":
+            reglas += [("umbral " + f"{100 * umbral:g}%", regla, umbral) for umbral in umbrales]
+        else:
+            reglas.append((regla, regla, None))
+    return reglas
+
+#Función principal del programa, que recibe los mismos argumentos que la línea de comandos. Se separa del bloque principal para que servidor.py pueda
+#ejecutarla sin arrancar un intérprete nuevo
+#Argumentos: Lista de argumentos a interpretar, o None para tomar los de la línea de comandos
+#CargarCartera: Función con la que se recupera la cartera a partir de su nombre (servidor.py usa una que las mantiene en memoria)
+def main(argumentos=None, cargarCartera=cargar_cartera):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rutaCSV', type=str, required=True, help='Ruta de almacenamiento de los resultados')
+    parser.add_argument('--nombreCartera', type=str, required=True, help='Nombre de la cartera sobre cuyos precios se hace el backtest')
+    parser.add_argument('--reglas', nargs='+', type=str, required=False, default=reglasRebalanceo,
+                        help='Reglas de rebalanceo a probar (mantener, diario, semanal, mensual o umbral)')
+    parser.add_argument('--umbrales', nargs='+', type=float, required=False, default=UMBRALES_REBALANCEO,
+                        help='Umbrales de la regla umbral, como diferencia absoluta de pesos (0.05 son 5 puntos)')
+    parser.add_argument('--costeTransaccion', type=float, required=False, default=0,
+                        help='Coste de cada rebalanceo como fracción del valor negociado (0.001 son 10 puntos básicos)')
+    parser.add_argument('--numCarteras', type=int, required=False, default=0, help='Número de carteras aleatorias a probar, además de la actual')
+    parser.add_argument('--tasaLibreRiesgo', type=float, required=False, default=0, help='Rendimiento diario del activo libre de riesgo')
+    parser.add_argument('--semilla', type=int, required=False, help='Semilla para poder reproducir las carteras aleatorias')
+    parser.add_argument('--formato', type=str, required=False, default="csv", help='Formato de los archivos generados (csv, parquet o npy)')
+    parser.add_argument('--graficas', type=str, required=False, default="pantalla", help='Formato de las gráficas (pantalla, png, svg o none)')
+    parser.add_argument('--rutaGraficas', type=str, required=False, default=".", help='Ruta de almacenamiento de las gráficas exportadas')
+    args = parser.parse_args(argumentos)
+
+    #La carpeta donde se quieran almacenar los resultados debe existir
+    if not exists_route(args.rutaCSV):
+        print("La ruta de los CSV introducida no existe")
+        sys.exit(1)
+
+    #Las reglas deben ser de las disponibles, y los umbrales positivos
+    if any(umbral <= 0 for umbral in args.umbrales):
+        print("Los umbrales de rebalanceo deben ser positivos")
+        sys.exit(1)
+    reglas = get_reglas([regla.lower() for regla in args.reglas], args.umbrales)
+    if reglas is None:
+        sys.exit(1)
+
+    #El coste de transacción debe estar entre 0 y 1, y el número de carteras aleatorias no puede ser negativo
+    if args.costeTransaccion < 0 or args.costeTransaccion >= 1:
+        print("El coste de transacción debe estar entre 0 y 1")
+        sys.exit(1)
+    if args.numCarteras < 0:
+        print("El número de carteras aleatorias no puede ser negativo")
+        sys.exit(1)
+
+    #El formato de los archivos debe ser uno de los disponibles, y sus librerías deben estar instaladas
+    formato = args.formato.lower()
+    if not (formato in formatosSalida):
+        print("El formato de los archivos debe ser csv, parquet o npy")
+        sys.exit(1)
+    if not formato_disponible(formato):
+        print("Para usar el formato " + formato + " debe instalarse pyarrow")
+        sys.exit(1)
+
+    #El formato de las gráficas debe ser uno de los disponibles, y si se exportan a archivos, la carpeta donde se guarden debe existir
+    formatoGraficas = args.graficas.lower()
+    if not (formatoGraficas in formatosGraficas):
+        print("El formato de las gráficas debe ser pantalla, png, svg o none")
+        sys.exit(1)
+    if formatoGraficas in ["png", "svg"] and not exists_route(args.rutaGraficas):
+        print("La ruta de las gráficas introducida no existe")
+        sys.exit(1)
+    configurar_graficas(formatoGraficas, args.rutaGraficas)
+
+    #Recuperamos una instancia de la clase Cartera creada anteriormente, usando el nombre de la cartera pasado por el usuario
+    cartera = cargarCartera(args.nombreCartera)
+    if cartera == None:
+        print("Ha habido un error al cargar la cartera solicitada")
+        sys.exit(1)
+
+    #Probamos los pesos actuales de la cartera y, opcionalmente, carteras aleatorias distribuidas uniformemente, generadas igual que en optimizador.py
+    nombresActivos = [activo.obtenerNombreActivo() for activo in cartera.obtenerActivos()]
+    pesos = np.atleast_2d(np.asarray(cartera.obtenerPesos(), dtype=float))
+    nombresCarteras = ["Actual"]
+    if args.numCarteras > 0:
+        generador = np.random.default_rng(get_secuencia_semillas(args.semilla))
+        pesos = np.vstack([pesos, get_pesos_aleatorios(args.numCarteras, cartera.obtenerNumActivos(), generador)])
+        nombresCarteras += ["Aleatoria " + str(i+1) for i in range(args.numCarteras)]
+
+    #Las carteras se compran el primer día en el que cotizan todos sus activos. Guardamos también la serie completa de valores de la cartera actual, que es
+    #la primera, con cada regla
+    inicioComun = cartera.obtenerInicioComun()
+    fechas = cartera.obtenerFechas()[inicioComun:]
+    with etapa("backtest", cartera.obtenerNombreCartera()):
+        resultado, valoresActual = get_backtest(cartera.obtenerPreciosAlineados()[inicioComun:], fechas, pesos, reglas, args.costeTransaccion,
+                                                args.tasaLibreRiesgo)
+    resultado = pd.concat([resultado, pd.DataFrame(pesos[resultado["Cartera"]], columns=nombresActivos)], axis=1)
+    resultado["Cartera"] = [nombresCarteras[i] for i in resultado["Cartera"]]
+    save_tabla(resultado, args.rutaCSV + "\\" + cartera.obtenerNombreCartera() + "_backtest", False, formato)
+    dataframeValores = pd.DataFrame(valoresActual.T, index=pd.Index(fechas, name="Fecha"), columns=[nombre for nombre, _, _ in reglas])
+    save_tabla(dataframeValores, args.rutaCSV + "\\" + cartera.obtenerNombreCartera() + "_backtestValores", True, formato)
+
+    print(resultado[resultado["Cartera"] == "Actual"][["Regla", "CAGR", "Volatilidad", "Sharpe", "Drawdown máximo", "Rebalanceos", "Costes"]]
+          .to_string(index=False))
+    if args.numCarteras > 0:
+        mejor = resultado.loc[resultado["Sharpe"].idxmax()]
+        print(f"Mejor ratio de Sharpe entre {resultado.shape[0]} configuraciones: {mejor['Sharpe']: .6f} ({mejor['Cartera']}, {mejor['Regla']})")
+
+    grafica_backtest(dataframeValores, "Backtest " + cartera.obtenerNombreCartera())
+
+if __name__ == "__main__":
+    main()
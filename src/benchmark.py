@@ -0,0 +1,542 @@
+import argparse
+import sys
+import os
+import time
+import platform
+import tempfile
+import statistics
+import subprocess
+import io
+import contextlib
+import tracemalloc
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from data_utils import save_json, get_simulacion_valores
+from simulacion import get_bloques_simulacion_valores, get_resumen_simulacion, buffersProceso, muestreosSimulacion, get_media_valor_final, TAMANIO_BLOQUE
+from convergencia import REPLICAS_CONVERGENCIA
+from riesgo import get_estimacion_variable_control
+from sintetico import generar_series_sinteticas
+from indicadores import indicadores
+from seriePrecios import COLUMNAS_OHLCV
+from perfil import etapa, iniciar_perfil, cancelar_perfil
+from formatos import formatosSalida, formato_disponible, save_tabla, save_simulaciones, load_simulaciones
+
+#Lista de pruebas de rendimiento disponibles
+pruebas = ["escalado", "suite", "importacion", "perfil", "formatos", "precision", "muestreo"]
+#Módulos cuyo tiempo de importación se mide en la prueba de importación
+modulosImportacion = ["simulacion", "cartera", "monteCarlo", "optimizador", "extractor"]
+#Módulos pesados que ninguno de los anteriores debe importar al cargarse, ya que solo se necesitan al generar gráficas, al calcular algunos indicadores o
+#al usar cada API. Si alguno vuelve a importarse al principio, la prueba de importación falla
+modulosPesados = ["matplotlib", "seaborn", "scipy.signal", "scipy.stats", "yfinance", "alpha_vantage"]
+#Número de etapas vacías que se miden en la prueba del perfilado
+LLAMADAS_PERFIL = 1000000
+#Percentiles de los valores finales que se comparan entre precisiones en la prueba de precisión
+PERCENTILES_PRECISION = [1, 5, 50, 95, 99]
+#Número de carteras aleatorias del backtest de la suite, que se prueban con todas las reglas de rebalanceo
+CARTERAS_BACKTEST = 1000
+#Escalas por defecto de la suite, como cadenas activosxaños
+escalasSuite = ["5x1", "50x5", "200x10"]
+
+#Prueba de escalado de la simulación de Monte Carlo en modo streaming con el número de procesos. Para cada número de procesos se mide el tiempo total y
+#el número de simulaciones por segundo, y se comprueba que los estadísticos obtenidos son idénticos a los del primer número de procesos probado
+#ListaWorkers: Lista con los números de procesos a probar
+#NumSimulaciones: Número de simulaciones de Monte Carlo a realizar en cada prueba
+#NumDias: Número de días de cada simulación
+#TamanioBloque: Número de simulaciones de cada bloque
+#Semilla: Semilla común a todas las pruebas
+def benchmark_escalado(listaWorkers, numSimulaciones, numDias, tamanioBloque, semilla):
+    resultados = []
+    mediaReferencia = None
+    tiempoReferencia = None
+
+    for workers in listaWorkers:
+        inicio = time.perf_counter()
+        bloques = get_bloques_simulacion_valores(0.0005, 0.02, numSimulaciones, numDias, 100, tamanioBloque, semilla, workers)
+        estadisticas, _ = get_resumen_simulacion(bloques, numDias)
+        duracion = time.perf_counter() - inicio
+
+        media = estadisticas.obtenerMedia()
+        if mediaReferencia is None:
+            mediaReferencia = media
+            tiempoReferencia = duracion
+
+        resultado = {"workers": workers,
+                     "segundos": duracion,
+                     "simulacionesPorSegundo": numSimulaciones / duracion,
+                     "aceleracion": tiempoReferencia / duracion,
+                     "identico": bool(np.array_equal(media, mediaReferencia))}
+        resultados.append(resultado)
+        print(f"{workers:>3} procesos: {duracion:8.3f} s, {resultado['simulacionesPorSegundo']:12.0f} simulaciones/s, "
+              f"aceleración {resultado['aceleracion']:5.2f}, resultados idénticos: {'Sí' if resultado['identico'] else 'No'}")
+
+    return {"prueba": "escalado",
+            "numSimulaciones": numSimulaciones,
+            "numDias": numDias,
+            "tamanioBloque": tamanioBloque,
+            "semilla": semilla,
+            "numCPUs": os.cpu_count(),
+            "resultados": resultados}
+
+#Función que ejecuta una función sin argumentos midiendo su tiempo y el pico de memoria reservada durante su ejecución (con tracemalloc)
+#Devuelve una tupla con los segundos, el pico de memoria en bytes y el resultado de la función
+def medir_memoria(funcion):
+    #Vaciamos los buffers de las simulaciones, para que cada medida incluya la reserva de los suyos
+    buffersProceso.clear()
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    resultado = funcion()
+    duracion = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return duracion, pico, resultado
+
+#Prueba de las técnicas de reducción de varianza en la simulación de un activo. Para cada muestreo (y para la variable de control sobre el aleatorio) se
+#repite REPLICAS_CONVERGENCIA veces la simulación con semillas distintas, y se miden el tiempo medio de cada réplica, el error típico entre réplicas de la
+#media de los valores finales y de la probabilidad de pérdida, y la eficiencia respecto del muestreo aleatorio: cuántas veces menos tiempo necesita para
+#el mismo error (reducción de varianza dividida por el coste relativo)
+#Los parámetros son los mismos que los de benchmark_escalado, siendo numSimulaciones las simulaciones de cada réplica
+def benchmark_muestreo(numSimulaciones, numDias, tamanioBloque, semilla):
+    media, desviacionTipica, valorInicial = 0.0005, 0.02, 100
+    mediaControl = get_media_valor_final([media], [desviacionTipica], [valorInicial], numDias)
+    semillas = np.random.SeedSequence(semilla).spawn(REPLICAS_CONVERGENCIA)
+
+    estimaciones = {}
+    tiempos = {}
+    for muestreo in muestreosSimulacion:
+        #Generamos antes un bloque pequeño, para que el tiempo de Sobol no incluya importar scipy
+        list(get_bloques_simulacion_valores(media, desviacionTipica, 2, numDias, valorInicial, tamanioBloque, semilla, 1, "float64", True, muestreo))
+        for semillaReplica in semillas:
+            inicio = time.perf_counter()
+            bloques = get_bloques_simulacion_valores(media, desviacionTipica, numSimulaciones, numDias, valorInicial, tamanioBloque, semillaReplica, 1,
+                                                     "float64", True, muestreo)
+            finales = np.concatenate([bloque[:, -1].copy() for bloque in bloques])
+            tiempos.setdefault(muestreo, []).append(time.perf_counter() - inicio)
+            perdidas = finales < valorInicial
+            estimaciones.setdefault(muestreo, []).append([finales.mean(), perdidas.mean()])
+            if muestreo == "aleatorio":
+                inicio = time.perf_counter()
+                estimacionControl = get_estimacion_variable_control(perdidas, finales, mediaControl)[0]
+                tiempos.setdefault("control", []).append(tiempos["aleatorio"][-1] + time.perf_counter() - inicio)
+                #La media del valor final es la del control, sin error
+                estimaciones.setdefault("control", []).append([np.nan, estimacionControl])
+
+    resultados = []
+    erroresAleatorio = np.array(estimaciones["aleatorio"]).std(axis=0, ddof=1)
+    for tecnica, valores in estimaciones.items():
+        errores = np.array(valores).std(axis=0, ddof=1)
+        segundos = statistics.mean(tiempos[tecnica])
+        coste = segundos / statistics.mean(tiempos["aleatorio"])
+        resultado = {"tecnica": tecnica,
+                     "segundos": segundos,
+                     "errorValorFinal": None if np.isnan(errores[0]) else float(errores[0]),
+                     "errorProbabilidadPerdida": float(errores[1]),
+                     "reduccionVarianzaValorFinal": float(erroresAleatorio[0] ** 2 / errores[0] ** 2) if errores[0] > 0 else None,
+                     "reduccionVarianzaProbabilidadPerdida": float(erroresAleatorio[1] ** 2 / errores[1] ** 2) if errores[1] > 0 else None}
+        resultado["eficienciaProbabilidadPerdida"] = resultado["reduccionVarianzaProbabilidadPerdida"] / coste \
+            if resultado["reduccionVarianzaProbabilidadPerdida"] is not None else None
+        resultados.append(resultado)
+        reduccionFinal = "exacto" if resultado["reduccionVarianzaValorFinal"] is None else f"{resultado['reduccionVarianzaValorFinal']:8.1f}x"
+        print(f"{tecnica:<11} {segundos:8.3f} s por réplica, reducción de varianza del valor final medio {reduccionFinal:>9}, "
+              f"de la probabilidad de pérdida {resultado['reduccionVarianzaProbabilidadPerdida']:6.2f}x, "
+              f"eficiencia {resultado['eficienciaProbabilidadPerdida']:6.2f}x")
+
+    return {"prueba": "muestreo",
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numSimulaciones": numSimulaciones,
+            "numDias": numDias,
+            "tamanioBloque": tamanioBloque,
+            "semilla": semilla,
+            "replicas": REPLICAS_CONVERGENCIA,
+            "resultados": resultados}
+
+#Prueba de la simulación de Monte Carlo de un activo en float64 y en float32. Se miden el tiempo y el pico de memoria generando por bloques (con y sin
+#reutilizar los buffers) y generando la matriz completa de simulaciones, y se compara la exactitud de float32 respecto de float64 de dos formas:
+#- Aritmética: con las mismas normales (generadas en float64), el error relativo de los valores finales que introduce hacer las operaciones en float32
+#- Estadística: con la misma semilla (en float32 los números aleatorios son otros), la diferencia de la media de los valores finales en errores estándar y
+#la diferencia relativa de sus percentiles
+#Los parámetros son los mismos que los de benchmark_escalado
+def benchmark_precision(numSimulaciones, numDias, tamanioBloque, semilla):
+    media, desviacionTipica, valorInicial = 0.0005, 0.02, 100
+
+    #Cada bloque se reduce a la suma de sus valores finales, para que la memoria medida sea solo la de generarlo
+    def valores_finales(precision, reutilizar):
+        bloques = get_bloques_simulacion_valores(media, desviacionTipica, numSimulaciones, numDias, valorInicial, tamanioBloque, semilla, 1, precision,
+                                                 reutilizar)
+        return np.concatenate([bloque[:, -1].astype(float) for bloque in bloques])
+
+    rendimiento = []
+    finales = {}
+    for precision, reutilizar in [("float64", False), ("float64", True), ("float32", True)]:
+        duracion, pico, finales[precision] = medir_memoria(lambda: valores_finales(precision, reutilizar))
+        rendimiento.append({"modo": "bloques", "precision": precision, "reutilizarBuffers": reutilizar, "segundos": duracion, "memoriaPico": pico})
+    for precision in ["float64", "float32"]:
+        duracion, pico, _ = medir_memoria(lambda: get_simulacion_valores(media, desviacionTipica, numSimulaciones, numDias, valorInicial, semilla, precision))
+        rendimiento.append({"modo": "matriz", "precision": precision, "reutilizarBuffers": False, "segundos": duracion, "memoriaPico": pico})
+    for resultado in rendimiento:
+        print(f"{resultado['modo']:<8} {resultado['precision']:<8} reutilizando buffers: {'Sí' if resultado['reutilizarBuffers'] else 'No'}  "
+              f"{resultado['segundos']:8.3f} s, pico de memoria {resultado['memoriaPico'] / 1e6:9.1f} MB")
+
+    #Error aritmético, sobre como mucho un bloque de simulaciones con las mismas normales
+    normales = np.random.default_rng(semilla).standard_normal((min(numSimulaciones, tamanioBloque), numDias))
+    caminos = {}
+    for precision in ["float64", "float32"]:
+        returns = normales.astype(precision)
+        returns *= desviacionTipica
+        returns += media
+        np.cumsum(returns, axis=1, out=returns)
+        np.exp(returns, out=returns)
+        returns *= valorInicial
+        caminos[precision] = returns[:, -1].astype(float)
+    errorRelativo = np.abs(caminos["float32"] / caminos["float64"] - 1)
+
+    #Diferencia estadística, en errores estándar de la media y en percentiles
+    errorEstandar = finales["float64"].std(ddof=1) / np.sqrt(numSimulaciones)
+    diferenciaMedia = (finales["float32"].mean() - finales["float64"].mean()) / errorEstandar
+    percentiles64 = np.percentile(finales["float64"], PERCENTILES_PRECISION)
+    percentiles32 = np.percentile(finales["float32"], PERCENTILES_PRECISION)
+    diferenciasPercentiles = percentiles32 / percentiles64 - 1
+
+    print(f"Error relativo aritmético de float32 en los valores finales: máximo {errorRelativo.max():.2e}, medio {errorRelativo.mean():.2e}")
+    print(f"Diferencia de la media de los valores finales: {diferenciaMedia:.2f} errores estándar")
+    for p, diferencia in zip(PERCENTILES_PRECISION, diferenciasPercentiles):
+        print(f"Percentil {p:>2}: diferencia relativa {diferencia:+.2e}")
+
+    return {"prueba": "precision",
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numSimulaciones": numSimulaciones,
+            "numDias": numDias,
+            "tamanioBloque": tamanioBloque,
+            "semilla": semilla,
+            "rendimiento": rendimiento,
+            "errorRelativoMaximo": float(errorRelativo.max()),
+            "errorRelativoMedio": float(errorRelativo.mean()),
+            "diferenciaMediaErroresEstandar": float(diferenciaMedia),
+            "diferenciasPercentiles": {str(p): float(diferencia) for p, diferencia in zip(PERCENTILES_PRECISION, diferenciasPercentiles)}}
+
+#Función que importa un módulo en un intérprete nuevo con python -X importtime, que escribe por la salida de errores el tiempo de importación de cada módulo
+#Devuelve una tupla con el tiempo total de importación del módulo en segundos y el conjunto de módulos importados, o None si no se ha podido importar
+def get_importacion(modulo):
+    directorio = os.path.dirname(os.path.abspath(__file__))
+    proceso = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + modulo], cwd=directorio, capture_output=True, text=True)
+    if proceso.returncode != 0:
+        return None
+
+    tiempos = {}
+    #Cada línea tiene el formato "import time: propio | acumulado | módulo", con el módulo sangrado según su profundidad
+    for linea in proceso.stderr.splitlines():
+        campos = linea.removeprefix("import time:").split("|")
+        if len(campos) == 3 and campos[1].strip().isdigit():
+            tiempos[campos[2].strip()] = int(campos[1])
+    return tiempos.get(modulo, 0) / 1e6, set(tiempos)
+
+#Prueba del tiempo de importación de los módulos principales, cada uno en un intérprete nuevo para que no se beneficie de lo ya importado por los demás.
+#Comprueba además que ninguno importa módulos pesados que no necesita
+#Repeticiones: Número de veces que se importa cada módulo
+def benchmark_importacion(repeticiones):
+    resultados = []
+    correcto = True
+    for modulo in modulosImportacion:
+        importaciones = [get_importacion(modulo) for _ in range(repeticiones)]
+        if None in importaciones:
+            #Por ejemplo, extractor.py necesita las librerías de los APIs instaladas
+            print(f"{modulo:<12} no se ha podido importar")
+            resultados.append({"modulo": modulo, "importado": False})
+            continue
+
+        tiempos = [tiempo for tiempo, _ in importaciones]
+        pesados = [pesado for pesado in modulosPesados if pesado in importaciones[-1][1]]
+        correcto = correcto and not pesados
+        resultados.append({"modulo": modulo,
+                           "importado": True,
+                           "mediana": statistics.median(tiempos),
+                           "minimo": min(tiempos),
+                           "tiempos": tiempos,
+                           "modulosPesados": pesados})
+        print(f"{modulo:<12} mediana {statistics.median(tiempos):8.3f} s, mínimo {min(tiempos):8.3f} s, "
+              f"módulos pesados importados: {', '.join(pesados) if pesados else 'ninguno'}")
+
+    return {"prueba": "importacion",
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "repeticiones": repeticiones,
+            "correcto": correcto,
+            "resultados": resultados}
+
+#Prueba del coste de instrumentar una etapa con perfil.py, comparando un bucle de etapas vacías con el perfilado desactivado, activado sin medir la memoria
+#y activado midiéndola, con el mismo bucle sin etapas. Los costes se dan en nanosegundos por etapa
+#Repeticiones: Número de veces que se mide cada bucle
+def benchmark_perfil(repeticiones):
+    def bucle_vacio():
+        for _ in range(LLAMADAS_PERFIL):
+            pass
+
+    def bucle_etapas():
+        for _ in range(LLAMADAS_PERFIL):
+            with etapa("prueba"):
+                pass
+
+    base, _ = medir_tiempo(bucle_vacio, repeticiones)
+    resultados = {}
+    for modo, activo, memoria in [("desactivado", False, False), ("activado", True, False), ("memoria", True, True)]:
+        if activo:
+            iniciar_perfil("benchmark", memoria)
+        tiempos, _ = medir_tiempo(bucle_etapas, repeticiones)
+        cancelar_perfil()
+        coste = (tiempos["mediana"] - base["mediana"]) / LLAMADAS_PERFIL * 1e9
+        resultados[modo] = {"nanosegundosEtapa": coste, **tiempos}
+        print(f"{modo:<12} {coste:10.1f} ns por etapa")
+
+    return {"prueba": "perfil",
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "llamadas": LLAMADAS_PERFIL,
+            "repeticiones": repeticiones,
+            "base": base,
+            "resultados": resultados}
+
+#Prueba de la velocidad de escritura y lectura de cada formato de archivo (ver formatosSalida en formatos.py), con una matriz de simulaciones y con una serie
+#de precios sintética. Para cada formato se miden los tiempos, el tamaño del archivo y el rendimiento en MB/s, respecto del tamaño de los datos en memoria. Los
+#formatos cuyas librerías no estén instaladas se marcan como no disponibles
+#NumSimulaciones, NumDias: Dimensiones de la matriz de simulaciones
+#NumAnios: Número de años de la serie de precios
+def benchmark_formatos(repeticiones, numSimulaciones, numDias, numAnios, semilla):
+    from seriePrecios import SeriePrecios
+    simulacion = 1000 * np.exp(np.cumsum(np.random.default_rng(semilla).normal(0, 0.01, (numSimulaciones, numDias)), axis=1))
+
+    resultados = []
+    with tempfile.TemporaryDirectory() as directorioTemporal:
+        directorio = os.path.join(directorioTemporal, "formatos")
+        os.mkdir(directorio)
+        archivo = generar_series_sinteticas(directorio, 1, numAnios, semilla)[0]
+        serie = pd.read_csv(directorio + "\\" + archivo, index_col="Date", parse_dates=True)
+        nombreSerie = directorio + "\\" + archivo[:-len(".csv")]
+
+        for formato in formatosSalida:
+            if not formato_disponible(formato):
+                print(f"{formato:<8} no disponible")
+                resultados.append({"formato": formato, "disponible": False})
+                continue
+
+            #Los mensajes de cada archivo creado no se muestran
+            with contextlib.redirect_stdout(io.StringIO()):
+                tiempos = {}
+                tiempos["escrituraSimulaciones"], rutaSimulaciones = medir_tiempo(lambda: save_simulaciones(simulacion, directorio + "\\simulaciones", formato),
+                                                                                  repeticiones)
+                tiempos["lecturaSimulaciones"], leida = medir_tiempo(lambda: load_simulaciones(rutaSimulaciones), repeticiones)
+                tiempos["escrituraSerie"], rutaSerie = medir_tiempo(lambda: save_tabla(serie, nombreSerie + "_" + formato, True, formato), repeticiones)
+                tiempos["lecturaSerie"], _ = medir_tiempo(lambda: SeriePrecios(rutaSerie), repeticiones)
+
+            megas = simulacion.nbytes / 1e6
+            resultado = {"formato": formato,
+                         "disponible": True,
+                         "bytesSimulaciones": os.path.getsize(rutaSimulaciones),
+                         "bytesSerie": os.path.getsize(rutaSerie),
+                         "MBsEscritura": megas / tiempos["escrituraSimulaciones"]["mediana"],
+                         "MBsLectura": megas / tiempos["lecturaSimulaciones"]["mediana"],
+                         "identico": bool(np.allclose(leida, simulacion, rtol=1e-12)),
+                         "tiempos": tiempos}
+            resultados.append(resultado)
+            print(f"{formato:<8} simulaciones: escritura {resultado['MBsEscritura']:9.1f} MB/s, lectura {resultado['MBsLectura']:9.1f} MB/s, "
+                  f"{resultado['bytesSimulaciones'] / 1e6:9.1f} MB en disco; serie: escritura {tiempos['escrituraSerie']['mediana']:.4f} s, "
+                  f"lectura {tiempos['lecturaSerie']['mediana']:.4f} s")
+
+    return {"prueba": "formatos",
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numSimulaciones": numSimulaciones,
+            "numDias": numDias,
+            "numAnios": numAnios,
+            "repeticiones": repeticiones,
+            "resultados": resultados}
+
+#Función que mide el tiempo de ejecución de una función sin argumentos, repitiéndola varias veces
+#Devuelve un diccionario con la mediana, el mínimo y todos los tiempos en segundos, junto con el resultado de la última ejecución
+def medir_tiempo(funcion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return {"mediana": statistics.median(tiempos), "minimo": min(tiempos), "tiempos": tiempos}, resultado
+
+#Función que devuelve un dataframe con una barra posterior en un número de días a la última fecha de una serie, con los mismos precios que la última barra
+def get_barra_siguiente(serie, dias=1):
+    barra = pd.DataFrame(serie.ohlcv[:, -1:].T, columns=COLUMNAS_OHLCV)
+    barra['Date'] = serie.dates[-1:] + np.timedelta64(dias, 'D')
+    return barra
+
+#Función que devuelve unos pesos equiponderados que sumen exactamente 1, tal y como exige Cartera
+def get_pesos_equiponderados(numActivos):
+    pesos = np.full(numActivos, 1 / numActivos)
+    while np.sum(pesos) != 1:
+        pesos[-1] += 1 - np.sum(pesos)
+    return pesos.tolist()
+
+#Función que convierte una escala en formato activosxaños (por ejemplo 50x5) en la tupla (activos, años), o devuelve None si no es válida
+def get_escala(escala):
+    try:
+        numActivos, numAnios = [int(valor) for valor in escala.lower().split("x")]
+    except ValueError:
+        return None
+    if numActivos <= 0 or numAnios <= 0:
+        return None
+    return numActivos, numAnios
+
+#Suite de pruebas de rendimiento sin conexión, sobre series sintéticas. Para cada escala se generan los CSVs en un directorio temporal y se mide la carga de
+#las series y de la cartera, su serialización, los indicadores técnicos de todos los activos y las simulaciones de Monte Carlo
+#Escalas: Lista de tuplas (activos, años)
+#Repeticiones: Número de veces que se repite cada medida
+#NumSimulaciones: Número de simulaciones de Monte Carlo de cada prueba
+#NumDias: Número de días de cada simulación
+#Semilla: Semilla común a todas las pruebas
+def benchmark_suite(escalas, repeticiones, numSimulaciones, numDias, semilla):
+    #Importamos aquí la cartera para que la prueba de escalado no dependa de ella, y desactivamos sus gráficas
+    from seriePrecios import SeriePrecios
+    from cartera import Cartera
+    from graficas import configurar_graficas
+    from optimizador import get_matriz_covarianzas, get_minima_varianza, get_maximo_sharpe, get_frontera_eficiente, get_nube_carteras
+    from optimizador import get_pesos_aleatorios
+    from backtest import get_backtest, get_reglas, reglasRebalanceo
+    configurar_graficas("none")
+
+    resultados = []
+    for numActivos, numAnios in escalas:
+        with tempfile.TemporaryDirectory() as directorioTemporal:
+            #Trabajamos en un subdirectorio, para que todo lo generado quede dentro del directorio temporal y se borre al terminar
+            directorio = os.path.join(directorioTemporal, "series")
+            os.mkdir(directorio)
+            archivos = generar_series_sinteticas(directorio, numActivos, numAnios, semilla)
+            rutasArchivos = [directorio + "\\" + archivo for archivo in archivos]
+            pesos = get_pesos_equiponderados(numActivos)
+            tiempos = {}
+
+            tiempos["SeriePrecios.__init__"], series = medir_tiempo(lambda: [SeriePrecios(ruta) for ruta in rutasArchivos], repeticiones)
+            tiempos["Cartera.__init__"], cartera = medir_tiempo(lambda: Cartera(archivos, directorio, pesos, "Benchmark"), repeticiones)
+            #Alineando por la unión de fechas, que tiene que rellenar los huecos de cada activo en lugar de cruzar sus fechas
+            tiempos["Cartera.__init__ (union)"], _ = medir_tiempo(lambda: Cartera(archivos, directorio, pesos, "Benchmark", "union"), repeticiones)
+            tiempos["Cartera.to_dict"], datos = medir_tiempo(cartera.to_dict, repeticiones)
+            tiempos["Cartera.from_dict"], _ = medir_tiempo(lambda: Cartera.from_dict(datos), repeticiones)
+            #Los indicadores se guardan en cada serie, por lo que vaciamos antes su caché para que se calculen de nuevo en cada repetición
+            tiempos["obtenerRSI"], _ = medir_tiempo(lambda: [(serie.cacheIndicadores.clear(), serie.obtenerRSI()) for serie in series], repeticiones)
+            tiempos["obtenerMediaMovilSimple"], _ = medir_tiempo(lambda: [(serie.cacheIndicadores.clear(), serie.obtenerMediaMovilSimple(20))
+                                                                          for serie in series], repeticiones)
+            #Todos los indicadores técnicos de todos los activos a la vez, también vaciando antes la caché
+            tiempos["Cartera.obtenerIndicadores"], _ = medir_tiempo(lambda: (cartera.cacheIndicadores.clear(),
+                                                                             [cartera.obtenerIndicadores(nombre) for nombre in indicadores]), repeticiones)
+            #Añadimos una barra nueva a cada serie, con los estadísticos ya calculados, para medir el coste de una actualización incremental. Las barras de
+            #cada repetición se preparan antes, para no medir la construcción de los dataframes
+            for serie in series:
+                serie.obtenerCurtosis()
+            barras = iter([[get_barra_siguiente(serie, dias) for serie in series] for dias in range(1, repeticiones + 1)])
+            tiempos["SeriePrecios.append"], _ = medir_tiempo(lambda: [(serie.append(barra), serie.obtenerCurtosis()) for serie, barra in zip(series, next(barras))],
+                                                             repeticiones)
+
+            serie = series[0]
+            tiempos["get_simulacion_valores"], _ = medir_tiempo(lambda: get_simulacion_valores(serie.obtenerMedia(), serie.obtenerDesviacionTipica(),
+                                                                                                numSimulaciones, numDias, 100, semilla), repeticiones)
+            medias = [serie.obtenerMedia() for serie in series]
+            desviaciones = [serie.obtenerDesviacionTipica() for serie in series]
+            #La simulación de la cartera se hace en modo streaming, para medir el cálculo y no la escritura de las simulaciones en CSV
+            tiempos["simulacionMonteCarlo"], _ = medir_tiempo(lambda: cartera.simulacionMonteCarlo(medias, desviaciones, numSimulaciones, numDias, 1000,
+                                                                                                   True, directorio, streaming=True, semilla=semilla),
+                                                              repeticiones)
+
+            #Optimización de la cartera: puntos exactos (mínima varianza, máximo Sharpe y 50 puntos de la frontera) y nube de tantas carteras aleatorias
+            #como simulaciones
+            matrizCovarianzas = get_matriz_covarianzas(cartera.matrizCorrelacion, desviaciones)
+            tiempos["optimizacion"], _ = medir_tiempo(lambda: (get_maximo_sharpe(medias, matrizCovarianzas),
+                                                               get_frontera_eficiente(medias, matrizCovarianzas, 50, get_minima_varianza(matrizCovarianzas))),
+                                                      repeticiones)
+            tiempos["get_nube_carteras"], _ = medir_tiempo(lambda: get_nube_carteras(medias, matrizCovarianzas, numSimulaciones, semilla=semilla), repeticiones)
+
+            #Backtest sobre los precios históricos de CARTERAS_BACKTEST carteras aleatorias con todas las reglas de rebalanceo y costes de 10 puntos básicos
+            pesosBacktest = get_pesos_aleatorios(CARTERAS_BACKTEST, numActivos, np.random.default_rng(semilla))
+            inicioComun = cartera.obtenerInicioComun()
+            tiempos["get_backtest"], _ = medir_tiempo(lambda: get_backtest(cartera.obtenerPreciosAlineados()[inicioComun:], cartera.obtenerFechas()[inicioComun:],
+                                                                           pesosBacktest, get_reglas(reglasRebalanceo), 0.001), repeticiones)
+
+        resultado = {"numActivos": numActivos,
+                     "numAnios": numAnios,
+                     "numFechas": int(cartera.obtenerFechas().shape[0]),
+                     "tiempos": tiempos}
+        resultados.append(resultado)
+        print(f"Escala {numActivos} activos x {numAnios} años:")
+        for nombre, tiempo in tiempos.items():
+            print(f"  {nombre:<26} mediana {tiempo['mediana']:10.4f} s, mínimo {tiempo['minimo']:10.4f} s")
+
+    return {"prueba": "suite",
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "numCPUs": os.cpu_count(),
+            "repeticiones": repeticiones,
+            "numSimulaciones": numSimulaciones,
+            "numDias": numDias,
+            "semilla": semilla,
+            "resultados": resultados}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--prueba', type=str, required=True, help='Prueba de rendimiento a realizar')
+    parser.add_argument('--workers', nargs='+', type=int, required=False, default=[1, 2, 4, 8], help='Números de procesos a probar')
+    parser.add_argument('--numSimulaciones', type=int, required=False, default=200000, help='Número de simulaciones de cada prueba')
+    parser.add_argument('--numDias', type=int, required=False, default=252, help='Número de días de cada simulación')
+    parser.add_argument('--tamanioBloque', type=int, required=False, default=TAMANIO_BLOQUE, help='Número de simulaciones de cada bloque')
+    parser.add_argument('--semilla', type=int, required=False, default=0, help='Semilla común a todas las pruebas')
+    parser.add_argument('--escalas', nargs='+', type=str, required=False, default=escalasSuite, help='Escalas de la suite, como activosxaños')
+    parser.add_argument('--repeticiones', type=int, required=False, default=3, help='Número de repeticiones de cada medida de la suite')
+    parser.add_argument('--numAnios', type=int, required=False, default=10, help='Número de años de la serie de precios de la prueba de formatos')
+    parser.add_argument('--rutaJSON', type=str, required=False, help='Archivo JSON donde guardar los resultados')
+    args = parser.parse_args()
+
+    #La prueba elegida debe ser una de las disponibles
+    if not (args.prueba in pruebas):
+        print("Debe elegir una prueba válida por favor")
+        sys.exit(1)
+
+    #Todos los números de procesos deben ser positivos
+    if any(workers <= 0 for workers in args.workers):
+        print("Los números de procesos deben ser positivos")
+        sys.exit(1)
+
+    #Las escalas deben tener el formato activosxaños, con ambos valores positivos
+    escalas = [get_escala(escala) for escala in args.escalas]
+    if None in escalas:
+        print("Las escalas deben tener el formato activosxaños (por ejemplo 50x5), con valores positivos")
+        sys.exit(1)
+
+    #El número de repeticiones debe ser positivo
+    if args.repeticiones <= 0:
+        print("El número de repeticiones debe ser positivo")
+        sys.exit(1)
+
+    #Las dimensiones de las pruebas deben ser positivas
+    if args.numSimulaciones <= 0 or args.numDias <= 0 or args.numAnios <= 0:
+        print("El número de simulaciones, de días y de años deben ser positivos")
+        sys.exit(1)
+
+    if args.prueba == "escalado":
+        resultados = benchmark_escalado(args.workers, args.numSimulaciones, args.numDias, args.tamanioBloque, args.semilla)
+    elif args.prueba == "suite":
+        resultados = benchmark_suite(escalas, args.repeticiones, args.numSimulaciones, args.numDias, args.semilla)
+    elif args.prueba == "importacion":
+        resultados = benchmark_importacion(args.repeticiones)
+    elif args.prueba == "perfil":
+        resultados = benchmark_perfil(args.repeticiones)
+    elif args.prueba == "precision":
+        resultados = benchmark_precision(args.numSimulaciones, args.numDias, args.tamanioBloque, args.semilla)
+    elif args.prueba == "muestreo":
+        resultados = benchmark_muestreo(args.numSimulaciones, args.numDias, args.tamanioBloque, args.semilla)
+    elif args.prueba == "formatos":
+        resultados = benchmark_formatos(args.repeticiones, args.numSimulaciones, args.numDias, args.numAnios, args.semilla)
+
+    if args.rutaJSON:
+        save_json(args.rutaJSON, resultados)
+
+    #La prueba de importación sirve también como comprobación de regresiones, por lo que termina con error si algún módulo importa módulos pesados
+    if args.prueba == "importacion" and not resultados["correcto"]:
+        print("Algún módulo importa módulos pesados que no necesita")
+        sys.exit(1)
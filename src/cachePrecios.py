@@ -0,0 +1,163 @@
+import pickle
+import threading
+import pandas as pd
+from dataclasses import dataclass
+from datetime import date, timedelta
+from pathlib import Path
+
+#Función para restar a un rango de fechas [inicio, fin] (ambas incluidas) una lista de rangos ya cubiertos, devolviendo la lista de rangos que faltan
+def get_rangos_faltantes(inicio, fin, rangosCubiertos):
+    faltantes = []
+    actual = inicio
+    for inicioCubierto, finCubierto in sorted(rangosCubiertos):
+        if finCubierto < actual:
+            continue
+        if inicioCubierto > fin:
+            break
+        if inicioCubierto > actual:
+            faltantes.append((actual, inicioCubierto - timedelta(days=1)))
+        actual = max(actual, finCubierto + timedelta(days=1))
+        if actual > fin:
+            break
+    if actual <= fin:
+        faltantes.append((actual, fin))
+    return faltantes
+
+#Función para unir una lista de rangos de fechas, fusionando los que se solapan o son consecutivos
+def unir_rangos(rangos):
+    unidos = []
+    for inicio, fin in sorted(rangos):
+        if unidos and inicio <= unidos[-1][1] + timedelta(days=1):
+            unidos[-1] = (unidos[-1][0], max(unidos[-1][1], fin))
+        else:
+            unidos.append((inicio, fin))
+    return unidos
+
+#Función para quedarse con las barras de un dataframe indexado por fecha entre dos fechas (date), ambas incluidas
+def recortar_fechas(datos, inicio, fin):
+    if datos.empty:
+        return datos
+    return datos.loc[pd.Timestamp(inicio):pd.Timestamp(fin)]
+
+@dataclass
+class CachePrecios:
+    #Esta clase representa una caché en disco de series de precios, identificadas por el API, el símbolo y el intervalo de las barras. Para cada serie se
+    #guardan las barras ya descargadas y los rangos de fechas que ya se han consultado, de forma que ante una nueva petición solo se descargan los huecos
+    #Los atributos van a ser:
+    #Ruta: Directorio donde se guardan las series
+    #Activa: Si está a False no se lee ni se escribe nada en disco, y todas las peticiones se descargan
+    #Refrescar: Si está a True se ignoran los rangos guardados antes de esta ejecución, volviendo a descargarlos y sobreescribiéndolos
+    #Refrescadas: Conjunto de series que ya se han vuelto a descargar en esta ejecución, y que por tanto ya no hay que ignorar
+    #Aciertos: Número de peticiones servidas íntegramente desde la caché
+    #Fallos: Número de peticiones para las que ha habido que descargar algún rango
+    #Descargas: Número total de llamadas realizadas al API
+    #Cerrojo: Cerrojo que protege los contadores, ya que la caché puede usarse desde varios hilos a la vez (siempre que sea con series distintas)
+
+    ruta: str
+    activa: bool
+    refrescar: bool
+    refrescadas: set
+    aciertos: int
+    fallos: int
+    descargas: int
+    cerrojo: threading.Lock
+
+    def __init__(self, ruta, activa=True, refrescar=False):
+        self.ruta = ruta
+        self.activa = activa
+        self.refrescar = refrescar
+        self.refrescadas = set()
+        self.aciertos = 0
+        self.fallos = 0
+        self.descargas = 0
+        self.cerrojo = threading.Lock()
+        if self.activa:
+            Path(self.ruta).mkdir(parents=True, exist_ok=True)
+
+    #Devuelve la ruta del archivo asociado a una serie
+    def obtenerArchivo(self, api, simbolo, intervalo):
+        return Path(self.ruta) / (api + "_" + simbolo + "_" + intervalo + ".pkl")
+
+    #Devuelve las barras y los rangos cubiertos guardados para una serie, o un dataframe vacío y una lista vacía si no hay nada guardado
+    def leer(self, api, simbolo, intervalo):
+        archivo = self.obtenerArchivo(api, simbolo, intervalo)
+        if (self.refrescar and not (archivo in self.refrescadas)) or not archivo.exists():
+            return pd.DataFrame(), []
+        try:
+            with open(archivo, "rb") as f:
+                contenido = pickle.load(f)
+            return contenido["datos"], contenido["rangos"]
+        except Exception as e:
+            print("El archivo de caché " + str(archivo) + " no es válido, se ignorará")
+            return pd.DataFrame(), []
+
+    #Guarda las barras y los rangos cubiertos de una serie
+    def escribir(self, api, simbolo, intervalo, datos, rangos):
+        archivo = self.obtenerArchivo(api, simbolo, intervalo)
+        try:
+            with open(archivo, "wb") as f:
+                pickle.dump({"datos": datos, "rangos": rangos}, f)
+            self.refrescadas.add(archivo)
+        except Exception as e:
+            print("Error al guardar el archivo de caché " + str(archivo))
+
+    #Devuelve las barras de una serie entre dos fechas (ambas incluidas), descargando únicamente los rangos que no estén ya en la caché
+    #Api, Simbolo, Intervalo: Identifican a la serie
+    #Inicio, Fin: Fechas (date) del rango pedido
+    #Descargar: Función que recibe un rango de fechas (inicio, fin) y devuelve un dataframe con las barras de ese rango, indexado por fecha. Puede devolver
+    #más barras de las pedidas (como alpha_vantage, que no permite pedir rangos), en cuyo caso también se guardan
+    def obtener(self, api, simbolo, intervalo, inicio, fin, descargar):
+        return self.obtenerPeriodos(api, simbolo, intervalo, [(inicio, fin)], descargar)[0]
+
+    #Devuelve la lista de rangos de fechas que habría que descargar para cubrir los períodos pedidos de una serie
+    def obtenerFaltantes(self, api, simbolo, intervalo, periodos):
+        rangos = self.leer(api, simbolo, intervalo)[1] if self.activa else []
+        return [faltante for inicio, fin in unir_rangos(periodos) for faltante in get_rangos_faltantes(inicio, fin, rangos)]
+
+    #Devuelve las barras de una serie para cada uno de los períodos (inicio, fin) pedidos, haciendo como mucho una única descarga que abarque todos los rangos
+    #que falten en la caché, de forma que varios períodos solapados o consecutivos no den lugar a varias llamadas al API
+    #Los parámetros son los mismos que los de obtener, salvo Periodos, que es una lista de tuplas de fechas (date)
+    def obtenerPeriodos(self, api, simbolo, intervalo, periodos, descargar):
+        if not self.activa:
+            datos = pd.DataFrame()
+            rangos = []
+        else:
+            datos, rangos = self.leer(api, simbolo, intervalo)
+
+        #Las barras del día en curso pueden no ser definitivas, por lo que nunca damos por cubierto el día de hoy ni los posteriores
+        ultimoDiaCubrible = date.today() - timedelta(days=1)
+        faltantes = [faltante for inicio, fin in unir_rangos(periodos) for faltante in get_rangos_faltantes(inicio, fin, rangos)]
+        if not faltantes:
+            with self.cerrojo:
+                self.aciertos += 1
+        else:
+            with self.cerrojo:
+                if self.activa:
+                    self.fallos += 1
+                self.descargas += 1
+            #Descargamos de una sola vez desde el comienzo del primer hueco hasta el final del último
+            inicioDescarga = faltantes[0][0]
+            finDescarga = faltantes[-1][1]
+            nuevos = descargar(inicioDescarga, finDescarga)
+            datos = nuevos if datos.empty else pd.concat([datos, nuevos])
+            #Si una barra se ha descargado varias veces nos quedamos con la más reciente
+            datos = datos[~datos.index.duplicated(keep="last")].sort_index()
+
+            if self.activa:
+                #El rango cubierto es el pedido, ampliado a lo que haya devuelto realmente el API
+                inicioCubierto, finCubierto = inicioDescarga, finDescarga
+                if not nuevos.empty:
+                    inicioCubierto = min(inicioCubierto, nuevos.index.min().date())
+                    finCubierto = max(finCubierto, nuevos.index.max().date())
+                finCubierto = min(finCubierto, ultimoDiaCubrible)
+                if inicioCubierto <= finCubierto:
+                    rangos = unir_rangos(rangos + [(inicioCubierto, finCubierto)])
+                self.escribir(api, simbolo, intervalo, datos, rangos)
+
+        return [recortar_fechas(datos, inicio, fin) for inicio, fin in periodos]
+
+    #Devuelve un resumen en texto de los contadores de la caché
+    def obtenerResumen(self):
+        if not self.activa:
+            return "Caché desactivada: " + str(self.descargas) + " descargas"
+        return "Caché: " + str(self.aciertos) + " aciertos, " + str(self.fallos) + " fallos, " + str(self.descargas) + " descargas"
@@ -1,141 +1,28 @@
 import argparse
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.ticker as ticker
 import textwrap
 import sys
-import seaborn as sns
 import json
 import datetime
 from seriePrecios import SeriePrecios
-from data_utils import build_corr_matrix, get_simulacion_valores, save_csv, save_json, normalizar_texto
+from data_utils import build_corr_matrix, save_csv, normalizar_texto, save_binario, load_binario, load_json, exists_route
+from simulacion import get_bloques_simulacion_cartera, get_bloques_simulacion_valores, get_bloques_simulacion_historica, get_resumen_simulacion
+from simulacion import juntar_bloques_cartera, juntar_bloques_valores, get_secuencia_semillas, modelosSimulacion, precisionesSimulacion, TAMANIO_BLOQUE
+from simulacion import LONGITUD_BLOQUE, muestreosSimulacion, get_media_valor_final, MAX_DIMENSION_SOBOL, separar_bloques_cartera, EstadisticasOnline
+from convergencia import get_informe_convergencia, REPLICAS_CONVERGENCIA
+from indicadores import get_indicador, get_clave_indicador
+from alineacion import politicasAlineacion, get_fechas_alineadas, get_matriz_alineada, get_inicio_comun
+from riesgo import RiesgoSimulacion, get_abanico_percentiles, NIVELES_CONFIANZA
+from perfil import etapa, iniciar_perfil, guardar_perfil
+from covarianza import estimadoresCovarianza, get_matriz_correlacion, get_correlaciones_moviles, get_series_pares, VENTANA_CORRELACION
+from graficas import grafica_simulaciones, grafica_resumen_simulaciones, grafica_sectores, grafica_media_movil, grafica_RSI_activo, mapa_calor
+from formatos import save_tabla, save_simulaciones, formatosSalida
+from graficas import grafica_correlaciones_moviles, animacion_correlaciones_moviles, realizar_graficas, configurar_graficas, formatosGraficas
+from graficas import grafica_convergencia
 from dataclasses import dataclass, asdict
 from typing import List
 
-#Función para visualizar en un gráfico las simulaciones realizadas para un valor o cartera
-def grafica_simulaciones(data, titulo):
-    data.plot(figsize=(10,5))
-    plt.title(titulo)
-    #Imponemos que las etiquetas del eje de abscisas sean números enteros, ya que representan días
-    plt.gca().xaxis.set_major_locator(ticker.MaxNLocator(integer=True))
-    plt.xlabel("Días")
-    plt.ylabel("Valores")
-    plt.legend(title="Simulaciones")
-    plt.grid(True)
-    plt.show()
-
-#Función para visualizar un diagrama de sectores, dadas una lista de etiquetas, sus correspondientes tamaños en el diagrama (sobre 100) y el título que deseemos ponerle
-def grafica_sectores(etiquetas, tamanios, titulo):
-    if len(etiquetas) != len(tamanios):
-        print("Debe haber el mismo número de etiquetas que de tamaños")
-        return False
-    
-    if np.sum(np.array(tamanios)) != 100:
-        print("El total de los tamaños debe sumar 100")
-        return False
-    
-    #Queremos que se ordenen por los tamaños, de mayor a menor
-    ordenados = sorted(zip(etiquetas, tamanios), key=lambda x: x[1], reverse=True)
-    etiquetas_ordenados, tamanios_ordenados = zip(*ordenados)
-
-    #Indicamos que se resalte el sector más grande
-    resalte = np.zeros(len(etiquetas)).tolist()
-    resalte[0] = 0.05
-
-    fig, ax = plt.subplots(figsize=(5,5))
-    #Indicamos que se muestre el porcentaje de cada sector, que empiece en la parte superior y que tenga sombra
-    ax.pie(tamanios_ordenados, labels=etiquetas_ordenados, explode=resalte, autopct="%1.1f%%", startangle=90, shadow=True)
-    ax.set_title(titulo)
-    #Queremos que se visualize un círculo perfecto
-    ax.axis("equal")
-    plt.show()
-
-    return True
-
-#Función para visualizar la media móvil de una cartera con una ventana de n días
-def grafica_media_movil(n,cartera):
-    activos = cartera.obtenerActivos()
-    pesos = cartera.obtenerPesos()
-    fechas = cartera.obtenerFechas()
-
-    #Comprobamos que n es mayor que 0 y menor o igual que el número de fechas
-    if n <= 0 or n > fechas.shape[0]:
-        print("El tamaño de la ventana debe ser mayor que 0 y menor o igual que el número de entradas de la serie")
-        return False
-
-    #Como estamos usando media móvil simple y las series temporales de los activos están alineadas temporalmente, podemos calcular
-    #la media móvil de la cartera como la suma ponderada de las medias móviles de sus activos.
-    mediasMoviles = np.vstack([activo.obtenerMediaMovilSimple(n) for activo in activos])
-    mediasMovilesPonderadas = np.sum(mediasMoviles*pesos[:,np.newaxis],axis=0)
-    #Para ver la tendencia de la cartera, visualizamos la media móvil junto con los precios de cierre
-    preciosCierre = np.vstack([activo.obtenerClosePrices() for activo in activos])
-    preciosCierrePonderados = np.sum(preciosCierre*pesos[:,np.newaxis],axis=0)
-
-
-    plt.figure(figsize=(10,6))
-    plt.plot(fechas,preciosCierrePonderados, label="Valor cartera", color='steelblue')
-    #Como es media móvil de n días, no tenemos entrada de fecha hasta el día n del período
-    plt.plot(fechas[n-1:],mediasMovilesPonderadas, label="Media móvil " +  str(n) + " días", color='orange', linewidth=2)
-    plt.xlabel("Fecha")
-    plt.ylabel("Valor ponderado")
-    plt.title("Evolución de " + cartera.obtenerNombreCartera() + " y su media móvil (" + str(n) + " días)")
-    plt.legend()
-    plt.show()
-
-    return True
-
-#Función para visualizar el RSI de las componentes de una cartera, con una ventana de 14 días
-def grafica_RSI_activos(cartera):
-        fechas = cartera.obtenerFechas()
-
-        #Comprobamos que el número de fechas es mayor o igual que 15
-        if fechas.shape[0] < 15:
-            print("El número de entradas en las series temporales de los activos debe ser mayor o igual que 15")
-            return False
-    
-        for activo in cartera.activos:
-            fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(10,7), sharex=True, gridspec_kw={'height_ratios':[3,1]})
-
-            ax1.plot(fechas, activo.obtenerClosePrices(), label="Precio", color="steelblue")
-            ax1.set_title("Precio y RSI (14 días) " + activo.obtenerNombreActivo())
-            ax1.set_ylabel("Precio (USD)")
-            ax1.legend(loc="upper left")
-
-            #Como hemos calculado el RSI con ventana de 14 días, no tenemos entrada de fecha hasta el día 15 del período estudiado
-            ax2.plot(fechas[14:],activo.obtenerRSI(), color='darkorange', label='RSI (14 días)')
-            ax2.axhline(70, color='red', linestyle='--', linewidth=1)
-            ax2.axhline(30, color='green', linestyle='--', linewidth=1)
-            ax2.fill_between(fechas[14:], 70, 100, color='red', alpha=0.1)
-            ax2.fill_between(fechas[14:], 0, 30, color='green', alpha=0.1)
-            ax2.set_ylabel("RSI")
-            ax2.set_xlabel("Fecha")
-            ax2.set_ylim(0, 100)
-            ax2.legend(loc="upper left")
-
-            plt.tight_layout()
-            plt.show()
-
-            return True
-
-
-#Función para visualizar una matriz de correlación mediante un mapa de calor, dadas también las etiquetas cuya correlación está representada por la matriz
-def mapa_calor(matriz_corr, etiquetas, titulo):
-    if not np.array_equal(matriz_corr.T, matriz_corr):
-        print("La matriz de correlación debe ser simétrica")
-        return False
-    
-    #Como es simétrica, es igual comparar por su número de filas que por su número de columnas
-    if len(etiquetas) != matriz_corr.shape[0]:
-        print("Debe haber tantas etiquetas como filas/columnas tiene la matriz de correlación")
-        return False
-    
-    sns.heatmap(matriz_corr, annot=True, xticklabels=etiquetas, yticklabels=etiquetas, cmap="coolwarm", center=0)
-    plt.title(titulo)
-    plt.show()
-
-    return True
-
 @dataclass
 class Cartera:
     #El parámetro archivosCSV va a contener una lista de ficheros CSV generados por extractor.py, y rutaCSV el directorio donde se encuentran todos ellos
@@ -145,20 +32,35 @@ class Cartera:
     #Pesos: Lista de pesos de cada uno de los activos en la cartera
     #ReturnsCartera: Serie con los retornos logarítmicos de todos los activos de la cartera para el período considerado
     #MatrizCorrelacion: Matriz de correlación de los activos de la cartera
+    #EstimadorCovarianza: Estimador con el que se ha calculado la matriz de correlación (muestral, ledoitwolf o ewma, ver covarianza.py)
     #ClosePonderado: Lista de precios ponderados de cierre para la cartera
-    #Dates: Lista de fechas de las series de precios que componen la cartera
+    #Dates: Lista de fechas a las que se han alineado las series de precios que componen la cartera
+    #PoliticaAlineacion: Política con la que se han alineado por fecha las series (interseccion, union o habiles, ver alineacion.py)
+    #PreciosAlineados: Matriz de precios de cierre alineados de dimensiones (días, activos), de la que se obtienen los retornos, las correlaciones y el
+    #precio ponderado de la cartera
     #NombreCartera: Nombre con el que queremos identificar a la cartera
+    #CacheIndicadores: Indicadores técnicos ya calculados para todos los activos a la vez, identificados por su nombre y sus parámetros
+    #ResumenesRiesgo: Métricas de riesgo de las simulaciones de Monte Carlo realizadas, identificadas por el nombre de sus archivos, para incluirlas en el informe
 
     activos: List[SeriePrecios]
     numActivos: int
     pesos: np.array
     returnsCartera: pd.DataFrame
     matrizCorrelacion: np.array
+    estimadorCovarianza: str
     closePonderado: np.array
     dates: np.array
+    politicaAlineacion: str
+    preciosAlineados: np.array
     nombreCartera: str
-
-    def __init__(self, archivosCSV, rutaCSV, pesos, nombreCartera):
+    cacheIndicadores: dict
+    resumenesRiesgo: dict
+
+    #Alineacion: Política de alineación de las fechas de las series, ya que los activos de distintos mercados no cotizan los mismos días
+    #Estimador: Estimador de la matriz de correlación. Con carteras grandes y pocos días conviene usar ledoitwolf, ya que la muestral puede no ser invertible
+    def __init__(self, archivosCSV, rutaCSV, pesos, nombreCartera, alineacion="interseccion", estimador="muestral"):
+        self.cacheIndicadores = {}
+        self.resumenesRiesgo = {}
         try:
             #Debemos comprobar en primer lugar que los archivos CSV compartidos son de activos distintos
             #Recordemos que el formato de los CSV es api_activo_fechaInicio_fechaFin
@@ -168,24 +70,27 @@ class Cartera:
                 return
             
             self.numActivos = len(activos)
-            
-            #Debemos comprobar que todas las fechas de inicio son iguales, y lo mismo con las de fin
-            fechasInicio = [archivo.split('_')[2] for archivo in archivosCSV]
-            if len(set(fechasInicio)) != 1:
-                print("La fecha de inicio del período en todos los archivos debe ser la misma")
+
+            if not (alineacion in politicasAlineacion):
+                print("La política de alineación debe ser interseccion, union o habiles")
                 return
+            self.politicaAlineacion = alineacion
 
-            
-            fechasFin = [archivo.split('_')[3] for archivo in archivosCSV]
-            if len(set(fechasFin)) != 1:
-                print("La fecha de fin del período en todos los archivos debe ser la misma")
+            if not (estimador in estimadoresCovarianza):
+                print("El estimador de covarianzas debe ser muestral, ledoitwolf o ewma")
                 return
+            self.estimadorCovarianza = estimador
             
             #Vamos introduciendo en la lista todas las instancias de SeriePrecios creadas
             self.activos = [SeriePrecios(rutaCSV + "\\" + archivo) for archivo in archivosCSV]
 
-            #Como las fechas son las mismas para todos los activos, cojemos el primero por ejemplo, y los pasamos a formato datetime
-            self.dates = np.array(self.activos[0].obtenerFechas(), dtype='datetime64[D]')
+            #Las series pueden tener fechas distintas (por ejemplo, festivos de distintos mercados), así que las alineamos a unas fechas comunes
+            with etapa("alineacion"):
+                self.dates = get_fechas_alineadas([activo.obtenerFechas() for activo in self.activos], alineacion)
+            #Necesitamos al menos dos fechas para tener algún retorno
+            if self.dates.shape[0] < 2:
+                print("Las series de los activos no tienen suficientes fechas en común")
+                return
 
             #Debe haber tantos pesos como activos tenga la cartera
             if self.numActivos != len(pesos):
@@ -198,13 +103,27 @@ class Cartera:
                 print("Los pesos deben sumar 1")
                 return
             
-            #Juntamos las series de retornos de cada uno de los activos en un único dataframe
-            self.returnsCartera = pd.concat([pd.Series(self.activos[i].obtenerReturns()) for i in range(self.numActivos)], axis=1)
-            #Calculamos la matriz de correlación de los retornos
-            self.matrizCorrelacion = build_corr_matrix(self.returnsCartera)
+            #Los retornos, las correlaciones y el precio ponderado se obtienen todos de la matriz de precios de cierre alineados
+            with etapa("alineacion"):
+                self.preciosAlineados = get_matriz_alineada([activo.obtenerFechas() for activo in self.activos],
+                                                            [activo.obtenerClosePrices() for activo in self.activos], self.dates)
+                #Juntamos los retornos logarítmicos de todos los activos en un único dataframe, que envuelve la matriz sin copiarla. Los días anteriores al
+                #comienzo de cada activo no tienen retorno (NaN)
+                self.returnsCartera = pd.DataFrame(np.diff(np.log(self.preciosAlineados), axis=0), copy=False)
+            #Necesitamos también al menos dos fechas en las que coticen todos los activos
+            inicioComun = self.obtenerInicioComun()
+            if self.dates.shape[0] - inicioComun < 2:
+                print("Las series de los activos no tienen suficientes fechas en común")
+                return
+            #Calculamos la matriz de correlación de los retornos con el estimador elegido. La muestral se calcula por pares, con los días en los que cotizan
+            #ambos activos, mientras que el resto de estimadores necesitan los retornos de todos los activos, por lo que solo usan los días comunes
+            with etapa("correlaciones"):
+                if estimador == "muestral":
+                    self.matrizCorrelacion = build_corr_matrix(self.returnsCartera)
+                else:
+                    self.matrizCorrelacion = get_matriz_correlacion(self.returnsCartera.to_numpy()[inicioComun:], estimador)
 
-            preciosCierre = np.vstack([activo.obtenerClosePrices() for activo in self.activos])
-            self.closePonderado = np.sum(preciosCierre*self.pesos[:,np.newaxis],axis=0)
+            self.closePonderado = self.preciosAlineados @ self.pesos
 
             self.nombreCartera = nombreCartera
         except Exception as e:
@@ -222,9 +141,56 @@ class Cartera:
     def obtenerActivos(self):
         return self.activos
     
-    #Devuelve todas las fechas de las series de precios que componen la cartera
+    #Devuelve las fechas a las que se han alineado las series de precios que componen la cartera
     def obtenerFechas(self):
         return self.dates
+
+    #Devuelve la política con la que se han alineado las fechas de las series
+    def obtenerPoliticaAlineacion(self):
+        return self.politicaAlineacion
+
+    #Devuelve la matriz de precios de cierre alineados, de dimensiones (días, activos). Los días anteriores al comienzo de cada activo son NaN
+    def obtenerPreciosAlineados(self):
+        return self.preciosAlineados
+
+    #Devuelve la posición de la primera fecha alineada en la que cotizan todos los activos. Con la política de intersección es siempre 0
+    def obtenerInicioComun(self):
+        return get_inicio_comun(self.preciosAlineados)
+
+    #Devuelve el estimador con el que se ha calculado la matriz de correlación
+    def obtenerEstimadorCovarianza(self):
+        return self.estimadorCovarianza
+
+    #Cálculo y obtención de las correlaciones móviles de todos los pares de activos, como una pila de matrices de dimensiones (ventanas, activos, activos),
+    #junto con la fecha final de cada ventana. Se guardan igual que los indicadores, para no recalcularlas
+    #Ventana: Número de días de retornos de cada ventana
+    def obtenerCorrelacionesMoviles(self, ventana=VENTANA_CORRELACION):
+        clave = ("correlacionesMoviles", ventana)
+        if not (clave in self.cacheIndicadores):
+            #Las ventanas solo recorren los días en los que cotizan todos los activos. El retorno de la posición k corresponde a la fecha k + 1, por lo que la
+            #ventana que empieza en k termina en la fecha k + ventana
+            inicioComun = self.obtenerInicioComun()
+            self.cacheIndicadores[clave] = (self.dates[inicioComun + ventana:],
+                                            get_correlaciones_moviles(self.returnsCartera.to_numpy(dtype=float)[inicioComun:], ventana))
+        return self.cacheIndicadores[clave]
+
+    #Método que guarda en un CSV las correlaciones móviles de cada par de activos, con una columna por par y una fila por fecha final de ventana, y genera
+    #su mapa de calor y su animación. Devuelve False si no se han podido calcular
+    def guardarCorrelacionesMoviles(self, ventana, directorioCSV):
+        fechas, correlaciones = self.obtenerCorrelacionesMoviles(ventana)
+        if correlaciones.shape[0] == 0:
+            return False
+        nombresActivos = [activo.obtenerNombreActivo() for activo in self.activos]
+        seriesPares, nombresPares = get_series_pares(correlaciones, nombresActivos)
+        dataframePares = pd.DataFrame(seriesPares, index=pd.Index(fechas, name="Fecha"), columns=nombresPares)
+        save_csv(dataframePares, directorioCSV + "\\" + self.nombreCartera + "_correlacionesMoviles.csv", True)
+
+        titulo = "Correlaciones móviles " + str(ventana) + " días " + self.nombreCartera
+        if not grafica_correlaciones_moviles(fechas, seriesPares, nombresPares, titulo):
+            print("Error al visualizar correlaciones móviles entre los activos de la cartera")
+        if not animacion_correlaciones_moviles(fechas, correlaciones, nombresActivos, "Animación " + titulo):
+            print("Error al animar correlaciones móviles entre los activos de la cartera")
+        return True
     
     #Devuelve todos los pesos de la cartera
     def obtenerPesos(self):
@@ -237,7 +203,30 @@ class Cartera:
     #Devuelve el número de activos que componen la cartera
     def obtenerNumActivos(self):
         return self.numActivos
-    
+
+    #Devuelve la matriz de precios alineados de un tipo (close, high o low) de todos los activos, de dimensiones (activos, días). Como los indicadores se
+    #calculan para todos los activos a la vez, la matriz empieza en la primera fecha en la que cotizan todos (ver obtenerInicioComun)
+    def obtenerMatrizPrecios(self, tipo):
+        clave = ("precios", tipo)
+        if not (clave in self.cacheIndicadores):
+            inicioComun = self.obtenerInicioComun()
+            if tipo == "close":
+                self.cacheIndicadores[clave] = np.ascontiguousarray(self.preciosAlineados[inicioComun:].T)
+            else:
+                fila = {"high": 1, "low": 2}[tipo]
+                self.cacheIndicadores[clave] = np.ascontiguousarray(get_matriz_alineada([activo.obtenerFechas() for activo in self.activos],
+                                                                                        [activo.ohlcv[fila] for activo in self.activos],
+                                                                                        self.dates[inicioComun:]).T)
+        return self.cacheIndicadores[clave]
+
+    #Cálculo y obtención de un indicador técnico (sma, ema, rsi, macd, bollinger o atr) de todos los activos de la cartera a la vez, sobre la matriz de precios
+    #de dimensiones (activos, días). El resultado se guarda, de forma que volver a pedir el mismo indicador con los mismos parámetros no lo recalcula
+    def obtenerIndicadores(self, nombre, **parametros):
+        clave = get_clave_indicador(nombre, parametros)
+        if not (clave in self.cacheIndicadores):
+            precios = {tipo: self.obtenerMatrizPrecios(tipo) for tipo in ["close", "high", "low"]}
+            self.cacheIndicadores[clave] = get_indicador(nombre, precios, **parametros)
+        return self.cacheIndicadores[clave]
 
     #Simulación de un proceso de Monte Carlo para los valores de una cartera
     #Medias: Lista de medias de retornos logarítmicos para cada uno de los activos que componen la cartera
@@ -245,10 +234,64 @@ class Cartera:
     #ValorInicial: Valor inicial de la cartera
     #CarteraCompleta: Si está a True querrá decir que queremos que se simule la cartera en su conjunto, mientras que si está a False indicará que queremos
     #que se haga por cada activo por separado
-    #DirectorioCSV: Carpeta donde se desea guardar todos los CSV generados por esta función
-    def simulacionMonteCarlo(self, medias, desviaciones_tipicas, numSimulaciones, numDias, valorInicial, carteraCompleta, directorioCSV):
-        #Inicializamos el nombre de las columnas de los dataframes que vamos a generar
-        nombreColumnas = ['Simulación ' + str(i+1) for i in range(numSimulaciones)]
+    #DirectorioCSV: Carpeta donde se desea guardar todos los archivos generados por esta función
+    #TamanioBloque: Número máximo de simulaciones que se generan a la vez
+    #Streaming: Si está a True, en lugar de guardar todas las simulaciones se guardan solo sus estadísticos por día, de forma que la memoria necesaria depende
+    #del tamaño de bloque y no del número de simulaciones
+    #Percentiles: Percentiles por día que se calculan en modo streaming
+    #NumMuestras: Número de simulaciones completas que se guardan en modo streaming
+    #Semilla: Semilla para la generación de números aleatorios. Para una misma semilla y tamaño de bloque los resultados son idénticos, sea cual sea el
+    #número de procesos
+    #Workers: Número de procesos entre los que se reparten los bloques de simulaciones
+    #NivelesConfianza: Niveles de confianza (en porcentaje) del VaR y el CVaR que se calculan sobre las simulaciones
+    #Modelo: Modelo de generación de los retornos (ver modelosSimulacion en simulacion.py). Con bootstrap y bloques se remuestrean los retornos logarítmicos
+    #históricos (los alineados de la cartera si se simula completa, o los de cada activo si no), por lo que las medias y desviaciones típicas no se usan
+    #LongitudBloque: Longitud media de los tramos de días consecutivos del modelo bloques
+    #Formato: Formato de los archivos generados (ver formatosSalida en formatos.py)
+    #Precision: Tipo de los valores simulados (ver precisionesSimulacion en simulacion.py). Todos los bloques, de la cartera y de cada activo, se generan sobre
+    #los mismos buffers, ya que cada uno se consume antes de generar el siguiente
+    #Muestreo: Forma de obtener las normales estándar del modelo normal (ver muestreosSimulacion en simulacion.py)
+    #VariableControl: Si está a True, las métricas de riesgo incluyen también la probabilidad de pérdida y el drawdown máximo medio estimados con el valor
+    #final como variable de control, cuya media se conoce de forma exacta en el modelo normal
+    #SimulacionesActivos: Si está a True y se simula la cartera completa, se guardan también los valores de cada activo dentro de cada simulación de la
+    #cartera, en [nombreCartera]_[activo]_conjunta (o sus estadísticos por día en modo streaming). Sin streaming necesita tanta memoria adicional como la
+    #simulación de la cartera por cada activo
+    def simulacionMonteCarlo(self, medias, desviaciones_tipicas, numSimulaciones, numDias, valorInicial, carteraCompleta, directorioCSV, tamanioBloque=TAMANIO_BLOQUE,
+                             streaming=False, percentiles=(5, 50, 95), numMuestras=0, semilla=None, workers=1, nivelesConfianza=NIVELES_CONFIANZA,
+                             modelo="normal", longitudBloque=LONGITUD_BLOQUE, formato="csv", precision="float64", muestreo="aleatorio", variableControl=False,
+                             simulacionesActivos=False):
+        #El formato de los archivos debe ser uno de los disponibles
+        if not (formato in formatosSalida):
+            print("El formato de los archivos debe ser csv, parquet o npy")
+            return
+
+        #La precisión debe ser una de las disponibles
+        if not (precision in precisionesSimulacion):
+            print("La precisión de las simulaciones debe ser float64 o float32")
+            return
+
+        #El modelo debe ser uno de los disponibles
+        if not (modelo in modelosSimulacion):
+            print("El modelo de simulación debe ser normal, bootstrap o bloques")
+            return
+
+        #La longitud media de los bloques debe ser al menos de un día
+        if modelo == "bloques" and longitudBloque < 1:
+            print("La longitud media de los bloques debe ser al menos 1")
+            return
+
+        #El muestreo debe ser uno de los disponibles, y tanto los muestreos alternativos como la variable de control solo tienen sentido con el modelo normal
+        if not (muestreo in muestreosSimulacion):
+            print("El muestreo de las simulaciones debe ser aleatorio, antitetico o sobol")
+            return
+        if modelo != "normal" and (muestreo != "aleatorio" or variableControl):
+            print("Los muestreos antitetico y sobol y la variable de control solo pueden usarse con el modelo normal")
+            return
+
+        #Cada simulación de Sobol necesita una dimensión por día y activo simulado a la vez
+        if muestreo == "sobol" and numDias * (self.numActivos if carteraCompleta else 1) > MAX_DIMENSION_SOBOL:
+            print("Con el muestreo sobol el número de días (por el de activos, si se simula la cartera completa) no puede superar " + str(MAX_DIMENSION_SOBOL))
+            return
 
         #La longitud de la lista de medias debe ser igual al número de activos de la cartera
         if len(medias) != self.numActivos:
@@ -275,30 +318,179 @@ class Cartera:
             print("El valor inicial de la cartera debe ser positivo")
             return
 
+        #Cuando se simula cada activo por separado, cada uno de ellos tiene su propia secuencia de números aleatorios, independiente de las demás
+        secuenciaSemillas = get_secuencia_semillas(semilla)
+        semillasActivos = secuenciaSemillas.spawn(self.numActivos)
+
+        #Valor esperado teórico del valor final de la cartera completa y de cada activo, que se usan como variable de control
+        mediaControlCartera = None
+        mediasControlActivos = [None] * self.numActivos
+        if variableControl:
+            mediaControlCartera = get_media_valor_final(medias, desviaciones_tipicas, np.asarray(self.pesos, dtype=float) * valorInicial, numDias)
+            mediasControlActivos = [get_media_valor_final([medias[i]], [desviaciones_tipicas[i]], [self.pesos[i]*valorInicial], numDias)
+                                    for i in range(self.numActivos)]
+
+        #Generadores de los bloques de simulaciones de la cartera completa, con los valores de cada activo y los de la cartera, y de cada activo por separado
+        longitudModelo = longitudBloque if modelo == "bloques" else None
+        def get_bloques_cartera():
+            if modelo == "normal":
+                return get_bloques_simulacion_cartera(medias, desviaciones_tipicas, self.matrizCorrelacion, self.pesos, numSimulaciones, numDias, valorInicial,
+                                                      tamanioBloque, secuenciaSemillas, workers, precision, True, muestreo)
+            return get_bloques_simulacion_historica(self.returnsCartera.to_numpy(dtype=float), self.pesos, numSimulaciones, numDias, valorInicial,
+                                                    longitudModelo, tamanioBloque, secuenciaSemillas, workers, precision, True)
+
+        def get_bloques_activo(i):
+            if modelo == "normal":
+                return get_bloques_simulacion_valores(medias[i], desviaciones_tipicas[i], numSimulaciones, numDias, self.pesos[i]*valorInicial,
+                                                      tamanioBloque, semillasActivos[i], workers, precision, True, muestreo)
+            #Con un único activo, el valor de la "cartera" formada solo por él es directamente el del activo
+            returnsActivo = np.asarray(self.activos[i].obtenerReturns(), dtype=float)[:, None]
+            return (valores for _, valores in get_bloques_simulacion_historica(returnsActivo, [self.pesos[i]], numSimulaciones, numDias, valorInicial,
+                                                                                longitudModelo, tamanioBloque, semillasActivos[i], workers, precision,
+                                                                                True))
+
+        if streaming:
+            #En modo streaming las simulaciones se generan por bloques y solo se guardan sus estadísticos por día y, opcionalmente, una muestra de ellas
+            if carteraCompleta:
+                #De cada bloque se resumen a la vez los valores de la cartera, los pesos finales de cada activo y, si se piden, los valores de cada activo
+                estadisticasPesos = EstadisticasOnline(self.numActivos)
+                estadisticasActivos = [EstadisticasOnline(numDias) for _ in range(self.numActivos)] if simulacionesActivos else None
+                muestrasActivos = [[] for _ in range(self.numActivos)] if simulacionesActivos else None
+                bloques = separar_bloques_cartera(get_bloques_cartera(), estadisticasPesos, estadisticasActivos, muestrasActivos, numMuestras)
+                self.guardarResumenSimulacion(bloques, numDias, percentiles, numMuestras, directorioCSV, self.nombreCartera, valorInicial, nivelesConfianza,
+                                              formato, mediaControlCartera)
+                nombresActivos = [activo.obtenerNombreActivo() for activo in self.activos]
+                dataframePesos = self.dataframeEstadisticas(estadisticasPesos, percentiles, pd.Index(nombresActivos, name="Activo"))
+                save_tabla(dataframePesos, directorioCSV + "\\" + self.nombreCartera + "_pesosFinalesResumen", True, formato)
+                if simulacionesActivos:
+                    for i in range(self.numActivos):
+                        muestra = np.concatenate(muestrasActivos[i]) if muestrasActivos[i] else np.empty((0, numDias))
+                        self.guardarEstadisticas(estadisticasActivos[i], muestra, percentiles, directorioCSV,
+                                                 self.nombreCartera + "_" + nombresActivos[i] + "_conjunta", formato)
+            else:
+                for i in range(self.numActivos):
+                    bloques = get_bloques_activo(i)
+                    nombreArchivo = self.nombreCartera + "_" + self.activos[i].obtenerNombreActivo()
+                    self.guardarResumenSimulacion(bloques, numDias, percentiles, numMuestras, directorioCSV, nombreArchivo, self.pesos[i]*valorInicial,
+                                                  nivelesConfianza, formato, mediasControlActivos[i])
+            return
+
+        #Inicializamos el nombre de las columnas de los dataframes que vamos a generar
+        nombreColumnas = ['Simulación ' + str(i+1) for i in range(numSimulaciones)]
+
         if carteraCompleta:
-            #Usamos las propiedades de la combinación lineal de distribuciones normales
-            mediaCartera = self.pesos @ medias
-            #Calculamos la matriz de covarianzas para las desviaciones típicas dadas
-            matrizCovarianzas = self.matrizCorrelacion * np.outer(desviaciones_tipicas,desviaciones_tipicas)
-            #Usamos de nuevo las propiedades de la distribución normal
-            desviacionTipicaCartera = np.sqrt(self.pesos @ matrizCovarianzas @ self.pesos.T)
-            simulacion = get_simulacion_valores(mediaCartera, desviacionTipicaCartera, numSimulaciones, numDias, valorInicial)
-            #Juntamos en un único dataframe todas las simulaciones, siendo cada una de las columnas una simulación
-            dataframeSimulacion = pd.concat([pd.Series(simulacion[i]) for i in range(simulacion.shape[0])], axis=1)
-            dataframeSimulacion.columns = nombreColumnas
-            #Guardamos el dataframe en un .csv
-            save_csv(dataframeSimulacion, directorioCSV + "\\" + self.nombreCartera + ".csv", False)
-            grafica_simulaciones(dataframeSimulacion, self.nombreCartera)
+            #Simulamos conjuntamente todos los activos, con retornos correlados, y agregamos sus valores para obtener el de la cartera
+            valoresActivos = np.empty((self.numActivos, numSimulaciones, numDias), dtype=precision) if simulacionesActivos else None
+            with etapa("simulacion", self.nombreCartera):
+                simulacion, pesosFinales = juntar_bloques_cartera(get_bloques_cartera(), numSimulaciones, numDias, self.numActivos, precision, valoresActivos)
+            #Guardamos todas las simulaciones en el formato elegido
+            save_simulaciones(simulacion, directorioCSV + "\\" + self.nombreCartera, formato)
+            #Si se piden, guardamos también los valores de cada activo dentro de las mismas simulaciones de la cartera
+            nombresActivos = [activo.obtenerNombreActivo() for activo in self.activos]
+            if simulacionesActivos and simulacion.size > 0:
+                for i in range(self.numActivos):
+                    save_simulaciones(valoresActivos[i], directorioCSV + "\\" + self.nombreCartera + "_" + nombresActivos[i] + "_conjunta", formato)
+            #Guardamos también los pesos de cada activo al final de cada simulación, para poder ver cómo se han desviado de los iniciales
+            dataframePesos = pd.DataFrame(pesosFinales, index=nombreColumnas, columns=nombresActivos)
+            save_tabla(dataframePesos, directorioCSV + "\\" + self.nombreCartera + "_pesosFinales", True, formato)
+            self.guardarRiesgoSimulacion(simulacion, valorInicial, percentiles, nivelesConfianza, directorioCSV, self.nombreCartera, formato,
+                                         mediaControlCartera)
+            #Para la gráfica juntamos en un único dataframe todas las simulaciones, siendo cada una de las columnas una simulación. Al construirlo
+            #directamente desde la traspuesta de la matriz no se copian los datos
+            grafica_simulaciones(pd.DataFrame(simulacion.T, columns=nombreColumnas, copy=False), self.nombreCartera)
         else:
             for i in range(self.numActivos):
-                #Como valor inicial le pasamos la parte proporcional al peso que tenga el activo en la cartera
-                simulacion = get_simulacion_valores(medias[i], desviaciones_tipicas[i], numSimulaciones, numDias, self.pesos[i]*valorInicial)
-                dataframeSimulacion = pd.concat([pd.Series(simulacion[i]) for i in range(simulacion.shape[0])], axis=1)
-                dataframeSimulacion.columns = nombreColumnas
                 #Al nombre escogido para la cartera le añadimos el del activo que estamos 
                 nombreArchivo = self.nombreCartera + "_" + self.activos[i].obtenerNombreActivo()
-                save_csv(dataframeSimulacion, directorioCSV + "\\" + nombreArchivo + ".csv", False)
-                grafica_simulaciones(dataframeSimulacion, nombreArchivo)
+                #Como valor inicial le pasamos la parte proporcional al peso que tenga el activo en la cartera
+                with etapa("simulacion", nombreArchivo):
+                    simulacion = juntar_bloques_valores(get_bloques_activo(i), numSimulaciones, numDias, precision)
+                save_simulaciones(simulacion, directorioCSV + "\\" + nombreArchivo, formato)
+                self.guardarRiesgoSimulacion(simulacion, self.pesos[i]*valorInicial, percentiles, nivelesConfianza, directorioCSV, nombreArchivo, formato,
+                                             mediasControlActivos[i])
+                grafica_simulaciones(pd.DataFrame(simulacion.T, columns=nombreColumnas, copy=False), nombreArchivo)
+
+    #Método que consume por bloques una simulación de Monte Carlo, guardando en un archivo sus estadísticos por día y, si se pide, en otro una muestra de
+    #simulaciones
+    #Bloques: Iterable de bloques de simulaciones, de dimensiones (simulaciones, días)
+    #Percentiles: Lista de percentiles (entre 0 y 100) que se quieren calcular para cada día
+    #NumMuestras: Número de simulaciones completas que se quieren guardar
+    #NombreArchivo: Nombre base de los archivos generados
+    #ValorInicial, NivelesConfianza: Valor inicial de las simulaciones y niveles de confianza del VaR y el CVaR, para calcular sus métricas de riesgo
+    #Formato: Formato de los archivos generados
+    #MediaControl: Valor esperado teórico del valor final, para usarlo como variable de control en las métricas de riesgo, o None
+    def guardarResumenSimulacion(self, bloques, numDias, percentiles, numMuestras, directorioCSV, nombreArchivo, valorInicial, nivelesConfianza=NIVELES_CONFIANZA,
+                                 formato="csv", mediaControl=None):
+        riesgo = RiesgoSimulacion(valorInicial, mediaControl)
+        #En modo streaming las simulaciones se generan a la vez que se resumen, por lo que ambas cosas se miden en la misma etapa
+        with etapa("simulacion", nombreArchivo):
+            estadisticas, muestra = get_resumen_simulacion(bloques, numDias, numMuestras, riesgo)
+        self.guardarRiesgo(riesgo, nivelesConfianza, directorioCSV, nombreArchivo, formato)
+        self.guardarEstadisticas(estadisticas, muestra, percentiles, directorioCSV, nombreArchivo, formato)
+
+    #Método que devuelve un dataframe con los estadísticos acumulados en una instancia de EstadisticasOnline, con una fila por elemento (día o activo)
+    #Indice: Índice del dataframe, o None para numerar las filas
+    def dataframeEstadisticas(self, estadisticas, percentiles, indice=None):
+        resumen = {"Media": estadisticas.obtenerMedia(),
+                   "Desviación típica": estadisticas.obtenerDesviacionTipica(),
+                   "Mínimo": estadisticas.obtenerMinimo(),
+                   "Máximo": estadisticas.obtenerMaximo()}
+        for p in percentiles:
+            resumen["Percentil " + f"{p:g}"] = estadisticas.obtenerPercentil(p)
+        return pd.DataFrame(resumen, index=indice)
+
+    #Método que guarda los estadísticos por día de una simulación resumida en modo streaming y su muestra de simulaciones, y dibuja su gráfica
+    def guardarEstadisticas(self, estadisticas, muestra, percentiles, directorioCSV, nombreArchivo, formato="csv"):
+        dataframeResumen = self.dataframeEstadisticas(estadisticas, percentiles)
+        save_tabla(dataframeResumen, directorioCSV + "\\" + nombreArchivo + "_resumen", False, formato)
+
+        if muestra.shape[0] > 0:
+            save_simulaciones(muestra, directorioCSV + "\\" + nombreArchivo, formato)
+
+        grafica_resumen_simulaciones(dataframeResumen, percentiles, nombreArchivo + " (" + str(estadisticas.obtenerNumSimulaciones()) + " simulaciones)")
+
+    #Método que calcula las métricas de riesgo de una simulación de Monte Carlo completa, de dimensiones (simulaciones, días), y guarda en un archivo sus
+    #percentiles por día (abanico), además de las métricas de riesgo (ver guardarRiesgo)
+    def guardarRiesgoSimulacion(self, simulacion, valorInicial, percentiles, nivelesConfianza, directorioCSV, nombreArchivo, formato="csv", mediaControl=None):
+        if simulacion.size == 0:
+            return
+        riesgo = RiesgoSimulacion(valorInicial, mediaControl)
+        with etapa("riesgo", nombreArchivo):
+            riesgo.actualizar(simulacion)
+            abanico = get_abanico_percentiles(simulacion, percentiles)
+        dataframeAbanico = pd.DataFrame({"Percentil " + f"{p:g}": abanico[j] for j, p in enumerate(percentiles)})
+        save_tabla(dataframeAbanico, directorioCSV + "\\" + nombreArchivo + "_percentiles", False, formato)
+        self.guardarRiesgo(riesgo, nivelesConfianza, directorioCSV, nombreArchivo, formato)
+
+    #Método que guarda en un archivo las métricas de riesgo (VaR, CVaR, probabilidad de pérdida y distribución del drawdown máximo) acumuladas en una instancia
+    #de RiesgoSimulacion, y las añade a las que se incluyen en el informe de la cartera
+    def guardarRiesgo(self, riesgo, nivelesConfianza, directorioCSV, nombreArchivo, formato="csv"):
+        if riesgo.obtenerNumSimulaciones() == 0:
+            return
+        resumen = riesgo.obtenerResumen(nivelesConfianza)
+        self.resumenesRiesgo[nombreArchivo] = resumen
+        dataframeRiesgo = pd.DataFrame({"Valor": list(resumen.values())}, index=pd.Index(list(resumen.keys()), name="Métrica"))
+        save_tabla(dataframeRiesgo, directorioCSV + "\\" + nombreArchivo + "_riesgo", True, formato)
+
+    #Método que genera el informe de convergencia de la simulación de la cartera completa con el modelo normal (ver get_informe_convergencia), lo guarda en
+    #[nombreCartera]_convergencia, muestra el error típico de cada técnica con el mayor número de simulaciones y dibuja la gráfica de convergencia
+    #Replicas: Número de simulaciones independientes de cada técnica y número de simulaciones con las que se mide el error típico
+    #ErrorObjetivo: Error típico relativo que se quiere alcanzar, o None
+    #Devuelve el dataframe del informe, o None si no ha podido generarse
+    def informeConvergencia(self, medias, desviaciones_tipicas, numSimulaciones, numDias, valorInicial, directorioCSV, replicas=REPLICAS_CONVERGENCIA,
+                            errorObjetivo=None, tamanioBloque=TAMANIO_BLOQUE, semilla=None, workers=1, precision="float64", formato="csv"):
+        if numDias * self.numActivos > MAX_DIMENSION_SOBOL:
+            print("Para el informe de convergencia el número de días por el de activos no puede superar " + str(MAX_DIMENSION_SOBOL))
+            return None
+        with etapa("convergencia", self.nombreCartera):
+            informe = get_informe_convergencia(medias, desviaciones_tipicas, self.matrizCorrelacion, self.pesos, numSimulaciones, numDias, valorInicial,
+                                               replicas, errorObjetivo, tamanioBloque, semilla, workers, precision)
+        if informe is None:
+            return None
+        save_tabla(informe, directorioCSV + "\\" + self.nombreCartera + "_convergencia", False, formato)
+        print(informe[informe["Simulaciones"] == informe["Simulaciones"].max()].to_string(index=False))
+        grafica_convergencia(informe, self.nombreCartera + " (convergencia)")
+        return informe
 
     #Método para generar un informe de la información más relevante de la cartera
     def report(self):
@@ -306,6 +498,8 @@ class Cartera:
         texto = textwrap.dedent(f"""
                 # Informe de la cartera **{self.nombreCartera}** 
                 ## Número de activos: **{self.numActivos}**
+                ## Fechas alineadas ({self.politicaAlineacion}): **{self.dates.shape[0]}**
+                ## Estimador de las correlaciones: **{self.estimadorCovarianza}**
         """)
 
         for i in range(self.numActivos):
@@ -331,6 +525,23 @@ class Cartera:
                 else:
                     continue
 
+        #Si se han realizado simulaciones de Monte Carlo, añadimos sus métricas de riesgo, con las pérdidas en valor y en porcentaje del valor inicial
+        if self.resumenesRiesgo:
+            texto += "\n\n## Riesgo de las simulaciones de Monte Carlo\n\n"
+        for nombre, resumen in self.resumenesRiesgo.items():
+            valorInicial = resumen["Valor inicial"]
+            texto += f"### {nombre}\n\n"
+            texto += f"Simulaciones: **{resumen['Simulaciones']}**, valor inicial: **{valorInicial:g}**  \n"
+            texto += f"Probabilidad de acabar por debajo del valor inicial: **{100 * resumen['Probabilidad de pérdida']:.2f}%**  \n"
+            for clave, valor in resumen.items():
+                if clave.startswith("VaR") or clave.startswith("CVaR"):
+                    texto += f"{clave}: **{valor:.2f}** (**{100 * valor / valorInicial:.2f}%**)  \n"
+            texto += f"Drawdown máximo: media **{100 * resumen['Drawdown máximo medio']:.2f}%**"
+            for clave, valor in resumen.items():
+                if clave.startswith("Drawdown máximo percentil"):
+                    texto += f", percentil {clave.split()[-1]} **{100 * valor:.2f}%**"
+            texto += "\n\n"
+
         try:
             nombreMd = "informe" + self.nombreCartera + ".md" 
             with open(nombreMd, "w", encoding="utf-8") as f:
@@ -339,25 +550,29 @@ class Cartera:
         except Exception as e:
             print("Hubo un error al intentar generar " + nombreMd)
 
-    def plots_report(self):
+    #Método para generar las gráficas de la cartera: distribución de pesos, correlaciones, media móvil y RSI de cada activo
+    #Workers: Número de procesos entre los que se reparten las gráficas cuando se exportan a archivos
+    def plots_report(self, workers=1):
         nombresActivos = [self.activos[i].obtenerNombreActivo() for i in range(self.numActivos)]
-
-        if not grafica_sectores(nombresActivos, self.pesos*100, "Pesos " + self.nombreCartera):
-            print("Error al visualizar distribución de pesos entre los activos de la cartera")
-            return
-        
-        if not mapa_calor(self.matrizCorrelacion, nombresActivos, "Correlaciones " + self.nombreCartera):
-            print("Error al visualizar mapa de calor de las correlaciones entre los activos de la cartera")
-            return
-        
-        #En este caso hemos elegido una ventana de 20 días
-        if not grafica_media_movil(20, self):
-            print("Error al visualizar media móvil de 20 días para la cartera")
-            return
-        
-        if not grafica_RSI_activos(self):
+        fechas = self.obtenerFechas()
+
+        #Cada gráfica es una tarea independiente, junto con el mensaje a mostrar si falla
+        tareas = [((grafica_sectores, (nombresActivos, self.pesos*100, "Pesos " + self.nombreCartera)),
+                   "Error al visualizar distribución de pesos entre los activos de la cartera"),
+                  ((mapa_calor, (self.matrizCorrelacion, nombresActivos, "Correlaciones " + self.nombreCartera)),
+                   "Error al visualizar mapa de calor de las correlaciones entre los activos de la cartera"),
+                  #En este caso hemos elegido una ventana de 20 días
+                  ((grafica_media_movil, (20, self)), "Error al visualizar media móvil de 20 días para la cartera")]
+        if fechas.shape[0] < 15:
+            print("El número de entradas en las series temporales de los activos debe ser mayor o igual que 15")
             print("Error al visualzizar RSI de las componentes de la cartera")
-            return
+        else:
+            tareas += [((grafica_RSI_activo, (activo.obtenerFechas(), activo)), "Error al visualzizar RSI de las componentes de la cartera") for activo in self.activos]
+
+        resultados = realizar_graficas([tarea for tarea, _ in tareas], workers)
+        for resultado, (_, mensaje) in zip(resultados, tareas):
+            if not resultado:
+                print(mensaje)
 
         
     #Este método nos va a ayudar a poder serializar en un json campos de tipo dataframe
@@ -368,8 +583,11 @@ class Cartera:
             "pesos": self.pesos.tolist(),
             "returnsCartera": self.returnsCartera.to_dict(orient="records"),
             "matrizCorrelacion": self.matrizCorrelacion.tolist(),
+            "estimadorCovarianza": self.estimadorCovarianza,
             "closePonderado": self.closePonderado.tolist(),
             "dates": [str(fecha) for fecha in self.dates],
+            "politicaAlineacion": self.politicaAlineacion,
+            "preciosAlineados": self.preciosAlineados.tolist(),
             "nombreCartera": self.nombreCartera
         }
     
@@ -385,12 +603,131 @@ class Cartera:
         obj.pesos = np.array(datos["pesos"])
         obj.returnsCartera = pd.DataFrame(datos["returnsCartera"])
         obj.matrizCorrelacion = np.array(datos["matrizCorrelacion"])
+        #Las carteras guardadas antes de poder elegir el estimador usan siempre el muestral
+        obj.estimadorCovarianza = datos.get("estimadorCovarianza", "muestral")
         obj.closePonderado = np.array(datos["closePonderado"])
-        obj.dates = [np.datetime64(fecha) for fecha in datos["dates"]]
-        obj.dates = np.array(datos["dates"])
+        obj.dates = np.asarray(datos["dates"], dtype='datetime64[D]')
+        #Las carteras guardadas antes de alinear las fechas tienen las de su primer activo, compartidas por todos
+        obj.politicaAlineacion = datos.get("politicaAlineacion", "interseccion")
+        if "preciosAlineados" in datos:
+            obj.preciosAlineados = np.array(datos["preciosAlineados"])
+        else:
+            obj.preciosAlineados = get_matriz_alineada([activo.obtenerFechas() for activo in obj.activos],
+                                                       [activo.obtenerClosePrices() for activo in obj.activos], obj.dates)
         obj.nombreCartera = datos["nombreCartera"]
+        obj.cacheIndicadores = {}
+        obj.resumenesRiesgo = {}
+
+        return obj
+
+    #Este método guarda la cartera en un archivo binario (ver save_binario). Las series de precios de todos los activos se concatenan en un único array por
+    #campo, de forma que el número de arrays del archivo no depende del número de activos
+    def to_binario(self, ruta):
+        longitudes = np.array([activo.longitud for activo in self.activos], dtype=np.int64)
+        longitudesReturns = np.array([activo.obtenerReturns().shape[0] for activo in self.activos], dtype=np.int64)
+
+        metadatos = {"version": 3,
+                     "nombreCartera": self.nombreCartera,
+                     "politicaAlineacion": self.politicaAlineacion,
+                     "estimadorCovarianza": self.estimadorCovarianza,
+                     "numActivos": self.numActivos,
+                     "nombresActivos": [activo.obtenerNombreActivo() for activo in self.activos],
+                     "estadisticos": [{"media": float(activo.obtenerMedia()),
+                                       "desviacionTipica": float(activo.obtenerDesviacionTipica()),
+                                       "cuasiDesviacionTipica": float(activo.obtenerCuasiDesviacionTipica()),
+                                       "asimetria": float(activo.obtenerAsimetria()),
+                                       "curtosis": float(activo.obtenerCurtosis())} for activo in self.activos],
+                     "columnasReturns": [str(columna) for columna in self.returnsCartera.columns]}
+
+        arrays = {"longitudes": longitudes,
+                  "longitudesReturns": longitudesReturns,
+                  "fechasActivos": np.concatenate([np.asarray(activo.dates, dtype='datetime64[D]') for activo in self.activos]),
+                  #Los bloques OHLCV de todos los activos se concatenan por columnas, de forma que el de cada activo es una vista del bloque conjunto
+                  "ohlcv": np.concatenate([activo.ohlcv for activo in self.activos], axis=1),
+                  "logReturns": np.concatenate([activo.obtenerReturns() for activo in self.activos]),
+                  "pesos": np.asarray(self.pesos, dtype=float),
+                  "returnsCartera": self.returnsCartera.to_numpy(dtype=float),
+                  "matrizCorrelacion": np.asarray(self.matrizCorrelacion, dtype=float),
+                  "closePonderado": np.asarray(self.closePonderado, dtype=float),
+                  "dates": np.asarray(self.dates, dtype='datetime64[D]'),
+                  "preciosAlineados": np.asarray(self.preciosAlineados, dtype=float)}
+
+        save_binario(ruta, metadatos, arrays)
+
+    @classmethod
+    #Este método de clase recupera una cartera guardada con to_binario. Los arrays de la cartera y de sus activos son vistas sobre el archivo mapeado en memoria,
+    #por lo que la carga no depende del tamaño de las series, salvo que se pida leerlo a memoria con enMemoria (ver load_binario). Devuelve None si el archivo
+    #no existe o no es válido
+    def from_binario(cartera, ruta, enMemoria=False):
+        contenido = load_binario(ruta, enMemoria)
+        if contenido is None:
+            return None
+        metadatos, arrays = contenido
+
+        obj = cartera.__new__(cartera)
+        obj.activos = []
+        #Posiciones de comienzo de cada activo dentro de los arrays concatenados
+        inicios = np.concatenate([[0], np.cumsum(arrays["longitudes"])])
+        iniciosReturns = np.concatenate([[0], np.cumsum(arrays["longitudesReturns"])])
+        for i in range(metadatos["numActivos"]):
+            tramo = slice(inicios[i], inicios[i+1])
+            datos = {"nombreActivo": metadatos["nombresActivos"][i],
+                     "dates": arrays["fechasActivos"][tramo],
+                     "longitud": int(arrays["longitudes"][i]),
+                     "logReturns": arrays["logReturns"][iniciosReturns[i]:iniciosReturns[i+1]]}
+            if "ohlcv" in arrays:
+                datos["ohlcv"] = arrays["ohlcv"][:, tramo]
+            else:
+                #Los archivos de la versión 1 guardan un array por tipo de precio
+                for campo in ["closePrices", "highPrices", "lowPrices", "openPrices", "volume"]:
+                    datos[campo] = arrays[campo][tramo]
+            datos.update(metadatos["estadisticos"][i])
+            obj.activos.append(SeriePrecios.from_dict(datos))
+
+        obj.numActivos = metadatos["numActivos"]
+        obj.pesos = arrays["pesos"]
+        obj.returnsCartera = pd.DataFrame(arrays["returnsCartera"], columns=[int(c) if c.isdigit() else c for c in metadatos["columnasReturns"]], copy=False)
+        obj.matrizCorrelacion = arrays["matrizCorrelacion"]
+        obj.estimadorCovarianza = metadatos.get("estimadorCovarianza", "muestral")
+        obj.closePonderado = arrays["closePonderado"]
+        obj.dates = arrays["dates"]
+        #Los archivos anteriores a la versión 3 no guardan los precios alineados, que coinciden con los de cierre de cada activo
+        obj.politicaAlineacion = metadatos.get("politicaAlineacion", "interseccion")
+        if "preciosAlineados" in arrays:
+            obj.preciosAlineados = arrays["preciosAlineados"]
+        else:
+            obj.preciosAlineados = get_matriz_alineada([activo.obtenerFechas() for activo in obj.activos],
+                                                       [activo.obtenerClosePrices() for activo in obj.activos], obj.dates)
+        obj.nombreCartera = metadatos["nombreCartera"]
+        obj.cacheIndicadores = {}
+        obj.resumenesRiesgo = {}
 
         return obj
+
+#Extensión de los archivos binarios en los que se guardan las carteras
+EXTENSION_CARTERA = ".cartera"
+
+#Función para recuperar una cartera a partir de su nombre. Se busca primero el archivo binario generado por cartera.py y, si no existe, el json de
+#versiones anteriores, que contiene la cartera serializada como una cadena json dentro de otro json. En ese caso se genera también el archivo binario,
+#para que las siguientes cargas sean inmediatas. Devuelve None si no se ha podido cargar la cartera
+#EnMemoria: Leer el archivo binario a memoria en lugar de mapearlo (ver load_binario)
+def cargar_cartera(nombreCartera, enMemoria=False):
+    if exists_route(nombreCartera + EXTENSION_CARTERA):
+        return Cartera.from_binario(nombreCartera + EXTENSION_CARTERA, enMemoria)
+
+    contenido = load_json(nombreCartera + ".json")
+    if contenido is None:
+        return None
+
+    try:
+        #Los json antiguos contienen una cadena con el json de la cartera, en lugar del diccionario directamente
+        datos = json.loads(contenido) if isinstance(contenido, str) else contenido
+        cartera = Cartera.from_dict(datos)
+    except Exception as e:
+        return None
+
+    cartera.to_binario(nombreCartera + EXTENSION_CARTERA)
+    return cartera
         
 
 if __name__ == "__main__":
@@ -400,12 +737,77 @@ if __name__ == "__main__":
     parser.add_argument('--pesos', nargs='+', type=float, required=True, help='Pesos de cada serie de precios')
     parser.add_argument('--nombreCartera', type=str, required=True, help='Nombre que le queremos asignar a la cartera')
     parser.add_argument('--informe', type=str, required=True, help='Generar informe en formato markdown')
+    parser.add_argument('--graficas', type=str, required=False, default="pantalla", help='Formato de las gráficas (pantalla, png, svg o none)')
+    parser.add_argument('--rutaGraficas', type=str, required=False, default=".", help='Ruta de almacenamiento de las gráficas exportadas')
+    parser.add_argument('--workers', type=int, required=False, default=1, help='Número de procesos entre los que repartir las gráficas exportadas')
+    parser.add_argument('--alineacion', type=str, required=False, default="interseccion",
+                        help='Política de alineación de las fechas de las series (interseccion, union o habiles)')
+    parser.add_argument('--estimadorCovarianza', type=str, required=False, default="muestral",
+                        help='Estimador de la matriz de correlación (muestral, ledoitwolf o ewma)')
+    parser.add_argument('--correlacionesMoviles', type=str, required=False, default="No",
+                        help='Guardar en un CSV las correlaciones móviles de cada par de activos y generar su mapa de calor y su animación')
+    parser.add_argument('--ventanaCorrelacion', type=int, required=False, default=VENTANA_CORRELACION,
+                        help='Número de días de cada ventana de las correlaciones móviles')
+    parser.add_argument('--perfil', type=str, required=False, default="No", help='Medir el tiempo y la memoria de cada etapa (Sí o No)')
+    parser.add_argument('--rutaPerfil', type=str, required=False, default=".", help='Ruta donde guardar el perfil y la traza de la ejecución')
+    parser.add_argument('--memoriaPerfil', type=str, required=False, default="Sí", help='Medir también el pico de memoria de cada etapa (Sí o No)')
     args = parser.parse_args()
 
-    cartera = Cartera(args.archivosSeries, args.rutaCSV, args.pesos, args.nombreCartera)
-    #Guardamos en json los datos sobre esta instancia de la clase Cartera, para luego recuperarla en el programa de simulaciones de Monte Carlo
-    json_str = json.dumps(cartera.to_dict())
-    save_json(args.nombreCartera + ".json", json_str)
+    #Las respuestas posibles al parámetro perfil son si o no, y la carpeta donde guardarlo debe existir. Se comprueba antes que el resto para que el perfil
+    #abarque toda la ejecución
+    perfilNormalizado = normalizar_texto(args.perfil)
+    if perfilNormalizado != "si" and perfilNormalizado != "no":
+        print("La respuesta a si quiere medir las etapas de la ejecución debe ser Sí o No")
+        sys.exit(1)
+    if perfilNormalizado == "si" and not exists_route(args.rutaPerfil):
+        print("La ruta del perfil introducida no existe")
+        sys.exit(1)
+    memoriaPerfilNormalizada = normalizar_texto(args.memoriaPerfil)
+    if memoriaPerfilNormalizada != "si" and memoriaPerfilNormalizada != "no":
+        print("La respuesta a si quiere medir la memoria de las etapas debe ser Sí o No")
+        sys.exit(1)
+    if perfilNormalizado == "si":
+        iniciar_perfil("cartera", memoriaPerfilNormalizada == "si")
+
+    #El formato de las gráficas debe ser uno de los disponibles, y si se exportan a archivos, la carpeta donde se guarden debe existir
+    formatoGraficas = args.graficas.lower()
+    if not (formatoGraficas in formatosGraficas):
+        print("El formato de las gráficas debe ser pantalla, png, svg o none")
+        sys.exit(1)
+    if formatoGraficas in ["png", "svg"] and not exists_route(args.rutaGraficas):
+        print("La ruta de las gráficas introducida no existe")
+        sys.exit(1)
+    configurar_graficas(formatoGraficas, args.rutaGraficas)
+
+    #El número de procesos debe ser positivo
+    if args.workers <= 0:
+        print("El número de procesos debe ser positivo")
+        sys.exit(1)
+
+    #La política de alineación debe ser una de las disponibles. Normalizamos el texto para permitir tildes y mayúsculas
+    alineacion = normalizar_texto(args.alineacion)
+    if not (alineacion in politicasAlineacion):
+        print("La política de alineación debe ser interseccion, union o habiles")
+        sys.exit(1)
+
+    #El estimador de covarianzas debe ser uno de los disponibles
+    estimadorCovarianza = normalizar_texto(args.estimadorCovarianza)
+    if not (estimadorCovarianza in estimadoresCovarianza):
+        print("El estimador de covarianzas debe ser muestral, ledoitwolf o ewma")
+        sys.exit(1)
+
+    #La respuesta a si se quieren las correlaciones móviles debe ser si o no, y la ventana debe tener al menos dos días
+    correlacionesMovilesNormalizado = normalizar_texto(args.correlacionesMoviles)
+    if correlacionesMovilesNormalizado != "si" and correlacionesMovilesNormalizado != "no":
+        print("La respuesta a si se quieren las correlaciones móviles debe ser Sí o No")
+        sys.exit(1)
+    if args.ventanaCorrelacion < 2:
+        print("La ventana de las correlaciones móviles debe tener al menos 2 días")
+        sys.exit(1)
+
+    cartera = Cartera(args.archivosSeries, args.rutaCSV, args.pesos, args.nombreCartera, alineacion, estimadorCovarianza)
+    #Guardamos en binario los datos sobre esta instancia de la clase Cartera, para luego recuperarla en el programa de simulaciones de Monte Carlo
+    cartera.to_binario(args.nombreCartera + EXTENSION_CARTERA)
 
     
     #Las respuestas posibles al parámetro informe son si o no. Normalizamos el texto para permitir tildes y mayúsculas
@@ -417,5 +819,10 @@ if __name__ == "__main__":
     if informeNormalizado == "si":
         cartera.report()
 
-    cartera.plots_report()
+    cartera.plots_report(args.workers)
+
+    if correlacionesMovilesNormalizado == "si" and not cartera.guardarCorrelacionesMoviles(args.ventanaCorrelacion, args.rutaCSV):
+        print("Error al calcular las correlaciones móviles de la cartera")
+
+    guardar_perfil(args.rutaPerfil)
     
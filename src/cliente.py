@@ -0,0 +1,41 @@
+import argparse
+import sys
+import os
+import json
+import urllib.request
+
+#Dirección y puerto por defecto del servidor, los mismos que en servidor.py. No se importan de allí para no cargar sus librerías
+DIRECCION_SERVIDOR = "127.0.0.1"
+PUERTO_SERVIDOR = 8765
+
+#Función que envía una petición a servidor.py y devuelve una tupla con el código de salida y lo que el programa ha escrito por pantalla, o None si no se ha
+#podido conectar con el servidor
+#Programa: Programa a ejecutar en el servidor (monteCarlo, optimizador, backtest, informe o carteras)
+#Argumentos: Lista de argumentos del programa, los mismos que en la línea de comandos
+def enviar_peticion(programa, argumentos, direccion=DIRECCION_SERVIDOR, puerto=PUERTO_SERVIDOR):
+    #Enviamos también el directorio actual, para que las rutas y los nombres de las carteras se interpreten igual que si se ejecutase aquí el programa
+    peticion = json.dumps({"programa": programa, "argumentos": argumentos, "directorio": os.getcwd()}).encode("utf-8")
+    try:
+        solicitud = urllib.request.Request("http://" + direccion + ":" + str(puerto), data=peticion, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(solicitud) as respuesta:
+            datos = json.loads(respuesta.read().decode("utf-8"))
+        return datos["codigo"], datos["salida"]
+    except Exception as e:
+        return None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('programa', type=str, help='Programa a ejecutar en el servidor (monteCarlo, optimizador, backtest, informe o carteras)')
+    parser.add_argument('--direccion', type=str, required=False, default=DIRECCION_SERVIDOR, help='Dirección del servidor')
+    parser.add_argument('--puerto', type=int, required=False, default=PUERTO_SERVIDOR, help='Puerto del servidor')
+    #El resto de argumentos se envían tal cual al programa
+    args, argumentosPrograma = parser.parse_known_args()
+
+    resultado = enviar_peticion(args.programa, argumentosPrograma, args.direccion, args.puerto)
+    if resultado is None:
+        print("No se ha podido conectar con el servidor en " + args.direccion + ":" + str(args.puerto) + ". Debe arrancarse antes con servidor.py")
+        sys.exit(1)
+
+    codigo, salida = resultado
+    print(salida, end="")
+    sys.exit(codigo)
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+from simulacion import get_bloques_simulacion_cartera, get_media_valor_final, get_secuencia_semillas, get_resultados_paralelos, TAMANIO_BLOQUE
+from riesgo import RiesgoSimulacion, get_estimacion_variable_control
+
+#Técnicas que se comparan en el informe de convergencia: los muestreos de simulacion.py y el muestreo aleatorio con el valor final como variable de control
+tecnicasConvergencia = ["aleatorio", "antitetico", "sobol", "control"]
+#Métricas cuya convergencia se estudia
+metricasConvergencia = ["Valor final medio", "Probabilidad de pérdida", "Drawdown máximo medio", "Percentil 5 valor final"]
+#Número de réplicas independientes por defecto de cada técnica y número de simulaciones, con las que se mide el error típico
+REPLICAS_CONVERGENCIA = 10
+#Menor número de simulaciones del informe. Los siguientes se van duplicando, de forma que también son potencias de 2, como necesita la secuencia de Sobol.
+#Con sobol el tamaño de bloque también se redondea a una potencia de 2 (ver get_tamanio_bloque_muestreo), así que cada réplica se parte en bloques completos
+MIN_SIMULACIONES_CONVERGENCIA = 64
+
+#Función que devuelve los números de simulaciones del informe de convergencia: potencias de 2 desde MIN_SIMULACIONES_CONVERGENCIA hasta numSimulaciones
+def get_tamanios_convergencia(numSimulaciones):
+    tamanios = []
+    tamanio = MIN_SIMULACIONES_CONVERGENCIA
+    while tamanio <= numSimulaciones:
+        tamanios.append(tamanio)
+        tamanio *= 2
+    return tamanios if tamanios else [numSimulaciones]
+
+#Función que calcula las métricas de convergencia de un conjunto de simulaciones acumulado en una instancia de RiesgoSimulacion. Si se pasa la media teórica
+#del valor final, la probabilidad de pérdida y el drawdown medio se estiman con el valor final como variable de control, y las métricas del valor final no
+#se calculan, ya que con su propia media conocida no tienen error
+#Devuelve una lista con el valor de cada métrica de metricasConvergencia
+def get_metricas_convergencia(riesgo, mediaControl=None):
+    valoresFinales = riesgo.obtenerValoresFinales().astype(float)
+    perdidas = valoresFinales < riesgo.valorInicial
+    drawdowns = riesgo.obtenerDrawdowns()
+    if mediaControl is None:
+        return [valoresFinales.mean(), perdidas.mean(), drawdowns.mean(), np.percentile(valoresFinales, 5)]
+    return [np.nan, get_estimacion_variable_control(perdidas, valoresFinales, mediaControl)[0],
+            get_estimacion_variable_control(drawdowns, valoresFinales, mediaControl)[0], np.nan]
+
+#Función que realiza una réplica del informe de convergencia: simula la cartera completa con el muestreo y el número de simulaciones indicados y calcula sus
+#métricas. Recibe una única tupla de parámetros para poder ser ejecutada en otro proceso
+#Devuelve las métricas de la réplica y, si se pasa la media teórica del valor final, las estimadas con variable de control sobre las mismas simulaciones
+def calcular_replica_convergencia(tarea):
+    medias, desviaciones_tipicas, matrizCorrelacion, pesos, numSimulaciones, numDias, valorInicial, tamanioBloque, semilla, precision, muestreo, \
+        mediaControl = tarea
+    riesgo = RiesgoSimulacion(valorInicial)
+    for _, valoresCartera in get_bloques_simulacion_cartera(medias, desviaciones_tipicas, matrizCorrelacion, pesos, numSimulaciones, numDias, valorInicial,
+                                                            tamanioBloque, semilla, 1, precision, True, muestreo):
+        riesgo.actualizar(valoresCartera)
+    metricasControl = None if mediaControl is None else get_metricas_convergencia(riesgo, mediaControl)
+    return get_metricas_convergencia(riesgo), metricasControl
+
+#Función que genera el informe de convergencia de la simulación de una cartera completa con el modelo normal. Para cada técnica y número de simulaciones
+#se repite la simulación varias veces con semillas independientes, y el error típico de cada métrica es la desviación típica de sus estimaciones entre
+#réplicas, lo que sirve igual para las técnicas cuyas simulaciones no son independientes (antitéticas y Sobol). Las réplicas se reparten entre los procesos,
+#ya que cada una es pequeña comparada con una simulación completa
+#Medias, Desviaciones_Tipicas, MatrizCorrelacion, Pesos: Parámetros de la cartera, como en get_bloques_simulacion_cartera
+#NumSimulaciones: Mayor número de simulaciones del informe
+#Replicas: Número de réplicas de cada técnica y número de simulaciones, al menos 2
+#ErrorObjetivo: Error típico relativo (respecto de la estimación) que se quiere alcanzar, o None. Si se indica, se añade el número de simulaciones
+#necesario para alcanzarlo con cada técnica, suponiendo que el error decrece como 1/sqrt(simulaciones)
+#Devuelve un dataframe con una fila por técnica, número de simulaciones y métrica, o None si los parámetros no son válidos
+def get_informe_convergencia(medias, desviaciones_tipicas, matrizCorrelacion, pesos, numSimulaciones, numDias, valorInicial, replicas=REPLICAS_CONVERGENCIA,
+                             errorObjetivo=None, tamanioBloque=TAMANIO_BLOQUE, semilla=None, workers=1, precision="float64"):
+    if replicas < 2:
+        print("El informe de convergencia necesita al menos 2 réplicas")
+        return None
+    if errorObjetivo is not None and errorObjetivo <= 0:
+        print("El error objetivo debe ser positivo")
+        return None
+
+    mediaControl = get_media_valor_final(medias, desviaciones_tipicas, np.asarray(pesos, dtype=float) * valorInicial, numDias)
+    tamanios = get_tamanios_convergencia(numSimulaciones)
+    #Cada muestreo, número de simulaciones y réplica tiene su propia semilla, independiente de las demás
+    muestreos = [tecnica for tecnica in tecnicasConvergencia if tecnica != "control"]
+    semillas = get_secuencia_semillas(semilla).spawn(len(muestreos) * len(tamanios) * replicas)
+    #La variable de control se aplica sobre las mismas simulaciones del muestreo aleatorio
+    claves = [(muestreo, tamanio) for muestreo in muestreos for tamanio in tamanios for _ in range(replicas)]
+    tareas = ((medias, desviaciones_tipicas, matrizCorrelacion, pesos, tamanio, numDias, valorInicial, tamanioBloque, semillaReplica, precision, muestreo,
+               mediaControl if muestreo == "aleatorio" else None)
+              for (muestreo, tamanio), semillaReplica in zip(claves, semillas))
+
+    #Estimaciones de cada técnica y número de simulaciones, de dimensiones (réplicas, métricas)
+    estimaciones = {}
+    for (muestreo, tamanio), (metricas, metricasControl) in zip(claves, get_resultados_paralelos(calcular_replica_convergencia, tareas, workers)):
+        estimaciones.setdefault((muestreo, tamanio), []).append(metricas)
+        if metricasControl is not None:
+            estimaciones.setdefault(("control", tamanio), []).append(metricasControl)
+
+    filas = []
+    for (tecnica, tamanio), valores in estimaciones.items():
+        valores = np.array(valores, dtype=float)
+        errores = valores.std(axis=0, ddof=1)
+        erroresAleatorio = np.array(estimaciones[("aleatorio", tamanio)], dtype=float).std(axis=0, ddof=1)
+        for j, metrica in enumerate(metricasConvergencia):
+            if np.isnan(valores[:, j]).all():
+                continue
+            fila = {"Técnica": tecnica,
+                    "Simulaciones": tamanio,
+                    "Métrica": metrica,
+                    "Estimación": valores[:, j].mean(),
+                    "Error típico": errores[j],
+                    #Cuántas veces menos simulaciones necesita la técnica que el muestreo aleatorio para el mismo error
+                    "Reducción de varianza": erroresAleatorio[j] ** 2 / errores[j] ** 2 if errores[j] > 0 else np.inf}
+            if errorObjetivo is not None:
+                objetivo = errorObjetivo * abs(fila["Estimación"])
+                fila["Simulaciones para error objetivo"] = int(np.ceil(tamanio * (errores[j] / objetivo) ** 2)) if objetivo > 0 else np.nan
+            filas.append(fila)
+    return pd.DataFrame(filas)
@@ -0,0 +1,125 @@
+import numpy as np
+
+#Estimadores disponibles para la matriz de covarianzas (y de correlación) de los retornos de una cartera:
+#Muestral: Covarianza muestral de todo el período
+#Ledoitwolf: Covarianza muestral contraída hacia un múltiplo de la identidad con la intensidad óptima de Ledoit y Wolf, que está bien condicionada aunque
+#el número de días sea parecido al de activos
+#Ewma: Media móvil exponencial de los productos de retornos (RiskMetrics), que da más peso a los días recientes
+estimadoresCovarianza = ["muestral", "ledoitwolf", "ewma"]
+#Factor de decaimiento por defecto de la EWMA, el de RiskMetrics para datos diarios
+LAMBDA_EWMA = 0.94
+#Ventana por defecto, en días, de las correlaciones móviles
+VENTANA_CORRELACION = 60
+
+#Función que prepara una matriz de retornos de dimensiones (días, activos), descartando los días en los que falte el retorno de algún activo
+def get_matriz_retornos(returns):
+    returns = np.asarray(returns, dtype=float)
+    return returns[~np.isnan(returns).any(axis=1)]
+
+#Función que convierte una matriz de covarianzas, o una pila de ellas de dimensiones (..., activos, activos), en matriz de correlación. Se simetriza para
+#que los errores de redondeo no la dejen ligeramente asimétrica
+def covarianza_a_correlacion(covarianzas):
+    desviaciones = np.sqrt(np.diagonal(covarianzas, axis1=-2, axis2=-1))
+    correlaciones = covarianzas / (desviaciones[..., :, None] * desviaciones[..., None, :])
+    correlaciones = (correlaciones + np.swapaxes(correlaciones, -1, -2)) / 2
+    np.clip(correlaciones, -1, 1, out=correlaciones)
+    return correlaciones
+
+#Función que calcula la covarianza muestral (con denominador n - 1) de una matriz de retornos de dimensiones (días, activos)
+def get_covarianza_muestral(returns):
+    returns = get_matriz_retornos(returns)
+    centrados = returns - returns.mean(axis=0)
+    return centrados.T @ centrados / (returns.shape[0] - 1)
+
+#Función que calcula la covarianza de Ledoit y Wolf, combinación lineal de la covarianza muestral y de un múltiplo de la identidad con la misma traza, con
+#la intensidad de contracción que minimiza el error cuadrático esperado (Ledoit y Wolf, 2004). Todo se obtiene con productos de matrices, en O(días·activos²)
+#Devuelve la matriz de covarianzas y la intensidad de contracción, entre 0 y 1
+def get_covarianza_ledoit_wolf(returns):
+    returns = get_matriz_retornos(returns)
+    numDias, numActivos = returns.shape
+    centrados = returns - returns.mean(axis=0)
+    covarianza = centrados.T @ centrados / numDias
+    media = np.trace(covarianza) / numActivos
+
+    #Distancia entre la covarianza muestral y el objetivo, y varianza estimada de la covarianza muestral (acotada por la distancia anterior)
+    cuadrados = centrados ** 2
+    delta = ((covarianza ** 2).sum() - 2 * media * np.trace(covarianza) + numActivos * media ** 2) / numActivos
+    beta = ((cuadrados.T @ cuadrados).sum() / numDias - (covarianza ** 2).sum()) / (numActivos * numDias)
+    beta = min(beta, delta)
+    intensidad = 0.0 if beta == 0 else float(beta / delta)
+
+    covarianza *= 1 - intensidad
+    covarianza[np.diag_indices(numActivos)] += intensidad * media
+    return covarianza, intensidad
+
+#Función que calcula la covarianza EWMA de una matriz de retornos de dimensiones (días, activos), con media nula como en RiskMetrics. Los pesos de los días
+#se normalizan para que sumen 1 aunque la serie sea corta
+#Lambda: Factor de decaimiento, entre 0 y 1. Cuanto menor, más peso tienen los días recientes
+def get_covarianza_ewma(returns, lambdaEwma=LAMBDA_EWMA):
+    returns = get_matriz_retornos(returns)
+    pesos = lambdaEwma ** np.arange(returns.shape[0] - 1, -1, -1, dtype=float)
+    pesos /= pesos.sum()
+    return (returns * pesos[:, None]).T @ returns
+
+#Función que calcula la matriz de covarianzas con el estimador indicado (ver estimadoresCovarianza). Devuelve None si el estimador no existe
+def get_matriz_covarianza(returns, estimador="muestral", lambdaEwma=LAMBDA_EWMA):
+    if estimador == "muestral":
+        return get_covarianza_muestral(returns)
+    if estimador == "ledoitwolf":
+        return get_covarianza_ledoit_wolf(returns)[0]
+    if estimador == "ewma":
+        return get_covarianza_ewma(returns, lambdaEwma)
+    print("El estimador de covarianzas debe ser muestral, ledoitwolf o ewma")
+    return None
+
+#Función que calcula la matriz de correlación con el estimador indicado. Devuelve None si el estimador no existe
+def get_matriz_correlacion(returns, estimador="muestral", lambdaEwma=LAMBDA_EWMA):
+    covarianza = get_matriz_covarianza(returns, estimador, lambdaEwma)
+    if covarianza is None:
+        return None
+    return covarianza_a_correlacion(covarianza)
+
+#Función que calcula las covarianzas móviles de todos los pares de activos para cada ventana de días consecutivos. En lugar de recalcular cada ventana, se
+#acumulan los retornos y sus productos cruzados una única vez y la suma de cada ventana se obtiene como diferencia de dos sumas acumuladas, en O(días·activos²)
+#Returns: Matriz de retornos de dimensiones (días, activos), sin huecos
+#Ventana: Número de días de cada ventana, al menos 2
+#Devuelve una pila de matrices de dimensiones (días - ventana + 1, activos, activos), siendo la k-ésima la de los días k a k + ventana - 1
+def get_covarianzas_moviles(returns, ventana=VENTANA_CORRELACION):
+    returns = np.asarray(returns, dtype=float)
+    numDias, numActivos = returns.shape
+    if ventana < 2 or ventana > numDias:
+        print("La ventana debe tener al menos 2 días y no más que la serie de retornos")
+        return np.empty((0, numActivos, numActivos))
+
+    #Restamos la media de todo el período para que las sumas acumuladas no pierdan precisión en series largas, sin cambiar las covarianzas de ninguna ventana
+    centrados = returns - returns.mean(axis=0)
+    sumas = np.zeros((numDias + 1, numActivos))
+    np.cumsum(centrados, axis=0, out=sumas[1:])
+    productos = np.zeros((numDias + 1, numActivos, numActivos))
+    np.einsum('ti,tj->tij', centrados, centrados, out=productos[1:])
+    np.cumsum(productos, axis=0, out=productos)
+
+    sumasVentana = sumas[ventana:] - sumas[:-ventana]
+    #La pila puede ser grande, así que las diferencias se hacen sobre la propia pila de sumas acumuladas. Recorriéndola de atrás hacia delante en tramos de
+    #como mucho una ventana, cada tramo solo resta sumas anteriores a él, que todavía no se han modificado
+    for fin in range(numDias + 1, ventana, -ventana):
+        inicio = max(fin - ventana, ventana)
+        productos[inicio:fin] -= productos[inicio - ventana:fin - ventana]
+    covarianzas = productos[ventana:]
+    covarianzas -= sumasVentana[:, :, None] * sumasVentana[:, None, :] / ventana
+    covarianzas /= ventana - 1
+    return covarianzas
+
+#Función que calcula las correlaciones móviles de todos los pares de activos, con las mismas dimensiones que get_covarianzas_moviles
+def get_correlaciones_moviles(returns, ventana=VENTANA_CORRELACION):
+    covarianzas = get_covarianzas_moviles(returns, ventana)
+    if covarianzas.shape[0] == 0:
+        return covarianzas
+    return covarianza_a_correlacion(covarianzas)
+
+#Función que extrae, de una pila de matrices de correlación, la serie de cada par distinto de activos (i < j), de dimensiones (ventanas, pares), junto con
+#los nombres de los pares
+def get_series_pares(correlaciones, etiquetas):
+    filas, columnas = np.triu_indices(correlaciones.shape[1], k=1)
+    nombres = [etiquetas[i] + " - " + etiquetas[j] for i, j in zip(filas, columnas)]
+    return correlaciones[:, filas, columnas], nombres
@@ -1,7 +1,15 @@
 import numpy as np
 import unicodedata
 import json
+import struct
+from datetime import datetime
 from pathlib import Path
+from perfil import etapa
+
+#Cabecera que identifica a los archivos binarios generados por save_binario
+MAGIA_BINARIO = b"AIBSNAP1"
+#Alineamiento en bytes del comienzo de cada array dentro de un archivo binario
+ALINEAMIENTO_BINARIO = 64
 
 #Función para obtener rendimientos logarítmicos dada una serie de precios
 def get_log_returns(prices):
@@ -10,6 +18,35 @@ def get_log_returns(prices):
     returns = returns[~np.isnan(returns)]
     return returns
 
+#Función que calcula los momentos de una muestra como un array [n, media, M2, M3, M4], siendo Mk la suma de las potencias k-ésimas de las desviaciones
+#respecto de la media. A partir de ellos se obtienen la varianza, la asimetría y la curtosis, y pueden combinarse con los de otra muestra con unir_momentos
+def get_momentos(datos):
+    datos = np.asarray(datos, dtype=float)
+    if datos.shape[0] == 0:
+        return np.zeros(5)
+    media = datos.mean()
+    desviaciones = datos - media
+    cuadrados = desviaciones * desviaciones
+    return np.array([datos.shape[0], media, cuadrados.sum(), (cuadrados * desviaciones).sum(), (cuadrados * cuadrados).sum()])
+
+#Función que combina los momentos de dos muestras (ver get_momentos) en los de su unión, sin volver a recorrer los datos (fórmulas de Pébay, que generalizan
+#las de Welford y Chan et al. hasta el cuarto momento)
+def unir_momentos(momentosA, momentosB):
+    nA, mediaA, m2A, m3A, m4A = momentosA
+    nB, mediaB, m2B, m3B, m4B = momentosB
+    if nA == 0:
+        return np.array(momentosB, dtype=float)
+    if nB == 0:
+        return np.array(momentosA, dtype=float)
+    n = nA + nB
+    delta = mediaB - mediaA
+    media = mediaA + delta * nB / n
+    m2 = m2A + m2B + delta**2 * nA * nB / n
+    m3 = m3A + m3B + delta**3 * nA * nB * (nA - nB) / n**2 + 3 * delta * (nA * m2B - nB * m2A) / n
+    m4 = (m4A + m4B + delta**4 * nA * nB * (nA**2 - nA * nB + nB**2) / n**3 + 6 * delta**2 * (nA**2 * m2B + nB**2 * m2A) / n**2
+          + 4 * delta * (nA * m3B - nB * m3A) / n)
+    return np.array([n, media, m2, m3, m4])
+
 #Función para construir matriz de correlación a partir 
 def build_corr_matrix(data):
     correlationMatrix = data.corr()
@@ -20,7 +57,8 @@ def build_corr_matrix(data):
 def save_csv(data, nombre, indiceColumna):
     try:
         #Codificación latin-1 para soportar las tildes
-        data.to_csv(nombre, index=indiceColumna, encoding="latin-1")
+        with etapa("save_csv", nombre):
+            data.to_csv(nombre, index=indiceColumna, encoding="latin-1")
         print("El archivo " + nombre + " fue creado con éxito")
     except Exception as e:
         print("Error al crear el archivo " + nombre)
@@ -43,6 +81,73 @@ def load_json(ruta):
     except Exception as e:
         return None
 
+#Función para almacenar en un único archivo binario un conjunto de arrays de numpy junto con unos metadatos en json
+#El archivo comienza con la cabecera MAGIA_BINARIO, seguida de la longitud (8 bytes) de un json que contiene los metadatos y, para cada array, su tipo,
+#dimensiones y posición dentro del archivo. A continuación van los datos en crudo de cada array, alineados a ALINEAMIENTO_BINARIO bytes, de forma que
+#puedan mapearse en memoria directamente al cargarlos
+#Ruta: Ruta del archivo a generar
+#Metadatos: Diccionario serializable en json
+#Arrays: Diccionario con los arrays a almacenar, identificados por su nombre
+def save_binario(ruta, metadatos, arrays):
+    try:
+        arrays = {nombre: np.ascontiguousarray(array) for nombre, array in arrays.items()}
+        descripcion = {}
+        posicion = 0
+        for nombre, array in arrays.items():
+            descripcion[nombre] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": posicion}
+            posicion += -(-array.nbytes // ALINEAMIENTO_BINARIO) * ALINEAMIENTO_BINARIO
+
+        cabecera = json.dumps({"metadatos": metadatos, "arrays": descripcion}, ensure_ascii=False).encode("utf-8")
+        #Los datos comienzan en la primera posición alineada tras la cabecera
+        inicioDatos = -(-(len(MAGIA_BINARIO) + 8 + len(cabecera)) // ALINEAMIENTO_BINARIO) * ALINEAMIENTO_BINARIO
+
+        with etapa("save_binario", ruta), open(ruta, "wb") as f:
+            f.write(MAGIA_BINARIO)
+            f.write(struct.pack("<Q", len(cabecera)))
+            f.write(cabecera)
+            for nombre, array in arrays.items():
+                f.seek(inicioDatos + descripcion[nombre]["offset"])
+                f.write(array.tobytes())
+            #Nos aseguramos de que el archivo cubra también el relleno del último array
+            f.truncate(inicioDatos + posicion)
+        print("El archivo " + ruta + " fue creado con éxito")
+    except Exception as e:
+        print("Error al crear el archivo " + ruta)
+
+#Función para leer un archivo generado por save_binario. Los arrays no se copian a memoria, sino que son vistas de solo lectura sobre el archivo
+#mapeado en memoria, por lo que solo se lee de disco lo que realmente se usa
+#EnMemoria: Si está a True, el archivo se lee entero a memoria en lugar de mapearlo, de forma que los arrays no dependen de él y puede sobrescribirse
+#mientras se usan (por ejemplo, en un proceso de larga duración como servidor.py)
+#Devuelve una tupla con los metadatos y el diccionario de arrays, o None si el archivo no existe o no es válido
+def load_binario(ruta, enMemoria=False):
+    try:
+        with open(ruta, "rb") as f:
+            if f.read(len(MAGIA_BINARIO)) != MAGIA_BINARIO:
+                return None
+            longitudCabecera = struct.unpack("<Q", f.read(8))[0]
+            cabecera = json.loads(f.read(longitudCabecera).decode("utf-8"))
+
+        inicioDatos = -(-(len(MAGIA_BINARIO) + 8 + longitudCabecera) // ALINEAMIENTO_BINARIO) * ALINEAMIENTO_BINARIO
+        #Mapeamos (o leemos) el archivo una única vez y obtenemos cada array como una vista sobre él
+        mapa = np.fromfile(ruta, dtype=np.uint8) if enMemoria else np.memmap(ruta, dtype=np.uint8, mode="r")
+        arrays = {}
+        for nombre, descripcion in cabecera["arrays"].items():
+            dtype = np.dtype(descripcion["dtype"])
+            shape = tuple(descripcion["shape"])
+            inicio = inicioDatos + descripcion["offset"]
+            numBytes = int(np.prod(shape)) * dtype.itemsize
+            arrays[nombre] = np.asarray(mapa[inicio:inicio + numBytes]).view(dtype).reshape(shape)
+
+        return cabecera["metadatos"], arrays
+    except Exception as e:
+        return None
+
+#Función para convertir una fecha, ya sea una cadena en formato Año-Mes-Día o un datetime64 de numpy, a datetime
+def get_fecha(fecha):
+    if isinstance(fecha, str):
+        return datetime.strptime(fecha, "%Y-%m-%d")
+    return np.datetime64(fecha, "s").astype(datetime)
+
 #Función para comprobar si una ruta existe en nuestro equipo
 def exists_route(ruta):
     if not Path(ruta).exists():
@@ -64,13 +169,26 @@ def normalizar_texto(cadena):
 #NumSimulaciones: Número de simulaciones de Monte Carlo a realizar
 #NumDias: Número de días para los que se va a realizar cada simulación
 #ValorInicial: Valor de partida para todas las simulaciones
-def get_simulacion_valores(media, desviacion_tipica, numSimulaciones, numDias, valorInicial):
+#Semilla: Semilla del generador de números aleatorios, para poder reproducir la simulación. Si no se pasa ninguna, cada ejecución dará resultados distintos
+#Precision: Tipo de los valores simulados (float64 o float32)
+#Muestreo: Forma de obtener las normales estándar, para reducir la varianza (ver muestreosSimulacion en simulacion.py)
+def get_simulacion_valores(media, desviacion_tipica, numSimulaciones, numDias, valorInicial, semilla=None, precision="float64", muestreo="aleatorio"):
     try:
-        #Son los retornos logarítmicos, no los simples, ya que son los que se distribuyen normalmente
-        returns = np.random.normal(media, desviacion_tipica, (numSimulaciones,numDias))
+        #Se importa aquí porque simulacion.py no se necesita para el resto de funciones de este archivo
+        from simulacion import get_normales
+        generador = np.random.default_rng(semilla)
+        #Son los retornos logarítmicos, no los simples, ya que son los que se distribuyen normalmente. Se generan directamente sobre la matriz del resultado,
+        #y el resto de operaciones se hacen también sobre ella, de forma que no se reserva ningún array intermedio. Escalar y desplazar las normales estándar
+        #da los mismos números que generador.normal con la misma semilla
+        precios_simulados = np.empty((numSimulaciones, numDias), dtype=precision)
+        get_normales(generador, precios_simulados, muestreo)
+        precios_simulados *= desviacion_tipica
+        precios_simulados += media
 
         #Simulamos precios, teniendo en cuenta que los retornos logarítmicos son aditivos
-        precios_simulados = valorInicial * np.exp(np.cumsum(returns, axis=1))
+        np.cumsum(precios_simulados, axis=1, out=precios_simulados)
+        np.exp(precios_simulados, out=precios_simulados)
+        precios_simulados *= valorInicial
 
         return precios_simulados
     except Exception as e:
@@ -0,0 +1,67 @@
+import threading
+import pandas as pd
+
+#Divisa en la que cotizan por defecto los activos descargados
+divisaBase = "USD"
+#Políticas disponibles para rellenar las fechas en las que no hay tipo de cambio. Con ffill se usa el último tipo de cambio conocido y con bfill el siguiente
+politicasRelleno = ["ffill", "bfill"]
+#Columnas que no son precios y que por tanto no se convierten
+columnasSinDivisa = ['Volume']
+
+#Caché de tipos de cambio compartida por todo el proceso, de forma que los activos que cotizan en la misma divisa usen una única descarga. Para cada símbolo
+#se guarda el rango de fechas (inicio, fin) pedido y la serie obtenida
+tiposCambio = {}
+#Cada símbolo tiene su propio cerrojo, para que los hilos que piden tipos de cambio distintos no se esperen entre sí. El cerrojo global solo protege el
+#diccionario de cerrojos
+cerrojosTiposCambio = {}
+cerrojoTiposCambio = threading.Lock()
+
+#Función que devuelve el símbolo en yfinance del tipo de cambio entre dos divisas, o una cadena vacía si no hace falta conversión
+def get_simbolo_tipo_cambio(origen, destino):
+    if origen == destino:
+        return ""
+    return origen + destino + "=X"
+
+#Función que devuelve la serie de un tipo de cambio entre dos fechas (date), ambas incluidas, descargándola solo si no está ya en la caché del proceso con
+#un rango que cubra el pedido
+#Descargar: Función que recibe un rango de fechas (inicio, fin) y devuelve un dataframe con la serie del tipo de cambio, indexado por fecha
+def get_tipo_cambio(simbolo, inicio, fin, descargar):
+    with cerrojoTiposCambio:
+        cerrojoSimbolo = cerrojosTiposCambio.setdefault(simbolo, threading.Lock())
+    #El cerrojo del símbolo se mantiene durante la descarga para que dos hilos que piden el mismo tipo de cambio no lo descarguen dos veces
+    with cerrojoSimbolo:
+        if simbolo in tiposCambio:
+            (inicioGuardado, finGuardado), serie = tiposCambio[simbolo]
+            if inicioGuardado <= inicio and fin <= finGuardado:
+                return serie
+            inicio = min(inicio, inicioGuardado)
+            fin = max(fin, finGuardado)
+        serie = descargar(inicio, fin)
+        tiposCambio[simbolo] = ((inicio, fin), serie)
+        return serie
+
+#Función que alinea por fecha los cierres de un tipo de cambio con las fechas de una serie de precios. Las fechas de la serie en las que no haya tipo de
+#cambio se rellenan según la política de relleno, y si aun así quedan huecos (al principio o al final) se rellenan en el sentido contrario
+#Indice: Fechas de la serie de precios
+#Relleno: Política de relleno, ffill o bfill
+def alinear_tipo_cambio(tipoCambio, indice, relleno="ffill"):
+    cierres = tipoCambio['Close'] if isinstance(tipoCambio, pd.DataFrame) else tipoCambio
+    cierres = cierres[~cierres.index.duplicated(keep='last')].sort_index()
+    #Trabajamos con la unión de fechas para que el relleno use el tipo de cambio de días en los que la serie de precios no cotizó
+    cierres = cierres.reindex(cierres.index.union(indice))
+    cierres = cierres.ffill().bfill() if relleno == "ffill" else cierres.bfill().ffill()
+    return cierres.reindex(indice)
+
+#Función que convierte una serie de precios a otra divisa, multiplicando fecha a fecha todas las columnas de precios por el tipo de cambio alineado
+#Data: Dataframe de precios indexado por fecha
+#TipoCambio: Dataframe (o serie) con los cierres del tipo de cambio, indexado por fecha
+def convertir_divisa(data, tipoCambio, relleno="ffill"):
+    if data.empty:
+        return data
+    cambios = alinear_tipo_cambio(tipoCambio, data.index, relleno)
+    if cambios.isna().any():
+        print("No hay tipo de cambio para todas las fechas de la serie, las fechas sin él quedarán vacías")
+    columnasPrecio = [columna for columna in data.columns if not (columna in columnasSinDivisa)]
+    convertida = data.copy()
+    convertida[columnasPrecio] = data[columnasPrecio].mul(cambios, axis=0)
+    return convertida
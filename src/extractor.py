@@ -1,14 +1,16 @@
 import argparse
 import sys
-import yfinance as yf
-import pandas as pd
 import os
-import requests
+import time
 import numpy as np
-from alpha_vantage.timeseries import TimeSeries
-from alpha_vantage.fundamentaldata import FundamentalData
 from datetime import datetime, timedelta
-from data_utils import save_csv, save_json, exists_route, normalizar_texto
+from data_utils import save_json, load_json, exists_route, normalizar_texto
+from formatos import save_tabla, formatosSalida, formato_disponible
+from perfil import etapa, iniciar_perfil, guardar_perfil
+from cachePrecios import CachePrecios
+from limitadorPeticiones import LimitadorPeticiones
+from divisas import divisaBase, politicasRelleno, get_simbolo_tipo_cambio, get_tipo_cambio, convertir_divisa
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 #Cargamos las variables de entorno guardadas en el .env
@@ -42,6 +44,12 @@ indices = {"S&P 500": ["^GSPC","SPY","USD"],
            "IBEX 35": ["^IBEX","EWP","EUR"]}
 #Lista de apis disponibles
 apis = ["yfinance", "alpha_vantage"]
+#Nombre de las columnas de precios
+columnasPrecios = ['Close', 'High', 'Low', 'Open', 'Volume']
+#Intervalo de las barras que se descargan, que identifica junto con el API y el símbolo a cada serie en la caché
+intervaloBarras = "1d"
+#Número de días hacia atrás que cubre con seguridad la versión compacta de la serie de alpha_vantage (las últimas 100 sesiones)
+diasCompactoAlphaVantage = 120
 
 #Función para validar que, dada una cadena de caracteres, se trata de una fecha válida
 def validarFecha(fecha):
@@ -50,43 +58,361 @@ def validarFecha(fecha):
         return fechaConvertida,True
     except ValueError:
         return None,False
-    
+
+#Función que importa yfinance bajo demanda. Los clientes de los APIs solo se importan al usarlos (los de alpha_vantage dentro de sus funciones), de forma
+#que solo se paga el coste de importar el del API elegida
+def get_yfinance():
+    import yfinance as yf
+    return yf
+
+#Función para descargar de yfinance las barras diarias de un símbolo entre dos fechas (date), ambas incluidas
+def descargar_yfinance(simbolo, inicio, fin):
+    yf = get_yfinance()
+    #Añadimos 1 día a la fecha final porque en la llamada al api se excluye la fecha final pasada
+    with etapa("descarga", simbolo):
+        data = yf.download(simbolo, start=inicio.strftime("%Y-%m-%d"), end=(fin + timedelta(days=1)).strftime("%Y-%m-%d"))
+    data = data[columnasPrecios]
+    #Como solo consultamos un símbolo, nos quedamos solamente con el nombre del tipo de precio en cada columna
+    data.columns = data.columns.get_level_values(0)
+    return data
+
+#Función para descargar de alpha_vantage las barras diarias de un símbolo. Como alpha_vantage no permite especificar un rango de fechas, se pide la versión
+#compacta de la serie (últimas 100 sesiones) si con ella se cubre la fecha de inicio, y la serie completa en caso contrario
+def descargar_alpha_vantage(ts, simbolo, inicio, fin):
+    tamanio = 'compact' if inicio >= datetime.now().date() - timedelta(days=diasCompactoAlphaVantage) else 'full'
+    ordenColumnas = ['4. close', '2. high', '3. low', '1. open', '5. volume']
+    with etapa("descarga", simbolo):
+        data, _ = ts.get_daily(symbol=simbolo, outputsize=tamanio)
+
+    #Imponemos el mismo orden que hay en lo devuelto por yfinance
+    data = data[ordenColumnas]
+    #Imponemos los mismos nombres de columnas que los devueltos en yfinance
+    data.columns = columnasPrecios
+    #Imponemos el mismo nombre de índice que en yfinance
+    data = data.rename_axis('Date')
+    #La columna Volume la ponemos como entero, para que no se muestre con el punto decimal
+    data['Volume'] = data['Volume'].astype(int)
+    return data.sort_index()
+
+
+#Función para descargar de yfinance, en una única llamada, las barras diarias de varios símbolos entre dos fechas (date), ambas incluidas
+#Devuelve un diccionario con el dataframe de cada símbolo
+def descargar_yfinance_multiple(simbolos, inicio, fin):
+    yf = get_yfinance()
+    #La descarga conjunta no puede repartirse entre activos, así que se mide como una única etapa sin activo
+    with etapa("descarga"):
+        data = yf.download(simbolos, start=inicio.strftime("%Y-%m-%d"), end=(fin + timedelta(days=1)).strftime("%Y-%m-%d"), group_by='ticker')
+    resultado = {}
+    for simbolo in simbolos:
+        #Al descargar varios símbolos, las fechas son la unión de las de todos ellos, por lo que eliminamos las filas en las que el símbolo no cotizó
+        resultado[simbolo] = data[simbolo][columnasPrecios].dropna(how='all')
+        resultado[simbolo].columns = columnasPrecios
+    return resultado
+
+#Función que devuelve el símbolo de un activo en el API pedida
+def get_simbolo(nombre, esIndice, api):
+    if not esIndice:
+        return acciones[nombre]
+    #En el caso de los índices, el primer elemento de la lista es el símbolo de yfinance y el segundo el de alpha_vantage
+    return indices[nombre][0] if api == "yfinance" else indices[nombre][1]
+
+#Función que devuelve la divisa en la que cotiza un activo en el API pedida. Las acciones y los ETFs de alpha_vantage cotizan en dólares americanos
+def get_divisa(nombre, esIndice, api):
+    if esIndice and api == "yfinance":
+        return indices[nombre][2]
+    return divisaBase
+
+#Función que devuelve el diccionario común entre APIs para almacenar la información extra de una empresa
+def get_info_extra_vacia():
+    return {"Name" : "",
+            "Sector": "",
+            "Industry": "",
+            "Country": "",
+            "Market Capitalization": "",
+            "Dividend Yield": "",
+            "Currency": ""
+            }
+
+#Función que obtiene de yfinance la información extra de un activo
+def get_info_extra_yfinance(simbolo):
+    infoExtra = get_info_extra_vacia()
+    yf = get_yfinance()
+    with etapa("info_extra", simbolo):
+        info = yf.Ticker(simbolo).info
+    infoExtra["Name"] = info['longName']
+    #Si no encontramos el nombre de un campo (porque es un índice por ejemplo), manejamos la excepción
+    try:
+        infoExtra["Sector"] = info['sector']
+    except KeyError as k:
+        infoExtra["Sector"] = "No hay dato"
+    try:
+        infoExtra["Industry"] = info['industry']
+    except KeyError as k:
+        infoExtra["Industry"] = "No hay dato"
+
+    try:
+        infoExtra["Country"] = info['country']
+    except KeyError as k:
+        infoExtra["Country"] = "No hay dato"
+
+    try:
+        infoExtra["Market Capitalization"] = info['marketCap']
+    except KeyError as k:
+        infoExtra["Market Capitalization"] = "No hay dato"
+
+    try:
+        infoExtra["Dividend Yield"] = info['dividendYield']
+    except KeyError as k:
+        infoExtra["Dividend Yield"] = "No hay dato"
+
+    infoExtra["Currency"] = info['currency']
+    return infoExtra
+
+#Función que obtiene de alpha_vantage la información extra de un activo
+def get_info_extra_alpha_vantage(simbolo, esIndice):
+    infoExtra = get_info_extra_vacia()
+    if not esIndice:
+        from alpha_vantage.fundamentaldata import FundamentalData
+        fd = FundamentalData(key=claveAPI, output_format='pandas')
+        overview, meta = fd.get_company_overview(simbolo)
+        #Como lo que nos devuelve overview para cada campo es un dataframe de una sola columna, nos quedamos con su contenido en la primera fila
+        infoExtra["Name"] = overview['Name'].iloc[0]
+        infoExtra["Sector"] = overview['Sector'].iloc[0]
+        infoExtra["Industry"] = overview['Industry'].iloc[0]
+        infoExtra["Country"] = overview['Country'].iloc[0]
+        #Convertimos a entero al igual que es devuelto por yfinance
+        infoExtra["Market Capitalization"] = int(overview['MarketCapitalization'].iloc[0])
+        #Convertimos a float al igual que es devuelto por yfinance
+        infoExtra["Dividend Yield"] = float(overview['DividendYield'].iloc[0])
+        infoExtra["Currency"] = overview['Currency'].iloc[0]
+    else:
+        #Si se ha pasado un índice (que en el caso de alpha_vantage corresponde con un ETF suyo), entonces tenemos que hacer un GET al siguiente endpoint
+        url = f"https://www.alphavantage.co/query?function=SYMBOL_SEARCH&keywords={simbolo}&apikey={claveAPI}"
+        import requests
+        respuesta = requests.get(url)
+        datos = respuesta.json()
+
+        for match in datos.get("bestMatches", []):
+            #De entre todas las coincidencias, nos quedamos con la que coincida el símbolo con el de nuestro ETF
+            if match.get("1. symbol", "").upper() == simbolo:
+                infoExtra["Name"] = match.get('2. name')
+                infoExtra["Country"] = match.get('4. region')
+                infoExtra["Currency"] = match.get('8. currency')
+                #El resto de campos los devolvemos vacíos
+                infoExtra["Sector"] = "No hay dato"
+                infoExtra["Industry"] = "No hay dato"
+                infoExtra["Market Capitalization"] = "No hay dato"
+                infoExtra["Dividend Yield"] = "No hay dato"
+    return infoExtra
+
+#Función que devuelve el tipo de cambio de una divisa a otra para todos los períodos pedidos, usando la caché de tipos de cambio del proceso, o None si no
+#hace falta conversión. Los tipos de cambio se descargan siempre de yfinance, pasando también por la caché en disco
+def get_tipo_cambio_periodos(origen, destino, periodos, cache):
+    simbolo = get_simbolo_tipo_cambio(origen, destino)
+    if simbolo == "":
+        return None
+    inicio, fin = get_rango_periodos(periodos)
+    return get_tipo_cambio(simbolo, inicio, fin,
+                           lambda inicio, fin: cache.obtener("yfinance", simbolo, intervaloBarras, inicio, fin, lambda i, f: descargar_yfinance(simbolo, i, f)))
+
+#Función que devuelve el rango de fechas (inicio, fin) que abarca todos los períodos pedidos
+def get_rango_periodos(periodos):
+    return min(inicio for inicio, _ in periodos), max(fin for _, fin in periodos)
+
+#Función que convierte a otra divisa las series de precios de un activo para cada período. Si no hace falta conversión (tipoCambio es None) se devuelven tal cual
+def convertir_periodos(datosPeriodos, tipoCambio, relleno):
+    if tipoCambio is None:
+        return datosPeriodos
+    return [convertir_divisa(data, tipoCambio, relleno) for data in datosPeriodos]
+
+#Función que exporta en el formato pedido (csv, parquet o npy) las series de un activo para cada período, y a json su información extra si se ha obtenido
+#NombreAPI: Prefijo de los archivos generados, formado por el API y el nombre del activo
+def guardar_activo(nombreAPI, dataList, infoExtra, fechasInicio, fechasFinal, rutaCSV, rutaJSON, formato="csv"):
+    #El parámetro indiceColumna está a True para que se incluya a la fecha como a una columna más
+    for i in range(len(dataList)):
+        save_tabla(dataList[i], rutaCSV + "\\" + nombreAPI + "_" + fechasInicio[i] + "_" + fechasFinal[i], True, formato)
+
+    if infoExtra is not None:
+        #Guardamos en un .json el contenido de infoExtra
+        save_json(rutaJSON + "\\" + nombreAPI + ".json", infoExtra)
+
+#Función que extrae de yfinance las series de precios de varios activos para los períodos pedidos, convertidas a la divisa destino. Todos los símbolos que no
+#estén ya en la caché (incluidos los tipos de cambio) se descargan en una única llamada a yfinance con varios símbolos
+#Activos: Lista de tuplas (nombre, esIndice)
+#Periodos: Lista de tuplas de fechas (date) (inicio, fin)
+#Cache: Instancia de CachePrecios
+#InfoExtra: Si está a True se obtiene también la información extra de cada activo
+#Workers: Número de hilos con los que se obtiene la información extra
+#Divisa: Divisa a la que se convierten los precios
+#Relleno: Política de relleno de las fechas sin tipo de cambio (ffill o bfill)
+#Devuelve un diccionario con, para cada activo, la lista de dataframes de cada período, su información extra (o None) y el tiempo dedicado solo a él en
+#segundos, y el tiempo de la parte compartida por todos los activos (la descarga conjunta, el paso por la caché y la información extra), que no se reparte
+def extraer_yfinance(activos, periodos, cache, infoExtra, workers, divisa=divisaBase, relleno="ffill"):
+    inicioComun = time.perf_counter()
+    simbolos = [get_simbolo(nombre, esIndice, "yfinance") for nombre, esIndice in activos]
+    divisas = [get_divisa(nombre, esIndice, "yfinance") for nombre, esIndice in activos]
+    simbolosCambio = list(dict.fromkeys(get_simbolo_tipo_cambio(origen, divisa) for origen in divisas if origen != divisa))
+
+    #Averiguamos qué símbolos necesitan descargarse, y los descargamos todos a la vez abarcando los huecos de todos ellos. Los tipos de cambio se piden para
+    #todo el rango de los períodos, ya que son los que se guardarán en la caché de tipos de cambio
+    faltantes = {simbolo: cache.obtenerFaltantes("yfinance", simbolo, intervaloBarras, periodos) for simbolo in simbolos}
+    faltantes.update({simbolo: cache.obtenerFaltantes("yfinance", simbolo, intervaloBarras, [get_rango_periodos(periodos)]) for simbolo in simbolosCambio})
+    pendientes = [simbolo for simbolo in faltantes if faltantes[simbolo]]
+    descargados = {}
+    if pendientes:
+        inicio = min(faltantes[simbolo][0][0] for simbolo in pendientes)
+        fin = max(faltantes[simbolo][-1][1] for simbolo in pendientes)
+        descargados = descargar_yfinance_multiple(pendientes, inicio, fin)
+
+    #Pasamos cada serie por la caché, que se quedará con lo ya descargado en lugar de volver a llamar al API
+    datosSimbolos = {}
+    for simbolo in dict.fromkeys(simbolos):
+        descargar = (lambda inicio, fin, simbolo=simbolo: descargados[simbolo]) if simbolo in descargados else \
+                    (lambda inicio, fin, simbolo=simbolo: descargar_yfinance(simbolo, inicio, fin))
+        datosSimbolos[simbolo] = cache.obtenerPeriodos("yfinance", simbolo, intervaloBarras, periodos, descargar)
+    inicio, fin = get_rango_periodos(periodos)
+    for simbolo in simbolosCambio:
+        if simbolo in descargados:
+            get_tipo_cambio(simbolo, inicio, fin, lambda i, f, simbolo=simbolo: cache.obtener("yfinance", simbolo, intervaloBarras, i, f, lambda a, b: descargados[simbolo]))
+
+    infos = {}
+    if infoExtra:
+        with ThreadPoolExecutor(max_workers=workers) as ejecutor:
+            infos = dict(zip(simbolos, ejecutor.map(get_info_extra_yfinance, simbolos)))
+    tiempoComun = time.perf_counter() - inicioComun
+
+    resultados = {}
+    for (nombre, esIndice), simbolo, origen in zip(activos, simbolos, divisas):
+        inicio = time.perf_counter()
+        #Si la divisa del activo no es la pedida, realizamos la conversión con el tipo de cambio alineado con cada fecha
+        with etapa("conversion", nombre):
+            dataList = convertir_periodos(datosSimbolos[simbolo], get_tipo_cambio_periodos(origen, divisa, periodos, cache), relleno)
+            #Cambiamos la precisión a 2 decimales como en el caso de alpha_vantage
+            dataList = [data.round({'Close': 2, 'High': 2, 'Low': 2, 'Open': 2}) for data in dataList]
+        resultados[nombre] = (dataList, infos.get(simbolo), time.perf_counter() - inicio)
+
+    return resultados, tiempoComun
+
+#Función que extrae de alpha_vantage las series de precios de un activo para los períodos pedidos, y su información extra si se pide. Todas las llamadas
+#al API pasan por el limitador de peticiones, para no superar la cuota
+def extraer_alpha_vantage_activo(nombre, esIndice, periodos, cache, infoExtra, limitador, divisa=divisaBase, relleno="ffill"):
+    inicio = time.perf_counter()
+    from alpha_vantage.timeseries import TimeSeries
+    ts = TimeSeries(key=claveAPI, output_format='pandas')
+    simbolo = get_simbolo(nombre, esIndice, "alpha_vantage")
+
+    def descargar(inicioDescarga, finDescarga):
+        limitador.esperar()
+        return descargar_alpha_vantage(ts, simbolo, inicioDescarga, finDescarga)
+
+    #La caché se encarga de descargar la serie solo si no cubre ya los períodos pedidos, y de quedarse con el rango especificado por el usuario para cada uno
+    dataList = cache.obtenerPeriodos("alpha_vantage", simbolo, intervaloBarras, periodos, descargar)
+    #Si se ha pedido otra divisa, convertimos con el tipo de cambio, que se comparte entre todos los hilos
+    with etapa("conversion", nombre):
+        tipoCambio = get_tipo_cambio_periodos(get_divisa(nombre, esIndice, "alpha_vantage"), divisa, periodos, cache)
+        dataList = convertir_periodos(dataList, tipoCambio, relleno)
+        #Alpha_vantage ya devuelve los precios con 2 decimales, así que solo hace falta redondear los convertidos
+        if tipoCambio is not None:
+            dataList = [data.round({'Close': 2, 'High': 2, 'Low': 2, 'Open': 2}) for data in dataList]
+
+    info = None
+    if infoExtra:
+        limitador.esperar()
+        with etapa("info_extra", simbolo):
+            info = get_info_extra_alpha_vantage(simbolo, esIndice)
+
+    return dataList, info, time.perf_counter() - inicio
+
+#Función que extrae de alpha_vantage las series de precios de varios activos de forma concurrente, con un conjunto de hilos que comparten un limitador de
+#peticiones. Los parámetros y el resultado son los mismos que los de extraer_yfinance, salvo PeticionesPorMinuto, que es la cuota del API. Como cada activo
+#se descarga por separado, todo su tiempo se le asigna a él y el tiempo compartido es 0
+def extraer_alpha_vantage(activos, periodos, cache, infoExtra, workers, peticionesPorMinuto, divisa=divisaBase, relleno="ffill"):
+    limitador = LimitadorPeticiones(peticionesPorMinuto)
+    with ThreadPoolExecutor(max_workers=workers) as ejecutor:
+        futuros = {nombre: ejecutor.submit(extraer_alpha_vantage_activo, nombre, esIndice, periodos, cache, infoExtra, limitador, divisa, relleno)
+                   for nombre, esIndice in activos}
+        return {nombre: futuro.result() for nombre, futuro in futuros.items()}, 0
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('--accion', type=str, required=False, help='Acción individual de empresa')
     parser.add_argument('--indice', type=str, required=False, help='Índice de referencia')
+    parser.add_argument('--acciones', nargs='+', type=str, required=False, help='Acciones de empresas a extraer en una única ejecución')
+    parser.add_argument('--indices', nargs='+', type=str, required=False, help='Índices de referencia a extraer en una única ejecución')
+    parser.add_argument('--manifiesto', type=str, required=False, help='JSON con las listas de acciones e índices a extraer')
     parser.add_argument('--api', type=str, required=True, help='API financiera a consultar')
     parser.add_argument('--fechasInicio', nargs='+', type=str, required=True, help='Fechas de inicio de los períodos a consultar')
     parser.add_argument('--fechasFinal', nargs='+', type=str, required=True, help='Fechas de finalización de los períodos a consultar')
     parser.add_argument('--rutaCSV', type=str, required=True, help='Ruta de almacenamiento de los CSVs generados')
     parser.add_argument('--infoExtra', type=str, required=True, help='Información general acerca de una empresa')
     parser.add_argument('--rutaJSON', type=str, required=False, help='Ruta de almacenamiento de los JSONs generados')
+    parser.add_argument('--rutaCache', type=str, required=False, default="cachePrecios", help='Directorio de la caché de series de precios')
+    parser.add_argument('--sinCache', action='store_true', help='No leer ni escribir en la caché de series de precios')
+    parser.add_argument('--refrescar', action='store_true', help='Volver a descargar las series aunque estén en la caché')
+    parser.add_argument('--workers', type=int, required=False, default=4, help='Número de hilos con los que se consultan las APIs')
+    parser.add_argument('--peticionesPorMinuto', type=float, required=False, default=5, help='Peticiones por minuto permitidas por alpha_vantage')
+    parser.add_argument('--divisa', type=str, required=False, default=divisaBase, help='Divisa a la que se convierten los precios')
+    parser.add_argument('--rellenoDivisas', type=str, required=False, default="ffill", help='Relleno de las fechas sin tipo de cambio (ffill o bfill)')
+    parser.add_argument('--formato', type=str, required=False, default="csv", help='Formato de las series generadas (csv, parquet o npy)')
+    parser.add_argument('--perfil', type=str, required=False, default="No", help='Medir el tiempo y la memoria de cada etapa (Sí o No)')
+    parser.add_argument('--rutaPerfil', type=str, required=False, default=".", help='Ruta donde guardar el perfil y la traza de la ejecución')
+    parser.add_argument('--memoriaPerfil', type=str, required=False, default="Sí", help='Medir también el pico de memoria de cada etapa (Sí o No)')
     args = parser.parse_args()
 
-    #Hay que pasar o bien el nombre de una acción individual de empresa o bien el nombre de un índice de referencia
-    if (not args.accion and not args.indice) or  (args.accion and args.indice):
+    #Juntamos todos los activos pedidos, ya sea de forma individual, en lote o mediante un manifiesto, como tuplas (nombre, esIndice)
+    nombresAcciones = ([args.accion] if args.accion else []) + (args.acciones if args.acciones else [])
+    nombresIndices = ([args.indice] if args.indice else []) + (args.indices if args.indices else [])
+    if args.manifiesto:
+        #El manifiesto es un json con las claves "acciones" e "indices", cada una con una lista de nombres
+        manifiesto = load_json(args.manifiesto)
+        if manifiesto == None or not isinstance(manifiesto, dict):
+            print("El manifiesto introducido no es válido")
+            sys.exit(1)
+        nombresAcciones += manifiesto.get("acciones", [])
+        nombresIndices += manifiesto.get("indices", [])
+
+    #Hay que pasar al menos el nombre de una acción de empresa o el de un índice de referencia
+    if not nombresAcciones and not nombresIndices:
         print("Debe introducir, o bien el nombre de una empresa, o bien el de un índice por favor")
         sys.exit(1)
 
-    #En el caso de querer trabajar con acciones, debe ser una de las disponibles
-    if args.accion:
-        if not (args.accion in acciones.keys()):
-            print("Debe elegir una empresa válida por favor")
+    #En el caso de querer trabajar con acciones, deben ser de las disponibles
+    for accion in nombresAcciones:
+        if not (accion in acciones.keys()):
+            print("Debe elegir una empresa válida por favor (" + accion + ")")
             sys.exit(1)
 
-    #En el caso de querer trabajar con índices, debe ser uno de los disponibles
-    if args.indice:
-        if not (args.indice in indices):
-            print("Debe elegir un índice válido por favor")
+    #En el caso de querer trabajar con índices, deben ser de los disponibles
+    for indice in nombresIndices:
+        if not (indice in indices):
+            print("Debe elegir un índice válido por favor (" + indice + ")")
             sys.exit(1)
 
+    #Eliminamos los activos repetidos, conservando el orden en que se han pedido
+    activosPedidos = list(dict.fromkeys([(accion, False) for accion in nombresAcciones] + [(indice, True) for indice in nombresIndices]))
+
     #La API elegida debe ser una de las disponibles
     if not (args.api in apis):
         print("Debe elegir un API válida por favor")
         sys.exit(1)
 
+    #El número de hilos y la cuota del API deben ser positivos
+    if args.workers <= 0 or args.peticionesPorMinuto <= 0:
+        print("El número de hilos y de peticiones por minuto deben ser positivos")
+        sys.exit(1)
+
+    #La divisa debe ser un código ISO de tres letras, que pasamos a mayúsculas
+    divisa = args.divisa.upper()
+    if len(divisa) != 3 or not divisa.isalpha():
+        print("Debe elegir una divisa válida por favor (código de tres letras, como USD o EUR)")
+        sys.exit(1)
+
+    #La política de relleno de los tipos de cambio debe ser una de las disponibles
+    if not (args.rellenoDivisas in politicasRelleno):
+        print("El relleno de los tipos de cambio debe ser ffill o bfill")
+        sys.exit(1)
+
     #Fechas de inicio y de finalización en posiciones similares en sus respectivas listas formarán una pareja, que dará lugar a un período
     #Comprobamos que las dos listas de fechas tienen longitud similar
     if len(args.fechasInicio) != len(args.fechasFinal):
@@ -144,185 +470,58 @@ if __name__ == "__main__":
         sys.exit(1)
     
 
-    #Convertirmos las fechas de inicio y de fin del formato dd-mm-yyyy a yyyy-mm-dd
-    formatoFechas = "%Y-%m-%d"
-    fIniciosFormato = [fecha.strftime(formatoFechas) for fecha in fInicioConvertidas]
-    fFinalesFormato = [fecha.strftime(formatoFechas) for fecha in fFinalConvertidas]
-
-    #Trabajamos con el diccionario de acciones o el de índices en función de lo demandado por el usuario
-    ticker = args.accion if args.accion else args.indice
-    diccionario = acciones if args.accion else indices
-    nombresCSV = []
-    dataList = []
-    nombreAPI = ""
-
-    #Nombre de las columnas de precios
-    columnasPrecios = ['Close', 'High', 'Low', 'Open', 'Volume']
-
-    #Creamos un diccionario común entre APIs para almacenar la información extra de una empresa, si es así requerido
-    #por el usuario
-    infoExtra = {"Name" : "",
-                "Sector": "",
-                "Industry": "",
-                "Country": "",
-                "Market Capitalization": "",
-                "Dividend Yield": "",
-                "Currency": ""
-                }
-    nombreJSON = ""
+    #El formato de los archivos debe ser uno de los disponibles, y sus librerías deben estar instaladas
+    formato = args.formato.lower()
+    if not (formato in formatosSalida):
+        print("El formato de los archivos debe ser csv, parquet o npy")
+        sys.exit(1)
+    if not formato_disponible(formato):
+        print("Para usar el formato " + formato + " debe instalarse pyarrow")
+        sys.exit(1)
 
-    if args.api == "yfinance":
-        #En el caso de que se haya escogido un índice, habrá que quedarse con el primer elemento de la lista asociada a la clave en cuestión
-        activo = diccionario[ticker] if args.accion else diccionario[ticker][0]
-        nombreAPI = "yfinance_" + ticker
-        for i in range(len(fIniciosFormato)):
-            #Si el usuario ha pedido trabajar con yfinance, añadimos 1 día a la fecha porque en la llamada al api se excluye la fecha final pasada
-            fFinalesFormato[i] = (datetime.strptime(fFinalesFormato[i], formatoFechas) + timedelta(days=1)).strftime(formatoFechas)
-            data = yf.download(activo, start=fIniciosFormato[i], end=fFinalesFormato[i])
-            data = data[columnasPrecios]
-            #Como solo consultamos una empresa/índice, nos quedamos solamente con el nombre del tipo de precio en cada columna
-            data.columns = data.columns.get_level_values(0)
-
-            #Si estamos procesando un índice y su divisa no es USD, realizamos la conversión consultando el tipo de cambio para cada fecha
-            #Nos quedamos con el valor de cierre para cada fecha
-            if args.indice:
-                divisa = diccionario[ticker][2]
-                if divisa != "USD":
-                    tipoCambio = ""
-                    if divisa == "EUR":
-                        tipoCambio = "EURUSD=X"
-                    elif divisa == "JPY":
-                        tipoCambio = "JPYUSD=X"
-                    dataTipoCambio = yf.download(tipoCambio, start=fIniciosFormato[i], end=fFinalesFormato[i])
-                    #Si una fecha está en el dataframe de tipos de cambio pero no en la serie de precios, eliminamos dicha entrada
-                    for fecha in dataTipoCambio.index:
-                        if not(fecha in data.index):
-                            dataTipoCambio = dataTipoCambio.drop(fecha)
-
-                    listaCloseCambio = dataTipoCambio['Close'].to_numpy()
-        
-                    #Multiplicamos en todas las colunmnas menos en la última, que es la del volumen
-                    data = pd.concat([data.iloc[:,:-1] * listaCloseCambio, data.iloc[:,-1]], axis=1)
-            
-            #Cambiamos la precisión a 2 decimales como en el caso de alpha_vantage
-            data = data.round({'Close': 2, 'High': 2, 'Low': 2, 'Open': 2})
-
-            dataList.append(data)
-            nombresCSV.append(nombreAPI + "_" + args.fechasInicio[i] + "_" + args.fechasFinal[i] + ".csv")
-
-        if infoExtraNormalizada == "si":
-            info = yf.Ticker(activo).info
-            infoExtra["Name"] = info['longName']
-            #Si no encontramos el nombre de un campo (porque es un índice por ejemplo), manejamos la excepción
-            try:
-                infoExtra["Sector"] = info['sector']
-            except KeyError as k:
-                infoExtra["Sector"] = "No hay dato"
-            try:
-                infoExtra["Industry"] = info['industry']
-            except KeyError as k:
-                infoExtra["Industry"] = "No hay dato"
-            
-            try:
-                infoExtra["Country"] = info['country']
-            except KeyError as k:
-                infoExtra["Country"] = "No hay dato"
-
-            try:
-                infoExtra["Market Capitalization"] = info['marketCap']
-            except KeyError as k:
-                infoExtra["Market Capitalization"] = "No hay dato"
+    #Las respuestas posibles al parámetro perfil son si o no, y la carpeta donde guardarlo debe existir
+    perfilNormalizado = normalizar_texto(args.perfil)
+    if perfilNormalizado != "si" and perfilNormalizado != "no":
+        print("La respuesta a si quiere medir las etapas de la ejecución debe ser Sí o No")
+        sys.exit(1)
+    if perfilNormalizado == "si" and not exists_route(args.rutaPerfil):
+        print("La ruta del perfil introducida no existe")
+        sys.exit(1)
+    memoriaPerfilNormalizada = normalizar_texto(args.memoriaPerfil)
+    if memoriaPerfilNormalizada != "si" and memoriaPerfilNormalizada != "no":
+        print("La respuesta a si quiere medir la memoria de las etapas debe ser Sí o No")
+        sys.exit(1)
+    if perfilNormalizado == "si":
+        iniciar_perfil("extractor", memoriaPerfilNormalizada == "si")
 
-            try:
-                infoExtra["Dividend Yield"] = info['dividendYield']
-            except KeyError as k:
-                infoExtra["Dividend Yield"] = "No hay dato"
+    #Las series descargadas se guardan en una caché en disco, para no volver a descargar los rangos de fechas ya consultados
+    cache = CachePrecios(args.rutaCache, activa=not args.sinCache, refrescar=args.refrescar)
+    #Períodos pedidos por el usuario, como parejas de fechas (ambas incluidas)
+    periodos = [(fInicioConvertidas[i].date(), fFinalConvertidas[i].date()) for i in range(len(fInicioConvertidas))]
 
-            infoExtra["Currency"] = info['currency']
-            nombreJSON = nombreAPI + ".json"
+    inicioExtraccion = time.perf_counter()
+    if args.api == "yfinance":
+        resultados, tiempoComun = extraer_yfinance(activosPedidos, periodos, cache, infoExtraNormalizada == "si", args.workers, divisa, args.rellenoDivisas)
+        prefijoAPI = "yfinance_"
     elif args.api == "alpha_vantage":
-        ts = TimeSeries(key=claveAPI, output_format='pandas')
-        #En el caso de que se haya escogido un índice, habrá que quedarse con el segundo elemento de la lista asociada a la clave en cuestión
-        activo = diccionario[ticker] if args.accion else diccionario[ticker][1]
-        ordenColumnas = ['4. close', '2. high', '3. low', '1. open', '5. volume']
-        data, _ = ts.get_daily(symbol=activo, outputsize = 'full')
-
-        #Imponemos el mismo orden que hay en lo devuelto por yfinance
-        data = data[ordenColumnas]
-        #Imponemos los mismos nombres de columnas que los devueltos en yfinance
-        data.columns = columnasPrecios
-        #Imponemos el mismo nombre de índice que en yfinance
-        data = data.rename_axis('Date')
-        #La columna Volume la ponemos como entero, para que no se muestre con el punto decimal
-        data['Volume'] = data['Volume'].astype(int)
-        nombreAPI = "alphaVantage_" + ticker
-        for i in range(len(fIniciosFormato)):
-            #Alpha Vantage, a diferencia de yfinance, no tiene parámetros para especificar un rango de fechas, por lo que debemos ordenar la serie temporal
-            #que nos devuelve y luego quedarnos con el rango especificado por el usuario
-            dataList.append(data.sort_index().loc[fIniciosFormato[i]:fFinalesFormato[i]])
-            nombresCSV.append(nombreAPI + "_" + args.fechasInicio[i] + "_" + args.fechasFinal[i] + ".csv")
-
-        if infoExtraNormalizada == "si":
-            if args.accion :
-                fd = FundamentalData(key=claveAPI, output_format='pandas')
-                overview, meta = fd.get_company_overview(activo)
-                #Como lo que nos devuelve overview para cada campo es un dataframe de una sola columna, nos quedamos con su contenido en la primera fila
-                infoExtra["Name"] = overview['Name'].iloc[0]
-                infoExtra["Sector"] = overview['Sector'].iloc[0]
-                infoExtra["Industry"] = overview['Industry'].iloc[0]
-                infoExtra["Country"] = overview['Country'].iloc[0]
-                #Convertimos a entero al igual que es devuelto por yfinance
-                infoExtra["Market Capitalization"] = int(overview['MarketCapitalization'].iloc[0])
-                #Convertimos a float al igual que es devuelto por yfinance
-                infoExtra["Dividend Yield"] = float(overview['DividendYield'].iloc[0])
-                infoExtra["Currency"] = overview['Currency'].iloc[0]
-            else:
-                #Si se ha pasado un índice (que en el caso de alpha_vantage corresponde con un ETF suyo), entonces tenemos que hacer un GET al siguiente endpoint
-                url = f"https://www.alphavantage.co/query?function=SYMBOL_SEARCH&keywords={activo}&apikey={claveAPI}"
-                respuesta = requests.get(url)
-                datos = respuesta.json()
-                
-                for match in datos.get("bestMatches", []):
-                    #De entre todas las coincidencias, nos quedamos con la que coincida el símbolo con el de nuestro ETF
-                    if match.get("1. symbol", "").upper() == activo:
-                        infoExtra["Name"] = match.get('2. name')
-                        infoExtra["Country"] = match.get('4. region')
-                        infoExtra["Currency"] = match.get('8. currency')
-                        #El resto de campos los devolvemos vacíos
-                        infoExtra["Sector"] = "No hay dato"
-                        infoExtra["Industry"] = "No hay dato"
-                        infoExtra["Market Capitalization"] = "No hay dato"
-                        infoExtra["Dividend Yield"] = "No hay dato"
-
-            nombreJSON = nombreAPI + ".json"
-
-    #Exportamos a csv las series temporales obtenidas. El parámetro indiceColumna está a True para que se incluya a la fecha como a una columna más
-    for i in range(len(nombresCSV)):
-        data = dataList[i]
-        csv = nombresCSV[i]
-        save_csv(data, args.rutaCSV +  "\\" + csv, True)
-
-    if infoExtraNormalizada == "si":
-        #Guardamos en un .json el contenido de infoExtra
-        save_json(args.rutaJSON + "\\" + nombreJSON, infoExtra)
-        
-
-
-    
-
-    
-        
-
-
-        
-
-    
-
-
-    
-
-
-    
-    
-
-    
\ No newline at end of file
+        resultados, tiempoComun = extraer_alpha_vantage(activosPedidos, periodos, cache, infoExtraNormalizada == "si", args.workers, args.peticionesPorMinuto,
+                                           divisa, args.rellenoDivisas)
+        prefijoAPI = "alphaVantage_"
+
+    #Exportamos los resultados de cada activo, midiendo también el tiempo de escritura
+    tiempos = {}
+    for nombre, (dataList, infoExtra, tiempo) in resultados.items():
+        inicio = time.perf_counter()
+        guardar_activo(prefijoAPI + nombre, dataList, infoExtra, args.fechasInicio, args.fechasFinal, args.rutaCSV, args.rutaJSON, formato)
+        tiempos[nombre] = tiempo + time.perf_counter() - inicio
+
+    print(cache.obtenerResumen())
+    if len(resultados) > 1:
+        print("Tiempos por activo:")
+        for nombre, tiempo in tiempos.items():
+            print(f"  {nombre}: {tiempo:.3f} s")
+    #Con yfinance todos los activos se descargan en una única llamada, así que los tiempos por activo no incluyen la descarga, que se muestra aparte
+    if tiempoComun > 0:
+        print(f"Descarga conjunta de todos los activos (no incluida en los tiempos por activo): {tiempoComun:.3f} s")
+    print(f"Tiempo total: {time.perf_counter() - inicioExtraccion:.3f} s")
+    guardar_perfil(args.rutaPerfil)
@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+import importlib.util
+from data_utils import save_csv
+from perfil import etapa
+
+#Formatos en los que pueden guardarse las series de precios y los resultados de las simulaciones:
+#Csv: Texto, compatible con versiones anteriores y con cualquier programa, pero lento de escribir y de leer y mucho más grande que los demás
+#Parquet: Columnar, comprimido y dividido en grupos de filas, de forma que pueden leerse solo algunas columnas o grupos. Necesita pyarrow
+#Npy: Array de numpy en crudo, sin comprimir, que se escribe y se lee a la velocidad del disco y puede mapearse en memoria
+formatosSalida = ["csv", "parquet", "npy"]
+#Extensión de los archivos de cada formato
+extensionesFormatos = {"csv": ".csv", "parquet": ".parquet", "npy": ".npy"}
+#Compresión y número de filas de cada grupo de los archivos parquet. En las simulaciones cada fila es una simulación, por lo que cada grupo ocupa unos
+#pocos MB y puede leerse por separado
+COMPRESION_PARQUET = "zstd"
+FILAS_GRUPO_PARQUET = 16384
+
+#Función que indica si un formato puede usarse con las librerías instaladas
+def formato_disponible(formato):
+    if formato == "parquet":
+        return importlib.util.find_spec("pyarrow") is not None
+    return formato in formatosSalida
+
+#Función que devuelve el formato de un archivo a partir de su extensión, o None si no corresponde a ninguno
+def get_formato(ruta):
+    for formato, extension in extensionesFormatos.items():
+        if ruta.lower().endswith(extension):
+            return formato
+    return None
+
+#Función que convierte un dataframe en un array estructurado de numpy, con un campo por columna (y por índice, si se pide). Las columnas de texto, que pandas
+#guarda como objetos, se convierten a cadenas de longitud fija para que el array pueda guardarse sin pickle
+def get_registros(data, indiceColumna):
+    registros = data.to_records(index=indiceColumna)
+    tipos = [(nombre, np.array(registros[nombre]).astype(str).dtype if registros.dtype[nombre] == object else registros.dtype[nombre])
+             for nombre in registros.dtype.names]
+    return registros.astype(tipos)
+
+#Función para almacenar un dataframe en el formato indicado, añadiendo la extensión correspondiente al nombre. En npy los dataframes numéricos sin índice
+#(como los resúmenes de las simulaciones) se guardan como una matriz, y el resto como un array estructurado con un campo por columna
+#Nombre: Ruta del archivo a generar, sin extensión
+#IndiceColumna: Indica si el índice del dataframe se guarda como una columna más
+#Devuelve la ruta del archivo generado, o None si ha habido algún error
+def save_tabla(data, nombre, indiceColumna, formato="csv"):
+    ruta = nombre + extensionesFormatos[formato]
+    if formato == "csv":
+        save_csv(data, ruta, indiceColumna)
+        return ruta
+    try:
+        with etapa("save_" + formato, ruta):
+            if formato == "parquet":
+                #Parquet solo admite nombres de columnas de texto
+                data.rename(columns=str).to_parquet(ruta, index=indiceColumna, compression=COMPRESION_PARQUET, row_group_size=FILAS_GRUPO_PARQUET)
+            elif not indiceColumna and all(pd.api.types.is_numeric_dtype(tipo) for tipo in data.dtypes) and len(set(data.dtypes)) == 1:
+                np.save(ruta, data.to_numpy())
+            else:
+                np.save(ruta, get_registros(data, indiceColumna))
+        print("El archivo " + ruta + " fue creado con éxito")
+        return ruta
+    except Exception as e:
+        print("Error al crear el archivo " + ruta)
+        return None
+
+#Función para almacenar una matriz de simulaciones de Monte Carlo, de dimensiones (simulaciones, días), en el formato indicado. En csv se mantiene el formato
+#de siempre, con una columna por simulación. En parquet y en npy cada fila es una simulación, con una columna por día, lo que permite leer solo algunas
+#simulaciones (grupos de filas en parquet, o mapeando el archivo en npy) y evita tener decenas de miles de columnas
+#Nombre: Ruta del archivo a generar, sin extensión
+#Devuelve la ruta del archivo generado, o None si ha habido algún error
+def save_simulaciones(simulacion, nombre, formato="csv"):
+    if formato == "csv":
+        #Al construir el dataframe desde la traspuesta de la matriz no se copian los datos
+        dataframeSimulacion = pd.DataFrame(simulacion.T, columns=['Simulación ' + str(i+1) for i in range(simulacion.shape[0])], copy=False)
+        return save_tabla(dataframeSimulacion, nombre, False, formato)
+    if formato == "parquet":
+        dataframeSimulacion = pd.DataFrame(simulacion, columns=['Día ' + str(j+1) for j in range(simulacion.shape[1])], copy=False)
+        return save_tabla(dataframeSimulacion, nombre, False, formato)
+
+    ruta = nombre + extensionesFormatos[formato]
+    try:
+        with etapa("save_npy", ruta):
+            np.save(ruta, simulacion)
+        print("El archivo " + ruta + " fue creado con éxito")
+        return ruta
+    except Exception as e:
+        print("Error al crear el archivo " + ruta)
+        return None
+
+#Función para leer un dataframe guardado con save_tabla (o un CSV generado por extractor.py), eligiendo el formato por la extensión del archivo. El índice,
+#si se guardó, se devuelve como una columna más
+#Tipos: Diccionario con las columnas a leer y sus tipos. En csv se leen ya con esos tipos, mientras que en parquet y npy se mantienen los guardados (por
+#ejemplo, las fechas ya son fechas en lugar de texto)
+#Devuelve el dataframe leído, o None si el archivo no existe o no es válido
+def load_tabla(ruta, tipos=None):
+    try:
+        formato = get_formato(ruta)
+        columnas = list(tipos) if tipos else None
+        if formato == "parquet":
+            data = pd.read_parquet(ruta)
+            #El índice guardado (por ejemplo, las fechas de las series) vuelve a ser una columna
+            if data.index.name is not None:
+                data = data.reset_index()
+        elif formato == "npy":
+            datos = np.load(ruta)
+            data = pd.DataFrame.from_records(datos) if datos.dtype.names else pd.DataFrame(datos)
+        else:
+            return pd.read_csv(ruta, usecols=columnas, dtype=tipos)
+        return data[columnas] if columnas else data
+    except Exception as e:
+        return None
+
+#Función para leer una matriz de simulaciones guardada con save_simulaciones, de dimensiones (simulaciones, días), sea cual sea su formato
+#EnMemoria: En npy, si está a False el archivo se mapea en memoria en lugar de leerse entero, de forma que solo se lee de disco lo que se usa
+#Devuelve la matriz leída, o None si el archivo no existe o no es válido
+def load_simulaciones(ruta, enMemoria=True):
+    try:
+        formato = get_formato(ruta)
+        if formato == "npy":
+            return np.load(ruta, mmap_mode=None if enMemoria else "r")
+        if formato == "parquet":
+            return pd.read_parquet(ruta).to_numpy()
+        return pd.read_csv(ruta, encoding="latin-1").to_numpy().T
+    except Exception as e:
+        return None
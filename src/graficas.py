@@ -0,0 +1,376 @@
+import re
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from perfil import perfilar
+
+#Este archivo contiene todas las gráficas del proyecto, separadas de los cálculos. Matplotlib y seaborn solo se importan dentro de cada gráfica, cuando
+#realmente se va a generar, de forma que importar cartera.py o ejecutar una simulación sin gráficas no paga su coste de importación
+
+#Formatos de salida disponibles para las gráficas: pantalla las muestra en ventanas (bloqueando hasta que se cierran), png y svg las guardan en archivos sin
+#mostrarlas y none no las genera, sin llegar a importar matplotlib ni seaborn
+formatosGraficas = ["pantalla", "png", "svg", "none"]
+#Configuración actual de las gráficas, que se modifica con configurar_graficas
+configuracionGraficas = {"formato": "pantalla", "ruta": "."}
+#Número máximo de puntos de la nube de carteras aleatorias que se dibujan en la gráfica de la frontera eficiente, ya que dibujar millones de puntos no aporta nada y es muy lento
+PUNTOS_GRAFICA = 20000
+#Número máximo de fotogramas de las animaciones, para que su tamaño no dependa de la longitud de las series
+FOTOGRAMAS_ANIMACION = 200
+
+#Función para elegir el formato de salida de las gráficas y el directorio donde se guardan si se exportan a archivos
+def configurar_graficas(formato, ruta="."):
+    configuracionGraficas["formato"] = formato
+    configuracionGraficas["ruta"] = ruta
+
+#Función que indica si hay que generar las gráficas
+def graficas_activas():
+    return configuracionGraficas["formato"] != "none"
+
+#Función que importa pyplot bajo demanda. Si las gráficas se exportan a archivos se usa el backend Agg, que no necesita pantalla
+def get_pyplot():
+    import matplotlib
+    if configuracionGraficas["formato"] != "pantalla":
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
+
+#Función que termina una gráfica: la muestra o la guarda en un archivo con el nombre del título, según el formato elegido, y después cierra la figura para
+#liberar su memoria
+def finalizar_grafica(plt, fig, titulo):
+    formato = configuracionGraficas["formato"]
+    if formato == "pantalla":
+        plt.show()
+    else:
+        nombreArchivo = re.sub(r"[^\w\-]+", "_", titulo).strip("_") + "." + formato
+        fig.savefig(configuracionGraficas["ruta"] + "\\" + nombreArchivo, format=formato, bbox_inches="tight")
+    plt.close(fig)
+
+#Función que realiza una gráfica dada como una tupla (función, argumentos), para poder repartirlas entre varios procesos
+def ejecutar_grafica(tarea):
+    funcion, argumentos = tarea
+    return funcion(*argumentos)
+
+#Función que realiza una lista de gráficas, dadas como tuplas (función, argumentos). Si se exportan a archivos y se piden varios procesos, se reparten entre
+#ellos, configurando cada proceso igual que el actual. Devuelve la lista de resultados de cada gráfica
+def realizar_graficas(tareas, workers=1):
+    if workers <= 1 or configuracionGraficas["formato"] == "pantalla":
+        return [ejecutar_grafica(tarea) for tarea in tareas]
+    with ProcessPoolExecutor(max_workers=workers, initializer=configurar_graficas,
+                             initargs=(configuracionGraficas["formato"], configuracionGraficas["ruta"])) as ejecutor:
+        return list(ejecutor.map(ejecutar_grafica, tareas))
+
+#Función para visualizar en un gráfico las simulaciones realizadas para un valor o cartera
+@perfilar()
+def grafica_simulaciones(data, titulo):
+    if not graficas_activas():
+        return
+    plt = get_pyplot()
+    from matplotlib import ticker
+    data.plot(figsize=(10,5))
+    plt.title(titulo)
+    #Imponemos que las etiquetas del eje de abscisas sean números enteros, ya que representan días
+    plt.gca().xaxis.set_major_locator(ticker.MaxNLocator(integer=True))
+    plt.xlabel("Días")
+    plt.ylabel("Valores")
+    plt.legend(title="Simulaciones")
+    plt.grid(True)
+    finalizar_grafica(plt, plt.gcf(), titulo)
+
+#Función para visualizar la evolución de la media y de los percentiles por día de un conjunto de simulaciones, dado el dataframe de resumen generado en modo streaming
+@perfilar()
+def grafica_resumen_simulaciones(resumen, percentiles, titulo):
+    if not graficas_activas():
+        return
+    plt = get_pyplot()
+    from matplotlib import ticker
+    fig = plt.figure(figsize=(10,5))
+    dias = resumen.index
+    percentilesOrdenados = sorted(percentiles)
+    #Sombreamos la banda entre cada pareja de percentiles simétricos, más intensa cuanto más cerca de la mediana
+    for i in range(len(percentilesOrdenados) // 2):
+        inferior = "Percentil " + f"{percentilesOrdenados[i]:g}"
+        superior = "Percentil " + f"{percentilesOrdenados[-(i+1)]:g}"
+        plt.fill_between(dias, resumen[inferior], resumen[superior], color='steelblue', alpha=0.15 + 0.15*i,
+                         label="Percentiles " + f"{percentilesOrdenados[i]:g}-{percentilesOrdenados[-(i+1)]:g}")
+    plt.plot(dias, resumen["Media"], color='darkorange', label="Media")
+    plt.title(titulo)
+    plt.gca().xaxis.set_major_locator(ticker.MaxNLocator(integer=True))
+    plt.xlabel("Días")
+    plt.ylabel("Valores")
+    plt.legend()
+    plt.grid(True)
+    finalizar_grafica(plt, fig, titulo)
+
+#Función para visualizar cómo decrece el error típico de cada métrica al aumentar el número de simulaciones con cada técnica, en escala logarítmica, dado el
+#dataframe generado por get_informe_convergencia. Se añade como referencia la recta del muestreo aleatorio, cuyo error decrece como 1/sqrt(simulaciones)
+@perfilar()
+def grafica_convergencia(informe, titulo):
+    if not graficas_activas():
+        return
+    plt = get_pyplot()
+    metricas = list(dict.fromkeys(informe["Métrica"]))
+    fig, ejes = plt.subplots(1, len(metricas), figsize=(5*len(metricas), 4), squeeze=False)
+    for eje, metrica in zip(ejes[0], metricas):
+        datosMetrica = informe[informe["Métrica"] == metrica]
+        for tecnica, datosTecnica in datosMetrica.groupby("Técnica", sort=False):
+            eje.loglog(datosTecnica["Simulaciones"], datosTecnica["Error típico"], marker="o", label=tecnica)
+        aleatorio = datosMetrica[datosMetrica["Técnica"] == "aleatorio"]
+        if aleatorio.shape[0] > 0:
+            simulaciones = aleatorio["Simulaciones"].to_numpy(dtype=float)
+            eje.loglog(simulaciones, aleatorio["Error típico"].iloc[0] * np.sqrt(simulaciones[0] / simulaciones), color="gray", linestyle="--",
+                       label="1/sqrt(n)")
+        eje.set_title(metrica)
+        eje.set_xlabel("Simulaciones")
+        eje.set_ylabel("Error típico")
+        eje.grid(True, which="both", alpha=0.3)
+        eje.legend()
+    fig.suptitle(titulo)
+    fig.tight_layout()
+    finalizar_grafica(plt, fig, titulo)
+
+#Función para visualizar la evolución histórica del valor de una cartera con cada regla de rebalanceo del backtest
+#Data: Dataframe con las fechas como índice y una columna por regla
+@perfilar()
+def grafica_backtest(data, titulo):
+    if not graficas_activas():
+        return
+    plt = get_pyplot()
+    data.plot(figsize=(10,5))
+    plt.title(titulo)
+    plt.xlabel("Fecha")
+    plt.ylabel("Valor")
+    plt.legend(title="Rebalanceo")
+    plt.grid(True)
+    finalizar_grafica(plt, plt.gcf(), titulo)
+
+#Función para visualizar un diagrama de sectores, dadas una lista de etiquetas, sus correspondientes tamaños en el diagrama (sobre 100) y el título que deseemos ponerle
+@perfilar()
+def grafica_sectores(etiquetas, tamanios, titulo):
+    if len(etiquetas) != len(tamanios):
+        print("Debe haber el mismo número de etiquetas que de tamaños")
+        return False
+    
+    if np.sum(np.array(tamanios)) != 100:
+        print("El total de los tamaños debe sumar 100")
+        return False
+    
+    #Queremos que se ordenen por los tamaños, de mayor a menor
+    ordenados = sorted(zip(etiquetas, tamanios), key=lambda x: x[1], reverse=True)
+    etiquetas_ordenados, tamanios_ordenados = zip(*ordenados)
+
+    #Indicamos que se resalte el sector más grande
+    resalte = np.zeros(len(etiquetas)).tolist()
+    resalte[0] = 0.05
+
+    if not graficas_activas():
+        return True
+    plt = get_pyplot()
+    fig, ax = plt.subplots(figsize=(5,5))
+    #Indicamos que se muestre el porcentaje de cada sector, que empiece en la parte superior y que tenga sombra
+    ax.pie(tamanios_ordenados, labels=etiquetas_ordenados, explode=resalte, autopct="%1.1f%%", startangle=90, shadow=True)
+    ax.set_title(titulo)
+    #Queremos que se visualize un círculo perfecto
+    ax.axis("equal")
+    finalizar_grafica(plt, fig, titulo)
+
+    return True
+
+#Función para visualizar la media móvil de una cartera con una ventana de n días
+@perfilar()
+def grafica_media_movil(n,cartera):
+    pesos = cartera.obtenerPesos()
+    #Los precios y las medias móviles de la cartera empiezan en la primera fecha en la que cotizan todos sus activos
+    fechas = cartera.obtenerFechas()[cartera.obtenerInicioComun():]
+
+    #Comprobamos que n es mayor que 0 y menor o igual que el número de fechas
+    if n <= 0 or n > fechas.shape[0]:
+        print("El tamaño de la ventana debe ser mayor que 0 y menor o igual que el número de entradas de la serie")
+        return False
+
+    if not graficas_activas():
+        return True
+
+    #Como estamos usando media móvil simple y las series temporales de los activos están alineadas temporalmente, podemos calcular
+    #la media móvil de la cartera como la suma ponderada de las medias móviles de sus activos, que se calculan todas a la vez
+    mediasMovilesPonderadas = pesos @ cartera.obtenerIndicadores("sma", n=n)
+    #Para ver la tendencia de la cartera, visualizamos la media móvil junto con los precios de cierre
+    preciosCierrePonderados = pesos @ cartera.obtenerMatrizPrecios("close")
+
+
+    plt = get_pyplot()
+    fig = plt.figure(figsize=(10,6))
+    plt.plot(fechas,preciosCierrePonderados, label="Valor cartera", color='steelblue')
+    #Como es media móvil de n días, no tenemos entrada de fecha hasta el día n del período
+    plt.plot(fechas[n-1:],mediasMovilesPonderadas, label="Media móvil " +  str(n) + " días", color='orange', linewidth=2)
+    plt.xlabel("Fecha")
+    plt.ylabel("Valor ponderado")
+    titulo = "Evolución de " + cartera.obtenerNombreCartera() + " y su media móvil (" + str(n) + " días)"
+    plt.title(titulo)
+    plt.legend()
+    finalizar_grafica(plt, fig, titulo)
+
+    return True
+
+#Función para visualizar el RSI de las componentes de una cartera, con una ventana de 14 días
+def grafica_RSI_activos(cartera):
+    fechas = cartera.obtenerFechas()
+
+    #Comprobamos que el número de fechas es mayor o igual que 15
+    if fechas.shape[0] < 15:
+        print("El número de entradas en las series temporales de los activos debe ser mayor o igual que 15")
+        return False
+
+    #Cada activo se representa con sus propias fechas, que pueden no coincidir con las alineadas de la cartera
+    for activo in cartera.activos:
+        grafica_RSI_activo(activo.obtenerFechas(), activo)
+
+    return True
+
+#Función para visualizar el precio y el RSI, con una ventana de 14 días, de un activo, dadas las fechas de su serie
+@perfilar()
+def grafica_RSI_activo(fechas, activo):
+    if not graficas_activas():
+        return True
+    plt = get_pyplot()
+    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(10,7), sharex=True, gridspec_kw={'height_ratios':[3,1]})
+
+    titulo = "Precio y RSI (14 días) " + activo.obtenerNombreActivo()
+    ax1.plot(fechas, activo.obtenerClosePrices(), label="Precio", color="steelblue")
+    ax1.set_title(titulo)
+    ax1.set_ylabel("Precio (USD)")
+    ax1.legend(loc="upper left")
+
+    #Como hemos calculado el RSI con ventana de 14 días, no tenemos entrada de fecha hasta el día 15 del período estudiado
+    ax2.plot(fechas[14:],activo.obtenerRSI(), color='darkorange', label='RSI (14 días)')
+    ax2.axhline(70, color='red', linestyle='--', linewidth=1)
+    ax2.axhline(30, color='green', linestyle='--', linewidth=1)
+    ax2.fill_between(fechas[14:], 70, 100, color='red', alpha=0.1)
+    ax2.fill_between(fechas[14:], 0, 30, color='green', alpha=0.1)
+    ax2.set_ylabel("RSI")
+    ax2.set_xlabel("Fecha")
+    ax2.set_ylim(0, 100)
+    ax2.legend(loc="upper left")
+
+    plt.tight_layout()
+    finalizar_grafica(plt, fig, titulo)
+
+    return True
+
+
+#Función para visualizar una matriz de correlación mediante un mapa de calor, dadas también las etiquetas cuya correlación está representada por la matriz
+@perfilar()
+def mapa_calor(matriz_corr, etiquetas, titulo):
+    if not np.array_equal(matriz_corr.T, matriz_corr):
+        print("La matriz de correlación debe ser simétrica")
+        return False
+    
+    #Como es simétrica, es igual comparar por su número de filas que por su número de columnas
+    if len(etiquetas) != matriz_corr.shape[0]:
+        print("Debe haber tantas etiquetas como filas/columnas tiene la matriz de correlación")
+        return False
+    
+    if not graficas_activas():
+        return True
+    plt = get_pyplot()
+    import seaborn as sns
+    fig = plt.figure()
+    sns.heatmap(matriz_corr, annot=True, xticklabels=etiquetas, yticklabels=etiquetas, cmap="coolwarm", center=0)
+    plt.title(titulo)
+    finalizar_grafica(plt, fig, titulo)
+
+    return True
+
+#Función para visualizar la evolución de las correlaciones móviles de todos los pares de activos en un único mapa de calor, con un par por fila y una ventana
+#por columna
+#Fechas: Fecha final de cada ventana
+#SeriesPares: Matriz de dimensiones (ventanas, pares), obtenida con get_series_pares
+@perfilar()
+def grafica_correlaciones_moviles(fechas, seriesPares, nombresPares, titulo):
+    if seriesPares.shape[0] != len(fechas) or seriesPares.shape[1] != len(nombresPares):
+        print("Debe haber una fecha por ventana y un nombre por par de activos")
+        return False
+
+    if not graficas_activas():
+        return True
+    plt = get_pyplot()
+    import matplotlib.dates as mdates
+    fig = plt.figure(figsize=(12, max(3, 0.3*len(nombresPares))))
+    limites = [mdates.date2num(fechas[0]), mdates.date2num(fechas[-1]), len(nombresPares) - 0.5, -0.5]
+    imagen = plt.imshow(seriesPares.T, aspect="auto", cmap="coolwarm", vmin=-1, vmax=1, extent=limites, interpolation="nearest")
+    plt.gca().xaxis_date()
+    plt.yticks(range(len(nombresPares)), nombresPares)
+    fig.colorbar(imagen, label="Correlación")
+    plt.title(titulo)
+    finalizar_grafica(plt, fig, titulo)
+
+    return True
+
+#Función para animar la evolución de la matriz de correlaciones móviles. Si las gráficas se exportan a archivos, la animación se guarda como GIF con el nombre
+#del título. Para series largas se toma una de cada varias ventanas, de forma que haya como mucho FOTOGRAMAS_ANIMACION fotogramas
+#Correlaciones: Pila de matrices de correlación de dimensiones (ventanas, activos, activos)
+@perfilar()
+def animacion_correlaciones_moviles(fechas, correlaciones, etiquetas, titulo):
+    if correlaciones.shape[0] != len(fechas) or correlaciones.shape[1] != len(etiquetas):
+        print("Debe haber una fecha por ventana y tantas etiquetas como activos")
+        return False
+
+    if not graficas_activas():
+        return True
+    plt = get_pyplot()
+    from matplotlib import animation
+    paso = -(-correlaciones.shape[0] // FOTOGRAMAS_ANIMACION)
+    fotogramas = range(0, correlaciones.shape[0], paso)
+    fig = plt.figure()
+    imagen = plt.imshow(correlaciones[0], cmap="coolwarm", vmin=-1, vmax=1)
+    plt.xticks(range(len(etiquetas)), etiquetas, rotation=90)
+    plt.yticks(range(len(etiquetas)), etiquetas)
+    fig.colorbar(imagen, label="Correlación")
+
+    def actualizar(k):
+        imagen.set_data(correlaciones[k])
+        plt.title(titulo + " " + str(fechas[k]))
+        return (imagen,)
+
+    animacionCorrelaciones = animation.FuncAnimation(fig, actualizar, frames=fotogramas, interval=100)
+    if configuracionGraficas["formato"] == "pantalla":
+        plt.show()
+    else:
+        nombreArchivo = re.sub(r"[^\w\-]+", "_", titulo).strip("_") + ".gif"
+        animacionCorrelaciones.save(configuracionGraficas["ruta"] + "\\" + nombreArchivo, writer=animation.PillowWriter(fps=10))
+    plt.close(fig)
+
+    return True
+
+#Función para visualizar la frontera eficiente junto con la nube de carteras aleatorias (coloreadas por su ratio de Sharpe), las carteras de mínima varianza y
+#máximo Sharpe y los activos individuales
+#Nube: Tupla (rendimientos, volatilidades) de las carteras aleatorias, de la que solo se dibujan PUNTOS_GRAFICA puntos
+#Frontera, MinimaVarianza, MaximoSharpe: Tuplas (rendimientos, volatilidades). MaximoSharpe puede ser None
+#Activos: Tupla (rendimientos, volatilidades, nombres) de los activos individuales
+@perfilar()
+def grafica_frontera_eficiente(nube, frontera, minimaVarianza, maximoSharpe, activos, tasaLibreRiesgo, titulo):
+    if not graficas_activas():
+        return True
+    plt = get_pyplot()
+    fig = plt.figure(figsize=(10,6))
+
+    rendimientosNube, volatilidadesNube = nube
+    paso = max(1, rendimientosNube.shape[0] // PUNTOS_GRAFICA)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpes = (rendimientosNube[::paso] - tasaLibreRiesgo) / volatilidadesNube[::paso]
+    puntos = plt.scatter(volatilidadesNube[::paso], rendimientosNube[::paso], c=sharpes, cmap="viridis", s=2, alpha=0.5)
+    plt.colorbar(puntos, label="Ratio de Sharpe")
+    plt.plot(frontera[1], frontera[0], color="black", linewidth=2, label="Frontera eficiente")
+    plt.scatter(minimaVarianza[1], minimaVarianza[0], color="blue", marker="*", s=200, label="Mínima varianza")
+    if maximoSharpe is not None:
+        plt.scatter(maximoSharpe[1], maximoSharpe[0], color="red", marker="*", s=200, label="Máximo Sharpe")
+    plt.scatter(activos[1], activos[0], color="grey", marker="x", label="Activos")
+    #Si hay muchos activos no etiquetamos cada uno, ya que los nombres se solaparían
+    if len(activos[2]) <= 20:
+        for rendimiento, volatilidad, nombre in zip(*activos):
+            plt.annotate(nombre, (volatilidad, rendimiento), fontsize=8)
+    plt.xlabel("Volatilidad diaria")
+    plt.ylabel("Rendimiento diario")
+    plt.title(titulo)
+    plt.legend()
+    finalizar_grafica(plt, fig, titulo)
+
+    return True
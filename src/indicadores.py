@@ -0,0 +1,131 @@
+import numpy as np
+
+#Todas las funciones de este archivo trabajan sobre matrices de precios de dimensiones (activos, días), calculando el indicador de todos los activos a la vez.
+#También admiten una única serie como vector, en cuyo caso se trata como una matriz de una fila
+
+#Función que comprueba que una ventana de n días es positiva y no mayor que el número de días disponibles
+def comprobar_ventana(n, numDias):
+    if n <= 0 or n > numDias:
+        print("El número de días debe ser positivo y menor o igual que la longitud de la serie")
+        return False
+    return True
+
+#Función que aplica a cada fila de una matriz un suavizado exponencial y[t] = alfa*x[t] + (1 - alfa)*y[t-1], partiendo de un valor inicial por fila.
+#Se resuelve como un filtro lineal, por lo que no hay bucles en Python ni por activo ni por día. Scipy.signal tarda más de un segundo en importarse, así que
+#solo se importa cuando se calcula algún indicador que lo necesita
+#Inicial: Valor de y en el instante anterior al primero, para cada fila
+def suavizado_exponencial(datos, alfa, inicial):
+    from scipy.signal import lfilter
+    condicionesIniciales = ((1 - alfa) * np.asarray(inicial, dtype=float)).reshape(-1, 1)
+    suavizado, _ = lfilter([alfa], [1, -(1 - alfa)], datos, axis=1, zi=condicionesIniciales)
+    return suavizado
+
+#Función que calcula las medias de cada ventana de n días de cada fila, mediante sumas acumuladas. Devuelve una matriz de dimensiones (activos, días - n + 1)
+def medias_ventana(datos, n):
+    #Reservamos una columna inicial de ceros para que la suma de la primera ventana también sea una diferencia
+    acumulado = np.zeros((datos.shape[0], datos.shape[1] + 1))
+    np.cumsum(datos, axis=1, out=acumulado[:, 1:])
+    return (acumulado[:, n:] - acumulado[:, :-n]) / n
+
+#Cálculo de la media móvil simple de n días. Devuelve una matriz de dimensiones (activos, días - n + 1), con la media de cada ventana completa
+def get_sma(precios, n=20):
+    precios = np.atleast_2d(precios)
+    if not comprobar_ventana(n, precios.shape[1]):
+        return np.array([])
+    return medias_ventana(precios, n)
+
+#Cálculo de la media móvil exponencial de n días, con factor de suavizado 2/(n + 1) y partiendo del primer precio. Devuelve una matriz de las mismas
+#dimensiones que la de precios
+def get_ema(precios, n=20):
+    precios = np.atleast_2d(precios)
+    if not comprobar_ventana(n, precios.shape[1]):
+        return np.array([])
+    return suavizado_exponencial(precios, 2 / (n + 1), precios[:, 0])
+
+#Cálculo del RSI de n días. Con el suavizado de Wilder, las medias de ganancias y pérdidas comienzan siendo la media simple de los n primeros cambios y
+#después se actualizan con un suavizado exponencial de factor 1/n. Con el suavizado simple, son la media de los cambios de cada ventana de n días
+#Devuelve una matriz de dimensiones (activos, días - n), ya que el primer RSI corresponde al día n + 1
+def get_rsi(precios, n=14, suavizado="wilder"):
+    precios = np.atleast_2d(precios)
+    #Debemos asegurarnos de que haya al menos n + 1 precios, para que nos queden n cambios
+    if not comprobar_ventana(n, precios.shape[1] - 1):
+        return np.array([])
+
+    cambiosDiarios = np.diff(precios, axis=1)
+    ganancias = np.maximum(cambiosDiarios, 0)
+    #Como las pérdidas tienen todas signo negativo, se lo cambiamos
+    perdidas = np.maximum(-cambiosDiarios, 0)
+
+    if suavizado == "wilder":
+        mediaGanancias = np.concatenate([ganancias[:, :n].mean(axis=1, keepdims=True),
+                                         suavizado_exponencial(ganancias[:, n:], 1 / n, ganancias[:, :n].mean(axis=1))], axis=1)
+        mediaPerdidas = np.concatenate([perdidas[:, :n].mean(axis=1, keepdims=True),
+                                        suavizado_exponencial(perdidas[:, n:], 1 / n, perdidas[:, :n].mean(axis=1))], axis=1)
+    else:
+        mediaGanancias = medias_ventana(ganancias, n)
+        mediaPerdidas = medias_ventana(perdidas, n)
+
+    #Calculamos los RS (Relative Strength) y a partir de ellos los RSI. Si no hay pérdidas en una ventana el RSI es 100
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = mediaGanancias / mediaPerdidas
+    return 100 - 100 / (1 + rs)
+
+#Cálculo del MACD, como la diferencia entre las medias móviles exponenciales rápida y lenta, junto con su línea de señal (media móvil exponencial del MACD)
+#y el histograma (diferencia entre ambas). Devuelve las tres matrices, de las mismas dimensiones que la de precios
+def get_macd(precios, rapida=12, lenta=26, senal=9):
+    precios = np.atleast_2d(precios)
+    if not comprobar_ventana(lenta, precios.shape[1]):
+        return np.array([])
+    if rapida <= 0 or rapida >= lenta or senal <= 0:
+        print("La ventana rápida debe ser positiva y menor que la lenta, y la de la señal positiva")
+        return np.array([])
+    macd = get_ema(precios, rapida) - get_ema(precios, lenta)
+    lineaSenal = suavizado_exponencial(macd, 2 / (senal + 1), macd[:, 0])
+    return macd, lineaSenal, macd - lineaSenal
+
+#Cálculo de las bandas de Bollinger de n días: la media móvil simple y las bandas superior e inferior, a k desviaciones típicas de ella. Devuelve las tres
+#matrices, de dimensiones (activos, días - n + 1)
+def get_bollinger(precios, n=20, k=2):
+    precios = np.atleast_2d(precios)
+    if not comprobar_ventana(n, precios.shape[1]):
+        return np.array([])
+    #Centramos cada serie en su media antes de acumular los cuadrados, para no perder precisión en la resta de sumas acumuladas
+    centrados = precios - precios.mean(axis=1, keepdims=True)
+    medias = medias_ventana(centrados, n)
+    varianzas = np.maximum(medias_ventana(centrados**2, n) - medias**2, 0)
+    desviaciones = np.sqrt(varianzas)
+    media = medias + precios.mean(axis=1, keepdims=True)
+    return media, media + k * desviaciones, media - k * desviaciones
+
+#Cálculo del ATR (Average True Range) de n días, con el suavizado de Wilder. El rango verdadero de cada día es el máximo entre el rango del día y las
+#distancias del máximo y del mínimo al cierre anterior. Devuelve una matriz de dimensiones (activos, días - n), ya que el primer ATR corresponde al día n + 1
+def get_atr(maximos, minimos, cierres, n=14):
+    maximos, minimos, cierres = np.atleast_2d(maximos), np.atleast_2d(minimos), np.atleast_2d(cierres)
+    if not comprobar_ventana(n, cierres.shape[1] - 1):
+        return np.array([])
+    cierresAnteriores = cierres[:, :-1]
+    rangos = np.maximum.reduce([maximos[:, 1:] - minimos[:, 1:], np.abs(maximos[:, 1:] - cierresAnteriores), np.abs(minimos[:, 1:] - cierresAnteriores)])
+    inicial = rangos[:, :n].mean(axis=1)
+    return np.concatenate([inicial[:, np.newaxis], suavizado_exponencial(rangos[:, n:], 1 / n, inicial)], axis=1)
+
+#Diccionario con los indicadores disponibles, y los precios que necesita cada uno de ellos
+indicadores = {"sma": (get_sma, ["close"]),
+               "ema": (get_ema, ["close"]),
+               "rsi": (get_rsi, ["close"]),
+               "macd": (get_macd, ["close"]),
+               "bollinger": (get_bollinger, ["close"]),
+               "atr": (get_atr, ["high", "low", "close"])}
+
+#Función que calcula un indicador por su nombre
+#Precios: Diccionario con las matrices de precios (close, high, low) necesarias para el indicador
+#Parametros: Parámetros del indicador (por ejemplo n)
+def get_indicador(nombre, precios, **parametros):
+    if not (nombre in indicadores):
+        print("El indicador debe ser uno de los siguientes: " + ", ".join(indicadores))
+        return np.array([])
+    funcion, preciosNecesarios = indicadores[nombre]
+    return funcion(*[precios[tipo] for tipo in preciosNecesarios], **parametros)
+
+#Función que devuelve la clave con la que se guarda un indicador en la caché de una serie o de una cartera
+def get_clave_indicador(nombre, parametros):
+    return (nombre, tuple(sorted(parametros.items())))
@@ -0,0 +1,43 @@
+import threading
+import time
+from dataclasses import dataclass
+
+@dataclass
+class LimitadorPeticiones:
+    #Esta clase implementa un limitador de peticiones de tipo cubeta de fichas (token bucket), que puede compartirse entre varios hilos. Cada petición consume
+    #una ficha, y las fichas se van reponiendo a un ritmo constante hasta llenar la cubeta. Si no quedan fichas, la petición espera a que se reponga una
+    #Los atributos van a ser:
+    #Capacidad: Número máximo de fichas, es decir, de peticiones que pueden hacerse seguidas sin esperar
+    #Tasa: Número de fichas que se reponen por segundo
+    #Fichas: Número de fichas disponibles actualmente
+    #UltimaRecarga: Instante (time.monotonic) en que se actualizó por última vez el número de fichas
+    #Cerrojo: Cerrojo que protege el acceso concurrente a las fichas
+
+    capacidad: float
+    tasa: float
+    fichas: float
+    ultimaRecarga: float
+    cerrojo: threading.Lock
+
+    #PeticionesPorMinuto: Número de peticiones por minuto permitidas
+    #Capacidad: Número máximo de peticiones seguidas. Si no se pasa, es igual al número de peticiones por minuto
+    def __init__(self, peticionesPorMinuto, capacidad=None):
+        self.capacidad = capacidad if capacidad else peticionesPorMinuto
+        self.tasa = peticionesPorMinuto / 60
+        self.fichas = self.capacidad
+        self.ultimaRecarga = time.monotonic()
+        self.cerrojo = threading.Lock()
+
+    #Bloquea al hilo que lo llama hasta que haya una ficha disponible, y la consume. Devuelve el tiempo que se ha esperado en segundos
+    def esperar(self):
+        inicio = time.monotonic()
+        while True:
+            with self.cerrojo:
+                ahora = time.monotonic()
+                self.fichas = min(self.capacidad, self.fichas + (ahora - self.ultimaRecarga) * self.tasa)
+                self.ultimaRecarga = ahora
+                if self.fichas >= 1:
+                    self.fichas -= 1
+                    return ahora - inicio
+                espera = (1 - self.fichas) / self.tasa
+            time.sleep(espera)
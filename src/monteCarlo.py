@@ -1,10 +1,19 @@
 import argparse
 import sys
-import json
-from data_utils import exists_route, normalizar_texto, load_json
-from cartera import Cartera
+from data_utils import exists_route, normalizar_texto
+from cartera import cargar_cartera
+from graficas import configurar_graficas, formatosGraficas
+from simulacion import TAMANIO_BLOQUE, LONGITUD_BLOQUE, modelosSimulacion, precisionesSimulacion, muestreosSimulacion
+from convergencia import REPLICAS_CONVERGENCIA
+from riesgo import NIVELES_CONFIANZA
+from formatos import formatosSalida, formato_disponible
+from perfil import etapa, iniciar_perfil, guardar_perfil
 
-if __name__ == "__main__":
+#Función principal del programa, que recibe los mismos argumentos que la línea de comandos. Se separa del bloque principal para que servidor.py pueda
+#ejecutarla sin arrancar un intérprete nuevo
+#Argumentos: Lista de argumentos a interpretar, o None para tomar los de la línea de comandos
+#CargarCartera: Función con la que se recupera la cartera a partir de su nombre (servidor.py usa una que las mantiene en memoria)
+def main(argumentos=None, cargarCartera=cargar_cartera):
     parser = argparse.ArgumentParser()
     parser.add_argument('--rutaCSV', type=str, required=True, help='Ruta de almacenamiento de los CSVs')
     parser.add_argument('--medias', nargs='+', type=float, required=False, help='Medias de cada una de las series que se quiere imponer')
@@ -14,16 +23,64 @@ if __name__ == "__main__":
     parser.add_argument('--valorInicial', type=float, required=True, help='Valor inicial del valor/cartera')
     parser.add_argument('--carteraCompleta', type=str, required=True, help='Indicar si se quiere simular la cartera en su conjunto o componente a componente')
     parser.add_argument('--nombreCartera', type=str, required=True, help='Nombre que le queremos asignar a la cartera')
-    args = parser.parse_args()
+    parser.add_argument('--tamanioBloque', type=int, required=False, default=TAMANIO_BLOQUE, help='Número máximo de simulaciones que se generan a la vez')
+    parser.add_argument('--streaming', type=str, required=False, default="No", help='Indicar si se quieren guardar solo los estadísticos por día de las simulaciones')
+    parser.add_argument('--percentiles', nargs='+', type=float, required=False, default=[5, 50, 95], help='Percentiles por día a calcular en modo streaming')
+    parser.add_argument('--semilla', type=int, required=False, help='Semilla para poder reproducir las simulaciones')
+    parser.add_argument('--workers', type=int, required=False, default=1, help='Número de procesos entre los que repartir las simulaciones')
+    parser.add_argument('--numMuestras', type=int, required=False, default=0, help='Número de simulaciones completas a guardar en modo streaming')
+    parser.add_argument('--graficas', type=str, required=False, default="pantalla", help='Formato de las gráficas (pantalla, png, svg o none)')
+    parser.add_argument('--rutaGraficas', type=str, required=False, default=".", help='Ruta de almacenamiento de las gráficas exportadas')
+    parser.add_argument('--nivelesConfianza', nargs='+', type=float, required=False, default=list(NIVELES_CONFIANZA),
+                        help='Niveles de confianza (en porcentaje) del VaR y el CVaR')
+    parser.add_argument('--informe', type=str, required=False, default="No", help='Generar informe de la cartera en formato markdown con las métricas de riesgo')
+    parser.add_argument('--modelo', type=str, required=False, default="normal",
+                        help='Modelo de generación de los retornos (normal, bootstrap de los retornos históricos o bloques de retornos históricos consecutivos)')
+    parser.add_argument('--longitudBloque', type=float, required=False, default=LONGITUD_BLOQUE,
+                        help='Longitud media en días de los bloques de retornos históricos del modelo bloques')
+    parser.add_argument('--precision', type=str, required=False, default="float64",
+                        help='Precisión de los valores simulados (float64 o float32, que ocupa la mitad de memoria)')
+    parser.add_argument('--muestreo', type=str, required=False, default="aleatorio",
+                        help='Muestreo de las normales del modelo normal (aleatorio, antitetico o sobol), para reducir el error de las estimaciones')
+    parser.add_argument('--variableControl', type=str, required=False, default="No",
+                        help='Estimar también las métricas de riesgo usando el valor final como variable de control (Sí o No, solo con el modelo normal)')
+    parser.add_argument('--convergencia', type=str, required=False, default="No",
+                        help='Generar el informe de convergencia del error típico de cada técnica frente al número de simulaciones (Sí o No)')
+    parser.add_argument('--replicasConvergencia', type=int, required=False, default=REPLICAS_CONVERGENCIA,
+                        help='Número de réplicas de cada técnica y número de simulaciones del informe de convergencia')
+    parser.add_argument('--errorObjetivo', type=float, required=False,
+                        help='Error típico relativo objetivo, para estimar las simulaciones que necesita cada técnica en el informe de convergencia')
+    parser.add_argument('--simulacionesActivos', type=str, required=False, default="No",
+                        help='Guardar también los valores de cada activo dentro de las simulaciones de la cartera completa (Sí o No)')
+    parser.add_argument('--formato', type=str, required=False, default="csv", help='Formato de los archivos generados (csv, parquet o npy)')
+    parser.add_argument('--perfil', type=str, required=False, default="No", help='Medir el tiempo y la memoria de cada etapa (Sí o No)')
+    parser.add_argument('--rutaPerfil', type=str, required=False, default=".", help='Ruta donde guardar el perfil y la traza de la ejecución')
+    parser.add_argument('--memoriaPerfil', type=str, required=False, default="Sí", help='Medir también el pico de memoria de cada etapa (Sí o No)')
+    args = parser.parse_args(argumentos)
+
+    #Las respuestas posibles al parámetro perfil son si o no, y la carpeta donde guardarlo debe existir. Se comprueba antes que el resto para que el perfil
+    #abarque toda la ejecución
+    perfilNormalizado = normalizar_texto(args.perfil)
+    if perfilNormalizado != "si" and perfilNormalizado != "no":
+        print("La respuesta a si quiere medir las etapas de la ejecución debe ser Sí o No")
+        sys.exit(1)
+    if perfilNormalizado == "si" and not exists_route(args.rutaPerfil):
+        print("La ruta del perfil introducida no existe")
+        sys.exit(1)
+    memoriaPerfilNormalizada = normalizar_texto(args.memoriaPerfil)
+    if memoriaPerfilNormalizada != "si" and memoriaPerfilNormalizada != "no":
+        print("La respuesta a si quiere medir la memoria de las etapas debe ser Sí o No")
+        sys.exit(1)
+    if perfilNormalizado == "si":
+        iniciar_perfil("monteCarlo", memoriaPerfilNormalizada == "si")
 
-    #Recuperamos una instancia de la clase Cartera creada anteriormente desde un json, usando el nombre de la cartera pasado por el usuario
-    json_str = load_json(args.nombreCartera + ".json")
-    if json_str == None:
+    #Recuperamos una instancia de la clase Cartera creada anteriormente, usando el nombre de la cartera pasado por el usuario
+    with etapa("carga_cartera", args.nombreCartera):
+        cartera = cargarCartera(args.nombreCartera)
+    if cartera == None:
         print("Ha habido un error al cargar la cartera solicitada")
         sys.exit(1)
 
-    data = json.loads(json_str)
-    cartera = Cartera.from_dict(data)
     numActivos = cartera.obtenerNumActivos()
 
     #Si el usuario no pasa medias como parámetro, lo que haremos será cojer las medias de los retornos de cada una de las series temporales, que son estimadores
@@ -51,11 +108,135 @@ if __name__ == "__main__":
     carteraCompletadaBool = False
     if carteraCompletaNormalizada == "si":
         carteraCompletadaBool = True
+
+    #El tamaño de bloque debe ser positivo
+    if args.tamanioBloque <= 0:
+        print("El tamaño de bloque debe ser positivo")
+        sys.exit(1)
+
+    #La respuesta a si se quiere el modo streaming debe ser si o no
+    streamingNormalizado = normalizar_texto(args.streaming)
+    if streamingNormalizado != "si" and streamingNormalizado != "no":
+        print("La respuesta a si se quiere el modo streaming debe ser Sí o No")
+        sys.exit(1)
+
+    #Los percentiles deben estar entre 0 y 100
+    if any(p < 0 or p > 100 for p in args.percentiles):
+        print("Los percentiles deben estar entre 0 y 100")
+        sys.exit(1)
+
+    #El número de procesos debe ser positivo
+    if args.workers <= 0:
+        print("El número de procesos debe ser positivo")
+        sys.exit(1)
+
+    #El número de muestras no puede ser negativo
+    if args.numMuestras < 0:
+        print("El número de simulaciones a guardar no puede ser negativo")
+        sys.exit(1)
+
+    #Los niveles de confianza deben estar estrictamente entre 0 y 100
+    if any(c <= 0 or c >= 100 for c in args.nivelesConfianza):
+        print("Los niveles de confianza deben estar entre 0 y 100")
+        sys.exit(1)
+
+    #El modelo debe ser uno de los disponibles. Con los modelos históricos no se usan las medias ni las desviaciones típicas
+    modelo = args.modelo.lower()
+    if not (modelo in modelosSimulacion):
+        print("El modelo de simulación debe ser normal, bootstrap o bloques")
+        sys.exit(1)
+
+    #La longitud media de los bloques debe ser al menos de un día
+    if args.longitudBloque < 1:
+        print("La longitud media de los bloques debe ser al menos 1")
+        sys.exit(1)
+
+    #La precisión debe ser una de las disponibles
+    precision = args.precision.lower()
+    if not (precision in precisionesSimulacion):
+        print("La precisión de las simulaciones debe ser float64 o float32")
+        sys.exit(1)
+
+    #El muestreo debe ser uno de los disponibles
+    muestreo = args.muestreo.lower()
+    if not (muestreo in muestreosSimulacion):
+        print("El muestreo de las simulaciones debe ser aleatorio, antitetico o sobol")
+        sys.exit(1)
+
+    #Las respuestas a si se quiere usar la variable de control y generar el informe de convergencia deben ser si o no
+    variableControlNormalizada = normalizar_texto(args.variableControl)
+    if variableControlNormalizada != "si" and variableControlNormalizada != "no":
+        print("La respuesta a si quiere usar la variable de control debe ser Sí o No")
+        sys.exit(1)
+    convergenciaNormalizada = normalizar_texto(args.convergencia)
+    if convergenciaNormalizada != "si" and convergenciaNormalizada != "no":
+        print("La respuesta a si quiere generar el informe de convergencia debe ser Sí o No")
+        sys.exit(1)
+
+    #Los muestreos alternativos, la variable de control y el informe de convergencia solo pueden usarse con el modelo normal
+    if modelo != "normal" and (muestreo != "aleatorio" or variableControlNormalizada == "si" or convergenciaNormalizada == "si"):
+        print("Los muestreos antitetico y sobol, la variable de control y el informe de convergencia solo pueden usarse con el modelo normal")
+        sys.exit(1)
+
+    #El informe de convergencia necesita al menos 2 réplicas, y el error objetivo debe ser positivo
+    if args.replicasConvergencia < 2:
+        print("El informe de convergencia necesita al menos 2 réplicas")
+        sys.exit(1)
+    if args.errorObjetivo is not None and args.errorObjetivo <= 0:
+        print("El error objetivo debe ser positivo")
+        sys.exit(1)
+
+    #La respuesta a si se quieren guardar los valores de cada activo dentro de la cartera debe ser si o no, y solo tiene sentido al simular la cartera completa
+    simulacionesActivosNormalizado = normalizar_texto(args.simulacionesActivos)
+    if simulacionesActivosNormalizado != "si" and simulacionesActivosNormalizado != "no":
+        print("La respuesta a si quiere guardar los valores de cada activo dentro de la cartera debe ser Sí o No")
+        sys.exit(1)
+    if simulacionesActivosNormalizado == "si" and not carteraCompletadaBool:
+        print("Los valores de cada activo dentro de la cartera solo pueden guardarse al simular la cartera completa")
+        sys.exit(1)
+
+    #La respuesta a si se quiere generar el informe debe ser si o no
+    informeNormalizado = normalizar_texto(args.informe)
+    if informeNormalizado != "si" and informeNormalizado != "no":
+        print("La respuesta a si quiere generar un informe acerca de la cartera debe ser Sí o No")
+        sys.exit(1)
+
+    #El formato de los archivos debe ser uno de los disponibles, y sus librerías deben estar instaladas
+    formato = args.formato.lower()
+    if not (formato in formatosSalida):
+        print("El formato de los archivos debe ser csv, parquet o npy")
+        sys.exit(1)
+    if not formato_disponible(formato):
+        print("Para usar el formato " + formato + " debe instalarse pyarrow")
+        sys.exit(1)
+
+    #El formato de las gráficas debe ser uno de los disponibles, y si se exportan a archivos, la carpeta donde se guarden debe existir
+    formatoGraficas = args.graficas.lower()
+    if not (formatoGraficas in formatosGraficas):
+        print("El formato de las gráficas debe ser pantalla, png, svg o none")
+        sys.exit(1)
+    if formatoGraficas in ["png", "svg"] and not exists_route(args.rutaGraficas):
+        print("La ruta de las gráficas introducida no existe")
+        sys.exit(1)
+    configurar_graficas(formatoGraficas, args.rutaGraficas)
     
 
     #Realizamos la simulación de acuerdo a lo indicado por el usuario
-    cartera.simulacionMonteCarlo(medias, desviacionesTipicas, args.numSimulaciones, args.numDias, args.valorInicial, carteraCompletadaBool, args.rutaCSV)
+    cartera.simulacionMonteCarlo(medias, desviacionesTipicas, args.numSimulaciones, args.numDias, args.valorInicial, carteraCompletadaBool, args.rutaCSV,
+                                 args.tamanioBloque, streamingNormalizado == "si", args.percentiles, args.numMuestras,
+                                 args.semilla, args.workers, args.nivelesConfianza, modelo, args.longitudBloque, formato, precision, muestreo,
+                                 variableControlNormalizada == "si", simulacionesActivosNormalizado == "si")
 
+    #El informe de convergencia se hace siempre sobre la cartera completa
+    if convergenciaNormalizada == "si":
+        cartera.informeConvergencia(medias, desviacionesTipicas, args.numSimulaciones, args.numDias, args.valorInicial, args.rutaCSV,
+                                    args.replicasConvergencia, args.errorObjetivo, args.tamanioBloque, args.semilla, args.workers, precision, formato)
 
+    #El informe incluye, además de la información de la cartera, las métricas de riesgo de las simulaciones que se acaban de realizar
+    if informeNormalizado == "si":
+        cartera.report()
 
+    guardar_perfil(args.rutaPerfil)
 
+if __name__ == "__main__":
+    main()
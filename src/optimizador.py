@@ -0,0 +1,282 @@
+import argparse
+import sys
+import numpy as np
+import pandas as pd
+from scipy.linalg import solve_triangular
+from data_utils import exists_route, save_csv
+from cartera import cargar_cartera
+from graficas import configurar_graficas, formatosGraficas, grafica_frontera_eficiente
+from simulacion import get_secuencia_semillas, get_semillas_bloques
+
+#Número de carteras aleatorias que se evalúan por defecto para la nube de la frontera eficiente
+NUM_CARTERAS = 1000000
+#Número máximo de elementos (carteras x activos) de cada bloque de pesos aleatorios. Con 8 millones de float32, cada bloque ocupa unos 32 MB
+ELEMENTOS_BLOQUE = 8000000
+#Número máximo de problemas de la frontera que se resuelven a la vez. Cada problema necesita una matriz de activos x activos por iteración
+PROBLEMAS_LOTE = 16
+
+#Función para obtener la matriz de covarianzas a partir de la matriz de correlación y las desviaciones típicas de los activos
+def get_matriz_covarianzas(matrizCorrelacion, desviaciones_tipicas):
+    desviaciones = np.asarray(desviaciones_tipicas, dtype=float)
+    return np.asarray(matrizCorrelacion, dtype=float) * np.outer(desviaciones, desviaciones)
+
+#Función que calcula el rendimiento y la volatilidad esperados de un conjunto de carteras con un único producto de matrices, sin recorrerlas una a una
+#Pesos: Matriz de pesos de dimensiones (carteras, activos)
+#Devuelve dos vectores con el rendimiento y la volatilidad de cada cartera
+def get_rendimientos_volatilidades(pesos, medias, matrizCovarianzas):
+    pesos = np.atleast_2d(pesos)
+    rendimientos = pesos @ medias
+    varianzas = np.einsum('ij,ij->i', pesos @ matrizCovarianzas, pesos)
+    return rendimientos, np.sqrt(np.maximum(varianzas, 0))
+
+#Función que resuelve a la vez varios problemas de programación cuadrática de la forma: minimizar x'Qx sujeto a Ax = b, x >= 0, que comparten la matriz Q,
+#mediante un método de punto interior primal-dual (predictor-corrector de Mehrotra). Todas las operaciones se hacen sobre los lotes completos de problemas
+#Q: Matriz (activos, activos) semidefinida positiva
+#A: Restricciones de igualdad de cada problema, de dimensiones (problemas, restricciones, activos)
+#B: Términos independientes de cada problema, de dimensiones (problemas, restricciones)
+#Devuelve la matriz de soluciones de dimensiones (problemas, activos) y un vector indicando qué problemas han convergido
+def resolver_qp_lotes(Q, A, b, maxIteraciones=100, tolerancia=1e-10):
+    numProblemas, numRestricciones, numActivos = A.shape
+    #Escalamos el objetivo y cada restricción, lo que no cambia las soluciones pero mejora el condicionamiento
+    Q = Q / np.mean(np.diag(Q))
+    normas = np.linalg.norm(A, axis=2)
+    A = A / normas[:, :, np.newaxis]
+    b = b / normas
+    At = np.swapaxes(A, 1, 2)
+
+    x = np.full((numProblemas, numActivos), 1 / numActivos)
+    z = np.ones((numProblemas, numActivos))
+    lam = np.zeros((numProblemas, numRestricciones))
+    convergidos = np.zeros(numProblemas, dtype=bool)
+
+    #Devuelve la longitud máxima de paso (hasta 1) que mantiene positivos todos los elementos de v, para cada problema
+    def paso_maximo(v, dv):
+        with np.errstate(divide="ignore"):
+            cocientes = np.where(dv < 0, -v / dv, np.inf)
+        return np.minimum(1, cocientes.min(axis=1))
+
+    for _ in range(maxIteraciones):
+        residuoDual = x @ Q - (At @ lam[:, :, np.newaxis])[:, :, 0] - z
+        residuoPrimal = (A @ x[:, :, np.newaxis])[:, :, 0] - b
+        mu = np.sum(x * z, axis=1) / numActivos
+        convergidos = (np.abs(residuoPrimal).max(axis=1) < tolerancia) & (np.abs(residuoDual).max(axis=1) < tolerancia) & (mu < tolerancia)
+        if convergidos.all():
+            break
+
+        #El sistema de Newton se reduce a (Q + Z/X) dx - A' dlam = r, A dx = -residuoPrimal. Factorizamos una sola vez (Cholesky) la matriz de cada problema,
+        #y la usamos tanto para el paso predictor como para el corrector
+        factores = np.linalg.cholesky(Q + (z / x)[:, np.newaxis, :] * np.eye(numActivos))
+
+        #Resuelve (Q + Z/X) v = R para cada problema, con dos sistemas triangulares
+        def resolver(R):
+            return solve_triangular(factores, solve_triangular(factores, R, lower=True), lower=True, trans='T')
+
+        inversasAt = resolver(At)
+        sistemas = A @ inversasAt
+
+        #Calcula la dirección de Newton para un término de complementariedad dado
+        def direccion(complementariedad):
+            r = -residuoDual + complementariedad / x
+            u = resolver(r[:, :, np.newaxis])[:, :, 0]
+            dlam = np.linalg.solve(sistemas, (-residuoPrimal - (A @ u[:, :, np.newaxis])[:, :, 0])[:, :, np.newaxis])[:, :, 0]
+            dx = u + (inversasAt @ dlam[:, :, np.newaxis])[:, :, 0]
+            dz = (complementariedad - z * dx) / x
+            return dx, dlam, dz
+
+        #Paso predictor (afín), que nos da una estimación de cuánto se puede reducir mu y con ello el parámetro de centrado
+        dxAfin, _, dzAfin = direccion(-x * z)
+        pasoAfin = np.minimum(paso_maximo(x, dxAfin), paso_maximo(z, dzAfin))[:, np.newaxis]
+        muAfin = np.sum((x + pasoAfin * dxAfin) * (z + pasoAfin * dzAfin), axis=1) / numActivos
+        sigma = ((muAfin / mu) ** 3)[:, np.newaxis]
+
+        #Paso corrector, con el término de segundo orden del predictor
+        dx, dlam, dz = direccion(sigma * mu[:, np.newaxis] - x * z - dxAfin * dzAfin)
+        paso = (0.99 * np.minimum(paso_maximo(x, dx), paso_maximo(z, dz)))[:, np.newaxis]
+        #Los problemas que ya han convergido no se mueven
+        paso[convergidos] = 0
+        x = x + paso * dx
+        lam = lam + paso * dlam
+        z = z + paso * dz
+
+    return x, convergidos
+
+#Función que resuelve por lotes de PROBLEMAS_LOTE un conjunto de problemas de programación cuadrática (ver resolver_qp_lotes)
+def resolver_qp(Q, A, b):
+    soluciones = []
+    convergidos = []
+    for inicio in range(0, A.shape[0], PROBLEMAS_LOTE):
+        solucionesLote, convergidosLote = resolver_qp_lotes(Q, A[inicio:inicio+PROBLEMAS_LOTE], b[inicio:inicio+PROBLEMAS_LOTE])
+        soluciones.append(solucionesLote)
+        convergidos.append(convergidosLote)
+    convergidos = np.concatenate(convergidos)
+    if not convergidos.all():
+        print("Alguno de los problemas de optimización no ha convergido, su solución es aproximada")
+    return np.concatenate(soluciones)
+
+#Función que limpia los pesos obtenidos por el método de punto interior, que nunca llegan a ser exactamente 0, y los normaliza para que sumen 1
+def limpiar_pesos(pesos, umbral=1e-9):
+    pesos = np.where(pesos < umbral, 0, pesos)
+    return pesos / pesos.sum(axis=-1, keepdims=True)
+
+#Cálculo de los pesos (sin posiciones cortas) de la cartera de mínima varianza
+def get_minima_varianza(matrizCovarianzas):
+    numActivos = matrizCovarianzas.shape[0]
+    return limpiar_pesos(resolver_qp(matrizCovarianzas, np.ones((1, 1, numActivos)), np.ones((1, 1)))[0])
+
+#Cálculo de los pesos (sin posiciones cortas) de la cartera de máximo ratio de Sharpe. Maximizar el ratio de Sharpe no es un problema convexo, pero
+#equivale a minimizar y'Σy sujeto a (medias - tasaLibreRiesgo)'y = 1, y >= 0, y normalizar después y para que sume 1
+#Devuelve None si ningún activo tiene un rendimiento esperado mayor que la tasa libre de riesgo
+def get_maximo_sharpe(medias, matrizCovarianzas, tasaLibreRiesgo=0):
+    excesos = np.asarray(medias, dtype=float) - tasaLibreRiesgo
+    if excesos.max() <= 0:
+        print("Ningún activo tiene un rendimiento esperado mayor que la tasa libre de riesgo, no existe la cartera de máximo Sharpe")
+        return None
+    return limpiar_pesos(resolver_qp(matrizCovarianzas, excesos[np.newaxis, np.newaxis, :], np.ones((1, 1)))[0])
+
+#Cálculo de la frontera eficiente (sin posiciones cortas): para cada rendimiento objetivo, entre el de la cartera de mínima varianza y el del activo de mayor
+#rendimiento, los pesos de la cartera de mínima varianza con ese rendimiento. Todos los puntos se resuelven a la vez, por lotes
+#NumPuntos: Número de puntos de la frontera
+#Devuelve la matriz de pesos de dimensiones (puntos, activos)
+def get_frontera_eficiente(medias, matrizCovarianzas, numPuntos, pesosMinimaVarianza):
+    medias = np.asarray(medias, dtype=float)
+    numActivos = medias.shape[0]
+    objetivos = np.linspace(pesosMinimaVarianza @ medias, medias.max(), numPuntos)
+    A = np.broadcast_to(np.vstack([np.ones(numActivos), medias]), (numPuntos, 2, numActivos))
+    b = np.column_stack([np.ones(numPuntos), objetivos])
+    return limpiar_pesos(resolver_qp(matrizCovarianzas, A, b))
+
+#Función que genera pesos aleatorios (sin posiciones cortas) distribuidos uniformemente sobre el conjunto de carteras posibles (distribución de Dirichlet
+#plana), normalizando variables exponenciales
+#Tipo: Tipo de numpy de los pesos generados
+def get_pesos_aleatorios(numCarteras, numActivos, generador, tipo=np.float64):
+    pesos = generador.standard_exponential((numCarteras, numActivos), dtype=tipo)
+    pesos /= pesos.sum(axis=1, keepdims=True)
+    return pesos
+
+#Función que evalúa por bloques el rendimiento y la volatilidad de un gran número de carteras aleatorias, con un producto de matrices por bloque. Cada bloque
+#tiene su propia semilla, de forma que los resultados no dependen del tamaño de los bloques sino solo de la semilla
+#Como la nube solo sirve para visualizar la frontera, se trabaja en float32, lo que reduce a la mitad la memoria y el tiempo de los productos de matrices
+#Devuelve los vectores de rendimientos y volatilidades, y los pesos de la cartera aleatoria de mayor ratio de Sharpe
+def get_nube_carteras(medias, matrizCovarianzas, numCarteras, tasaLibreRiesgo=0, semilla=None):
+    numActivos = len(medias)
+    medias = np.asarray(medias, dtype=np.float32)
+    matrizCovarianzas = np.asarray(matrizCovarianzas, dtype=np.float32)
+    tamanioBloque = max(1, ELEMENTOS_BLOQUE // numActivos)
+    rendimientos = np.empty(numCarteras)
+    volatilidades = np.empty(numCarteras)
+    mejoresPesos = None
+    mejorSharpe = -np.inf
+
+    for i, semillaBloque in enumerate(get_semillas_bloques(get_secuencia_semillas(semilla), numCarteras, tamanioBloque)):
+        tramo = slice(i * tamanioBloque, min((i + 1) * tamanioBloque, numCarteras))
+        pesos = get_pesos_aleatorios(tramo.stop - tramo.start, numActivos, np.random.default_rng(semillaBloque), np.float32)
+        rendimientos[tramo], volatilidades[tramo] = get_rendimientos_volatilidades(pesos, medias, matrizCovarianzas)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            sharpes = (rendimientos[tramo] - tasaLibreRiesgo) / volatilidades[tramo]
+        mejor = np.nanargmax(sharpes)
+        if sharpes[mejor] > mejorSharpe:
+            mejorSharpe = sharpes[mejor]
+            mejoresPesos = pesos[mejor].astype(float)
+
+    return rendimientos, volatilidades, mejoresPesos
+
+#Función que construye un dataframe con los pesos de un conjunto de carteras, junto con su rendimiento, volatilidad y ratio de Sharpe esperados
+#Pesos: Matriz de pesos de dimensiones (carteras, activos)
+#Nombres: Nombres de las carteras (filas del dataframe)
+def get_dataframe_pesos(pesos, nombres, nombresActivos, medias, matrizCovarianzas, tasaLibreRiesgo=0):
+    rendimientos, volatilidades = get_rendimientos_volatilidades(pesos, medias, matrizCovarianzas)
+    dataframe = pd.DataFrame(np.atleast_2d(pesos), index=nombres, columns=nombresActivos)
+    dataframe["Rendimiento"] = rendimientos
+    dataframe["Volatilidad"] = volatilidades
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dataframe["Sharpe"] = (rendimientos - tasaLibreRiesgo) / volatilidades
+    return dataframe
+
+#Función principal del programa, que recibe los mismos argumentos que la línea de comandos. Se separa del bloque principal para que servidor.py pueda
+#ejecutarla sin arrancar un intérprete nuevo
+#Argumentos: Lista de argumentos a interpretar, o None para tomar los de la línea de comandos
+#CargarCartera: Función con la que se recupera la cartera a partir de su nombre (servidor.py usa una que las mantiene en memoria)
+def main(argumentos=None, cargarCartera=cargar_cartera):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rutaCSV', type=str, required=True, help='Ruta de almacenamiento de los CSVs con los pesos')
+    parser.add_argument('--nombreCartera', type=str, required=True, help='Nombre de la cartera a optimizar')
+    parser.add_argument('--numCarteras', type=int, required=False, default=NUM_CARTERAS, help='Número de carteras aleatorias a evaluar')
+    parser.add_argument('--numPuntos', type=int, required=False, default=50, help='Número de puntos de la frontera eficiente')
+    parser.add_argument('--tasaLibreRiesgo', type=float, required=False, default=0, help='Rendimiento diario del activo libre de riesgo')
+    parser.add_argument('--semilla', type=int, required=False, help='Semilla para poder reproducir las carteras aleatorias')
+    parser.add_argument('--graficas', type=str, required=False, default="pantalla", help='Formato de las gráficas (pantalla, png, svg o none)')
+    parser.add_argument('--rutaGraficas', type=str, required=False, default=".", help='Ruta de almacenamiento de las gráficas exportadas')
+    args = parser.parse_args(argumentos)
+
+    #La carpeta donde se quieran almacenar los CSVs debe existir
+    if not exists_route(args.rutaCSV):
+        print("La ruta de los CSV introducida no existe")
+        sys.exit(1)
+
+    #El número de carteras aleatorias no puede ser negativo, y la frontera debe tener al menos dos puntos
+    if args.numCarteras < 0:
+        print("El número de carteras aleatorias no puede ser negativo")
+        sys.exit(1)
+    if args.numPuntos < 2:
+        print("La frontera eficiente debe tener al menos dos puntos")
+        sys.exit(1)
+
+    #El formato de las gráficas debe ser uno de los disponibles, y si se exportan a archivos, la carpeta donde se guarden debe existir
+    formatoGraficas = args.graficas.lower()
+    if not (formatoGraficas in formatosGraficas):
+        print("El formato de las gráficas debe ser pantalla, png, svg o none")
+        sys.exit(1)
+    if formatoGraficas in ["png", "svg"] and not exists_route(args.rutaGraficas):
+        print("La ruta de las gráficas introducida no existe")
+        sys.exit(1)
+    configurar_graficas(formatoGraficas, args.rutaGraficas)
+
+    #Recuperamos una instancia de la clase Cartera creada anteriormente, usando el nombre de la cartera pasado por el usuario
+    cartera = cargarCartera(args.nombreCartera)
+    if cartera == None:
+        print("Ha habido un error al cargar la cartera solicitada")
+        sys.exit(1)
+
+    #Igual que en monteCarlo.py, usamos las medias y las cuasidesviaciones típicas de los retornos de cada activo, junto con su matriz de correlación
+    activos = cartera.obtenerActivos()
+    nombresActivos = [activo.obtenerNombreActivo() for activo in activos]
+    medias = np.array([activo.obtenerMedia() for activo in activos])
+    desviacionesTipicas = np.array([activo.obtenerCuasiDesviacionTipica() for activo in activos])
+    matrizCovarianzas = get_matriz_covarianzas(cartera.matrizCorrelacion, desviacionesTipicas)
+
+    pesosMinimaVarianza = get_minima_varianza(matrizCovarianzas)
+    pesosMaximoSharpe = get_maximo_sharpe(medias, matrizCovarianzas, args.tasaLibreRiesgo)
+    pesosFrontera = get_frontera_eficiente(medias, matrizCovarianzas, args.numPuntos, pesosMinimaVarianza)
+
+    #Guardamos los pesos de las carteras óptimas, junto con los de la cartera actual para poder compararlos
+    pesosOptimos = [cartera.obtenerPesos(), pesosMinimaVarianza]
+    nombresOptimos = ["Actual", "Mínima varianza"]
+    if pesosMaximoSharpe is not None:
+        pesosOptimos.append(pesosMaximoSharpe)
+        nombresOptimos.append("Máximo Sharpe")
+    save_csv(get_dataframe_pesos(np.vstack(pesosOptimos), nombresOptimos, nombresActivos, medias, matrizCovarianzas, args.tasaLibreRiesgo),
+             args.rutaCSV + "\\" + cartera.obtenerNombreCartera() + "_optimos.csv", True)
+    save_csv(get_dataframe_pesos(pesosFrontera, ["Punto " + str(i+1) for i in range(args.numPuntos)], nombresActivos, medias, matrizCovarianzas,
+                                 args.tasaLibreRiesgo),
+             args.rutaCSV + "\\" + cartera.obtenerNombreCartera() + "_frontera.csv", True)
+
+    rendimientosNube, volatilidadesNube = np.array([]), np.array([])
+    if args.numCarteras > 0:
+        rendimientosNube, volatilidadesNube, pesosMejorAleatoria = get_nube_carteras(medias, matrizCovarianzas, args.numCarteras, args.tasaLibreRiesgo,
+                                                                                     args.semilla)
+        rendimiento, volatilidad = get_rendimientos_volatilidades(pesosMejorAleatoria, medias, matrizCovarianzas)
+        print(f"Mejor ratio de Sharpe entre {args.numCarteras} carteras aleatorias: {((rendimiento - args.tasaLibreRiesgo) / volatilidad)[0]: .6f}")
+    if pesosMaximoSharpe is not None:
+        rendimiento, volatilidad = get_rendimientos_volatilidades(pesosMaximoSharpe, medias, matrizCovarianzas)
+        print(f"Ratio de Sharpe de la cartera de máximo Sharpe: {((rendimiento - args.tasaLibreRiesgo) / volatilidad)[0]: .6f}")
+
+    activosGrafica = (medias, np.sqrt(np.diag(matrizCovarianzas)), nombresActivos)
+    minimaVarianza = get_rendimientos_volatilidades(pesosMinimaVarianza, medias, matrizCovarianzas)
+    maximoSharpe = None if pesosMaximoSharpe is None else get_rendimientos_volatilidades(pesosMaximoSharpe, medias, matrizCovarianzas)
+    if not grafica_frontera_eficiente((rendimientosNube, volatilidadesNube), get_rendimientos_volatilidades(pesosFrontera, medias, matrizCovarianzas),
+                                      minimaVarianza, maximoSharpe, activosGrafica, args.tasaLibreRiesgo,
+                                      "Frontera eficiente " + cartera.obtenerNombreCartera()):
+        print("Error al visualizar la frontera eficiente de la cartera")
+
+if __name__ == "__main__":
+    main()
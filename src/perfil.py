@@ -0,0 +1,175 @@
+import os
+import time
+import threading
+import tracemalloc
+import contextlib
+from dataclasses import dataclass
+from functools import wraps
+
+#Configuración actual del perfilado, que se modifica con iniciar_perfil. Mientras está desactivado, etapa devuelve siempre el mismo contexto vacío, por lo que
+#el coste de las etapas instrumentadas es el de una consulta a este diccionario
+#Medir la memoria con tracemalloc hace más lentas las etapas con muchas reservas pequeñas (como escribir CSVs), por lo que puede desactivarse
+configuracionPerfil = {"activo": False, "memoria": True, "programa": None, "inicio": 0}
+#Etapas terminadas y etapas abiertas de la ejecución actual. Se protegen con un cerrojo porque extractor.py ejecuta etapas desde varios hilos
+etapasTerminadas = []
+etapasAbiertas = []
+cerrojoPerfil = threading.Lock()
+#Contexto que no hace nada, compartido por todas las etapas mientras el perfilado está desactivado
+CONTEXTO_VACIO = contextlib.nullcontext()
+
+#Función que anota el pico de memoria actual en todas las etapas abiertas y reinicia el pico, de forma que cada etapa acaba con el máximo de los picos
+#observados mientras estaba abierta. Debe llamarse con el cerrojo adquirido
+def actualizar_picos():
+    if not configuracionPerfil["memoria"]:
+        return
+    _, pico = tracemalloc.get_traced_memory()
+    for etapaAbierta in etapasAbiertas:
+        etapaAbierta.memoriaPico = max(etapaAbierta.memoriaPico, pico)
+    tracemalloc.reset_peak()
+
+@dataclass
+class EtapaPerfil:
+    #Esta clase mide una etapa con nombre de la ejecución, usándose como contexto (with). Se miden el tiempo real, el tiempo de CPU del proceso (todos sus
+    #hilos, pero no los procesos hijos) y el pico de memoria reservada por Python y numpy según tracemalloc
+    #Los atributos van a ser:
+    #Nombre: Nombre de la etapa
+    #Activo: Activo (o archivo) al que corresponde la etapa, o None si no corresponde a ninguno
+    #Hilo: Identificador del hilo que ejecuta la etapa
+    #Inicio, InicioCPU: Instantes de comienzo, en nanosegundos, del tiempo real y del tiempo de CPU
+    #MemoriaInicial, MemoriaPico: Memoria reservada al comenzar la etapa y máxima mientras estaba abierta, en bytes
+
+    nombre: str
+    activo: str
+    hilo: int
+    inicio: int
+    inicioCPU: int
+    memoriaInicial: int
+    memoriaPico: int
+
+    def __init__(self, nombre, activo=None):
+        self.nombre = nombre
+        self.activo = activo
+
+    def __enter__(self):
+        with cerrojoPerfil:
+            actualizar_picos()
+            self.memoriaInicial = tracemalloc.get_traced_memory()[0] if configuracionPerfil["memoria"] else 0
+            self.memoriaPico = self.memoriaInicial
+            etapasAbiertas.append(self)
+        self.hilo = threading.get_native_id()
+        self.inicioCPU = time.process_time_ns()
+        self.inicio = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        fin = time.perf_counter_ns()
+        finCPU = time.process_time_ns()
+        with cerrojoPerfil:
+            actualizar_picos()
+            etapasAbiertas.remove(self)
+            etapasTerminadas.append({"nombre": self.nombre,
+                                     "activo": self.activo,
+                                     "hilo": self.hilo,
+                                     "inicio": (self.inicio - configuracionPerfil["inicio"]) / 1e9,
+                                     "segundos": (fin - self.inicio) / 1e9,
+                                     "segundosCPU": (finCPU - self.inicioCPU) / 1e9,
+                                     "memoriaInicial": self.memoriaInicial if configuracionPerfil["memoria"] else None,
+                                     "memoriaPico": self.memoriaPico if configuracionPerfil["memoria"] else None})
+        return False
+
+#Función que devuelve el contexto con el que se mide una etapa, o uno vacío si el perfilado está desactivado
+#Nombre: Nombre de la etapa
+#Activo: Activo o archivo al que corresponde, para poder desglosar los tiempos por activo
+def etapa(nombre, activo=None):
+    if not configuracionPerfil["activo"]:
+        return CONTEXTO_VACIO
+    return EtapaPerfil(nombre, activo)
+
+#Decorador que mide cada llamada a una función como una etapa con su nombre (o con el indicado)
+def perfilar(nombre=None):
+    def decorador(funcion):
+        nombreEtapa = nombre or funcion.__name__
+        @wraps(funcion)
+        def funcionPerfilada(*args, **kwargs):
+            if not configuracionPerfil["activo"]:
+                return funcion(*args, **kwargs)
+            with EtapaPerfil(nombreEtapa):
+                return funcion(*args, **kwargs)
+        return funcionPerfilada
+    return decorador
+
+#Función que activa el perfilado de un programa, descartando las etapas de ejecuciones anteriores, y abre la etapa que abarca toda la ejecución
+#Programa: Nombre del programa, que da nombre a la etapa principal y a los archivos generados por guardar_perfil
+#Memoria: Indica si se mide también el pico de memoria de cada etapa
+def iniciar_perfil(programa, memoria=True):
+    configuracionPerfil["memoria"] = memoria
+    if memoria and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    etapasTerminadas.clear()
+    etapasAbiertas.clear()
+    configuracionPerfil["activo"] = True
+    configuracionPerfil["programa"] = EtapaPerfil(programa)
+    configuracionPerfil["inicio"] = time.perf_counter_ns()
+    configuracionPerfil["programa"].__enter__()
+
+#Función que agrega las etapas terminadas por nombre y, dentro de cada activo, por nombre. Las etapas anidadas cuentan tanto en la suya como en las que
+#las contienen
+def get_resumen_perfil():
+    def agregar(resumen, etapaTerminada):
+        agregado = resumen.setdefault(etapaTerminada["nombre"], {"llamadas": 0, "segundos": 0.0, "segundosCPU": 0.0, "memoriaPico": None})
+        agregado["llamadas"] += 1
+        agregado["segundos"] += etapaTerminada["segundos"]
+        agregado["segundosCPU"] += etapaTerminada["segundosCPU"]
+        if etapaTerminada["memoriaPico"] is not None:
+            agregado["memoriaPico"] = max(agregado["memoriaPico"] or 0, etapaTerminada["memoriaPico"])
+
+    etapas = {}
+    activos = {}
+    for etapaTerminada in etapasTerminadas:
+        agregar(etapas, etapaTerminada)
+        if etapaTerminada["activo"] is not None:
+            agregar(activos.setdefault(etapaTerminada["activo"], {}), etapaTerminada)
+    return {"etapas": etapas, "activos": activos}
+
+#Función que convierte las etapas terminadas al formato de eventos de traza de Chrome, que puede abrirse en Perfetto o en chrome://tracing. Cada etapa es
+#un evento completo (con su duración) en el hilo que la ejecutó, y la memoria se añade como un contador
+def get_traza_perfil():
+    pid = os.getpid()
+    eventos = []
+    for etapaTerminada in etapasTerminadas:
+        nombre = etapaTerminada["nombre"] if etapaTerminada["activo"] is None else etapaTerminada["nombre"] + " " + str(etapaTerminada["activo"])
+        inicio = etapaTerminada["inicio"] * 1e6
+        eventos.append({"name": nombre, "cat": etapaTerminada["nombre"], "ph": "X", "ts": inicio, "dur": etapaTerminada["segundos"] * 1e6,
+                        "pid": pid, "tid": etapaTerminada["hilo"],
+                        "args": {"activo": etapaTerminada["activo"], "segundosCPU": etapaTerminada["segundosCPU"],
+                                 "memoriaInicial": etapaTerminada["memoriaInicial"], "memoriaPico": etapaTerminada["memoriaPico"]}})
+        if etapaTerminada["memoriaPico"] is not None:
+            eventos.append({"name": "Memoria", "ph": "C", "ts": inicio + etapaTerminada["segundos"] * 1e6, "pid": pid,
+                            "args": {"memoriaPico": etapaTerminada["memoriaPico"]}})
+    eventos.sort(key=lambda evento: evento["ts"])
+    return {"traceEvents": eventos, "displayTimeUnit": "ms"}
+
+#Función que cierra la etapa principal, desactiva el perfilado y guarda el resumen por etapas y activos en perfil_[programa].json y la traza en
+#traza_[programa].json, dentro del directorio indicado. No hace nada si el perfilado no está activo
+def guardar_perfil(ruta):
+    if not configuracionPerfil["activo"]:
+        return
+    #Se importa aquí porque data_utils también usa este archivo
+    from data_utils import save_json
+    etapaPrograma = configuracionPerfil["programa"]
+    etapaPrograma.__exit__(None, None, None)
+    configuracionPerfil["activo"] = False
+    tracemalloc.stop()
+
+    save_json(ruta + "\\" + "perfil_" + etapaPrograma.nombre + ".json", get_resumen_perfil())
+    save_json(ruta + "\\" + "traza_" + etapaPrograma.nombre + ".json", get_traza_perfil())
+
+#Función que desactiva el perfilado sin guardar nada, para cuando la ejecución termina antes de tiempo (por ejemplo, en servidor.py, si una petición
+#termina con un error). No hace nada si el perfilado no está activo
+def cancelar_perfil():
+    if not configuracionPerfil["activo"]:
+        return
+    configuracionPerfil["activo"] = False
+    tracemalloc.stop()
+    etapasTerminadas.clear()
+    etapasAbiertas.clear()
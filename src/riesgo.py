@@ -0,0 +1,141 @@
+import numpy as np
+from dataclasses import dataclass
+from typing import List
+
+#Niveles de confianza (en porcentaje) por defecto para el VaR y el CVaR
+NIVELES_CONFIANZA = (95, 99)
+#Percentiles por defecto de la distribución de los drawdowns máximos
+PERCENTILES_DRAWDOWN = (50, 95, 99)
+
+#Función que calcula el drawdown máximo de cada simulación, como la mayor caída relativa desde un máximo anterior (incluyendo el valor inicial), con
+#máximos acumulados a lo largo de los días en lugar de recorrer cada simulación
+#Valores: Matriz de simulaciones de dimensiones (simulaciones, días)
+#ValorInicial: Valor de todas las simulaciones el día 0
+#Devuelve un vector con el drawdown máximo (entre 0 y 1) de cada simulación
+def get_drawdowns_maximos(valores, valorInicial):
+    maximos = np.maximum.accumulate(valores, axis=1)
+    np.maximum(maximos, valorInicial, out=maximos)
+    return (1 - valores / maximos).max(axis=1)
+
+#Función que calcula el VaR y el CVaR de un conjunto de valores finales, como pérdidas respecto del valor inicial. El VaR a un nivel de confianza c es la
+#pérdida que solo se supera con probabilidad 1 - c, y el CVaR es la pérdida media en ese (1 - c) de peores casos
+#ValoresFinales: Vector con el valor de cada simulación el último día
+#Niveles: Niveles de confianza, en porcentaje
+#Devuelve dos vectores con el VaR y el CVaR de cada nivel
+def get_var_cvar(valoresFinales, valorInicial, niveles):
+    #Ordenando los valores finales de menor a mayor, las pérdidas quedan ordenadas de mayor a menor
+    perdidas = valorInicial - np.sort(valoresFinales)
+    var = np.percentile(perdidas, niveles)
+    #Como las pérdidas están ordenadas de mayor a menor, la media de las k peores es la media acumulada hasta la posición k
+    mediasPeores = np.cumsum(perdidas) / np.arange(1, perdidas.shape[0] + 1)
+    numPeores = np.maximum(np.ceil(perdidas.shape[0] * (100 - np.asarray(niveles)) / 100).astype(np.int64), 1)
+    return var, mediasPeores[numPeores - 1]
+
+#Función que estima la media de unas observaciones usando como variable de control otra magnitud de las mismas simulaciones cuya media se conoce de forma
+#exacta. Se resta a cada observación la desviación de su control respecto de la media conocida, multiplicada por el coeficiente de regresión entre ambas,
+#de forma que la varianza de la estimación se reduce en la proporción de la varianza de las observaciones que explica el control
+#Observaciones, Control: Vectores con el valor de cada simulación
+#MediaControl: Media teórica del control
+#Devuelve la media estimada y su error típico, que supone simulaciones independientes (muestreo aleatorio)
+def get_estimacion_variable_control(observaciones, control, mediaControl):
+    observaciones = np.asarray(observaciones, dtype=float)
+    control = np.asarray(control, dtype=float)
+    numSimulaciones = observaciones.shape[0]
+    if numSimulaciones < 2:
+        return float(np.mean(observaciones)), float("nan")
+    centradosControl = control - control.mean()
+    varianzaControl = np.dot(centradosControl, centradosControl)
+    beta = 0.0 if varianzaControl == 0 else np.dot(centradosControl, observaciones - observaciones.mean()) / varianzaControl
+    ajustadas = observaciones - beta * (control - mediaControl)
+    return float(ajustadas.mean()), float(ajustadas.std(ddof=1) / np.sqrt(numSimulaciones))
+
+@dataclass
+class RiesgoSimulacion:
+    #Esta clase va acumulando, bloque a bloque, las métricas de riesgo de un conjunto de simulaciones. De cada simulación solo se guardan su valor final y su
+    #drawdown máximo, de forma que también puede usarse en modo streaming, con 16 bytes por simulación en lugar de 8 por día
+    #Los atributos van a ser:
+    #ValorInicial: Valor de todas las simulaciones el día 0
+    #ValoresFinales: Lista con los valores finales de cada bloque de simulaciones
+    #Drawdowns: Lista con los drawdowns máximos de cada bloque de simulaciones
+    #MediaControl: Valor esperado teórico del valor final (ver get_media_valor_final en simulacion.py), o None si no se conoce. Si se conoce, se usa el
+    #valor final como variable de control para estimar la probabilidad de pérdida y el drawdown máximo medio con menos error
+
+    valorInicial: float
+    valoresFinales: List[np.array]
+    drawdowns: List[np.array]
+    mediaControl: float
+
+    def __init__(self, valorInicial, mediaControl=None):
+        self.valorInicial = valorInicial
+        self.mediaControl = mediaControl
+        self.valoresFinales = []
+        self.drawdowns = []
+
+    #Incorpora un bloque de simulaciones, de dimensiones (simulaciones, días)
+    def actualizar(self, bloque):
+        if bloque.shape[0] == 0:
+            return
+        self.valoresFinales.append(bloque[:, -1].copy())
+        self.drawdowns.append(get_drawdowns_maximos(bloque, self.valorInicial))
+
+    #Junta en uno solo los bloques acumulados, para que las consultas no tengan que volver a hacerlo
+    def juntarBloques(self):
+        if len(self.valoresFinales) > 1:
+            self.valoresFinales = [np.concatenate(self.valoresFinales)]
+            self.drawdowns = [np.concatenate(self.drawdowns)]
+
+    #Obtención del número de simulaciones acumuladas
+    def obtenerNumSimulaciones(self):
+        return sum(bloque.shape[0] for bloque in self.valoresFinales)
+
+    #Obtención de los valores finales de todas las simulaciones
+    def obtenerValoresFinales(self):
+        self.juntarBloques()
+        return self.valoresFinales[0] if self.valoresFinales else np.array([])
+
+    #Obtención de los drawdowns máximos de todas las simulaciones
+    def obtenerDrawdowns(self):
+        self.juntarBloques()
+        return self.drawdowns[0] if self.drawdowns else np.array([])
+
+    #Obtención de la probabilidad de acabar por debajo del valor inicial
+    def obtenerProbabilidadPerdida(self):
+        return float(np.mean(self.obtenerValoresFinales() < self.valorInicial))
+
+    #Obtención de la estimación con variable de control, y de su error típico, de la media de unas observaciones de cada simulación
+    def obtenerEstimacionControl(self, observaciones):
+        return get_estimacion_variable_control(observaciones, self.obtenerValoresFinales(), self.mediaControl)
+
+    #Obtención del VaR y el CVaR al horizonte de la simulación para cada nivel de confianza (en porcentaje)
+    def obtenerVarCvar(self, niveles=NIVELES_CONFIANZA):
+        return get_var_cvar(self.obtenerValoresFinales(), self.valorInicial, niveles)
+
+    #Obtención de los percentiles de la distribución de los drawdowns máximos
+    def obtenerPercentilesDrawdown(self, percentiles=PERCENTILES_DRAWDOWN):
+        return np.percentile(self.obtenerDrawdowns(), percentiles)
+
+    #Devuelve un diccionario con todas las métricas de riesgo, para guardarlas en CSV o incluirlas en un informe
+    def obtenerResumen(self, niveles=NIVELES_CONFIANZA, percentiles=PERCENTILES_DRAWDOWN):
+        var, cvar = self.obtenerVarCvar(niveles)
+        drawdowns = self.obtenerDrawdowns()
+        resumen = {"Simulaciones": self.obtenerNumSimulaciones(),
+                   "Valor inicial": self.valorInicial,
+                   "Probabilidad de pérdida": self.obtenerProbabilidadPerdida(),
+                   "Drawdown máximo medio": float(drawdowns.mean())}
+        if self.mediaControl is not None:
+            perdidas = self.obtenerValoresFinales() < self.valorInicial
+            resumen["Probabilidad de pérdida (variable de control)"], resumen["Error típico probabilidad de pérdida (variable de control)"] = \
+                self.obtenerEstimacionControl(perdidas)
+            resumen["Drawdown máximo medio (variable de control)"], resumen["Error típico drawdown máximo medio (variable de control)"] = \
+                self.obtenerEstimacionControl(drawdowns)
+        for nivel, varNivel, cvarNivel in zip(niveles, var, cvar):
+            resumen[f"VaR {nivel:g}%"] = float(varNivel)
+            resumen[f"CVaR {nivel:g}%"] = float(cvarNivel)
+        for p, drawdown in zip(percentiles, self.obtenerPercentilesDrawdown(percentiles)):
+            resumen[f"Drawdown máximo percentil {p:g}"] = float(drawdown)
+        return resumen
+
+#Función que calcula de forma exacta los percentiles por día (abanico) de una matriz de simulaciones completa, de dimensiones (simulaciones, días)
+#Devuelve una matriz de dimensiones (percentiles, días)
+def get_abanico_percentiles(valores, percentiles):
+    return np.percentile(valores, percentiles, axis=0)
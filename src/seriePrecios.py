@@ -1,208 +1,352 @@
-import pandas as pd
 import numpy as np
 import argparse
 from pathlib import Path
-from data_utils import get_log_returns
-from scipy.stats import skew,kurtosis
-from datetime import datetime
+from data_utils import get_log_returns, get_fecha, get_momentos, unir_momentos
+from indicadores import get_indicador, get_clave_indicador
+from perfil import etapa
+from formatos import load_tabla, get_formato
 from dataclasses import dataclass
 from typing import List
 
-@dataclass
+#Columnas de precios de los CSV generados por extractor.py, en el orden en que se guardan en el bloque OHLCV de cada serie
+COLUMNAS_OHLCV = ['Close', 'High', 'Low', 'Open', 'Volume']
+#Tipos con los que se leen las columnas de los CSV. Las fechas se leen como texto y se convierten después a datetime64 de una sola vez. En parquet y npy las
+#columnas ya tienen su tipo, y las fechas ya son fechas
+TIPOS_CSV = {'Date': str, 'Close': np.float64, 'High': np.float64, 'Low': np.float64, 'Open': np.float64, 'Volume': np.float64}
+
+#Usamos slots para que cada instancia no tenga un diccionario de atributos, ya que se pueden llegar a cargar miles de series
+@dataclass(slots=True)
 class SeriePrecios:
-    #El parámetro archivoCSV va a contener un fichero CSV generado por extractor.py
+    #El parámetro archivoCSV va a contener un fichero CSV (o parquet o npy, según su extensión) generado por extractor.py
     #Los atributos van a ser:
     #NombreActivo: Nombre del activo cuya serie temporal estamos cargando
-    #Dates: Lista de fechas de la serie temporal
+    #BufferFechas: Vector de fechas (datetime64) de la serie temporal, con capacidad para más fechas de las que tiene. A las fechas se accede con dates
     #Longitud: Número de entradas en la serie temporal
-    #ClosePrices: Lista de precios de cierre de la serie temporal
-    #HighPrices: Lista de precios máximos de la serie temporal
-    #LowPrices: Lista precios mínimos de la serie temporal
-    #OpenPrices: Lista precios de apertura de la serie temporal
-    #Volume: Lista de volúmenes negociados de la serie temporal
-    #LogReturns: Retornos logarítmicos de la serie temporal (los escojemos en lugar de los simples porque se distribuyen normalmente, lo que nos va a ser útil para
+    #BufferOhlcv: Bloque contiguo de dimensiones (5, capacidad) con los precios de cierre, máximos, mínimos, de apertura y los volúmenes negociados, en ese
+    #orden. Sus primeras longitud columnas son el bloque OHLCV de la serie, al que se accede con ohlcv, y a cada una de sus filas con closePrices, highPrices,
+    #lowPrices, openPrices y volume. Las columnas sobrantes permiten añadir nuevas barras con append sin copiar la serie cada vez
+    #BufferReturns: Retornos logarítmicos de la serie temporal (los escojemos en lugar de los simples porque se distribuyen normalmente, lo que nos va a ser útil
+    #para Monte Carlo), también con capacidad sobrante. A los retornos se accede con logReturns
+    #NumReturns: Número de retornos logarítmicos
+    #Momentos: Momentos de los retornos logarítmicos [n, media, M2, M3, M4] (ver get_momentos), a partir de los cuales se calculan los estadísticos. Al añadir
+    #barras se actualizan con los de los nuevos retornos, sin recorrer toda la serie
     #Media: Media de los retornos logarítmicos
     #DesviacionTipica: Desviación típica de los retornos logarítmicos
-    #CuasiDesviacionTipica: Cuasidesviacíon típica de los retornos logarítmicos (nos va a servir para estimar la desviación típica de la distribución que siguen 
-    #los retornos logarítmicos) 
-    #Monte Carlo)
+    #CuasiDesviacionTipica: Cuasidesviacíon típica de los retornos logarítmicos (nos va a servir para estimar la desviación típica de la distribución que siguen
+    #los retornos logarítmicos)
     #Asimetria: Simetría de los retornos logarítmicos respecto de su media
     #Curtosis: Nivel de aplanamiento de los retornos logarítmicos respecto a una distribución normal
+    #Los retornos y los estadísticos se calculan la primera vez que se piden (valen None hasta entonces), y se guardan para las siguientes
+    #CacheIndicadores: Indicadores técnicos ya calculados, identificados por su nombre y sus parámetros
 
     nombreActivo: str
-    dates: np.array
+    bufferFechas: np.array
     longitud: int
-    closePrices: np.array
-    highPrices: np.array
-    lowPrices: np.array
-    openPrices: np.array
-    volume: np.array
-    logReturns: np.array
+    bufferOhlcv: np.array
+    bufferReturns: np.array
+    numReturns: int
+    momentos: np.array
     media: float
     desviacionTipica: float
     cuasiDesviacionTipica: float
     asimetria: float
     curtosis: float
+    cacheIndicadores: dict
 
     def __init__(self, archivoCSV):
+        self.inicializarCalculos()
         try:
-            data = pd.read_csv(archivoCSV)
             #Recordemos que el formato de los CSV es api_activo_fechaInicio_fechaFin, y que lleva delante todo el nombre de la ruta
-            self.nombreActivo = (archivoCSV.split('\\')[-1]).split('_')[1] 
-            self.dates = data['Date'].to_numpy()
-            self.longitud = self.dates.shape[0]
-            self.closePrices = data['Close'].to_numpy()
-            self.highPrices = data['High'].to_numpy()
-            self.lowPrices = data['Low'].to_numpy()
-            self.openPrices = data['Open'].to_numpy()
-            self.volume = data['Volume'].to_numpy()
-            self.logReturns = get_log_returns(self.closePrices)
-            self.calcularMedia()
-            self.calcularDesviacionTipica()
-            self.calcularCuasiDesviacionTipica()
-            self.calcularAsimetria()
-            self.calcularCurtosis()
+            self.nombreActivo = (archivoCSV.split('\\')[-1]).split('_')[1]
+            #Leemos solamente las columnas que necesitamos, con sus tipos, para que pandas no tenga que inferirlos
+            with etapa("read_" + (get_formato(archivoCSV) or "csv"), self.nombreActivo):
+                data = load_tabla(archivoCSV, TIPOS_CSV)
+            if data is None:
+                raise ValueError(archivoCSV)
+            self.longitud = data.shape[0]
+            self.dates = data['Date'].to_numpy().astype('datetime64[D]')
+            #Al trasponer la matriz de precios y hacerla contigua, cada tipo de precio queda en una fila contigua del bloque
+            self.ohlcv = np.ascontiguousarray(data[COLUMNAS_OHLCV].to_numpy().T)
         except Exception as e:
             print("El archivo " + archivoCSV + " no es válido")
 
+    #Pone a None los retornos y los estadísticos, para que se calculen cuando se pidan, y vacía la caché de indicadores
+    def inicializarCalculos(self):
+        self.bufferReturns = None
+        self.numReturns = 0
+        self.momentos = None
+        self.inicializarEstadisticos()
+
+    #Pone a None los estadísticos, para que se calculen (a partir de los momentos) cuando se pidan, y vacía la caché de indicadores
+    def inicializarEstadisticos(self):
+        self.media = None
+        self.desviacionTipica = None
+        self.cuasiDesviacionTipica = None
+        self.asimetria = None
+        self.curtosis = None
+        self.cacheIndicadores = {}
+
+    #Fechas de la serie, como vista sobre el buffer de fechas
+    @property
+    def dates(self):
+        return self.bufferFechas[:self.longitud]
+
+    @dates.setter
+    def dates(self, fechas):
+        self.bufferFechas = fechas
+
+    #Bloque OHLCV de la serie, como vista sobre el buffer OHLCV
+    @property
+    def ohlcv(self):
+        return self.bufferOhlcv[:, :self.longitud]
+
+    @ohlcv.setter
+    def ohlcv(self, bloque):
+        self.bufferOhlcv = bloque
+
+    #Retornos logarítmicos, como vista sobre el buffer de retornos, o None si aún no se han calculado
+    @property
+    def logReturns(self):
+        if self.bufferReturns is None:
+            return None
+        return self.bufferReturns[:self.numReturns]
+
+    @logReturns.setter
+    def logReturns(self, returns):
+        self.bufferReturns = returns
+        self.numReturns = 0 if returns is None else returns.shape[0]
+
+    #Precios de cierre, como vista sobre el bloque OHLCV
+    @property
+    def closePrices(self):
+        return self.ohlcv[0]
+
+    #Precios máximos, como vista sobre el bloque OHLCV
+    @property
+    def highPrices(self):
+        return self.ohlcv[1]
+
+    #Precios mínimos, como vista sobre el bloque OHLCV
+    @property
+    def lowPrices(self):
+        return self.ohlcv[2]
+
+    #Precios de apertura, como vista sobre el bloque OHLCV
+    @property
+    def openPrices(self):
+        return self.ohlcv[3]
+
+    #Volúmenes negociados, como vista sobre el bloque OHLCV
+    @property
+    def volume(self):
+        return self.ohlcv[4]
+
     #Obtención del nombre del activo
     def obtenerNombreActivo(self):
         return self.nombreActivo
-    
+
     #Obtención de la primera fecha en la serie temporal, en formato Día/Mes/Año
     def obtenerPrimeraFecha(self):
-        return datetime.strptime(self.dates[0], "%Y-%m-%d")
-    
+        return get_fecha(self.dates[0])
+
     #Obtención de la última fecha en la serie temporal, en formato Día/Mes/Año
     def obtenerUltimaFecha(self):
-        return datetime.strptime(self.dates[-1], "%Y-%m-%d")
-    
+        return get_fecha(self.dates[-1])
+
     #Obtención de las fechas
     def obtenerFechas(self):
         return self.dates
-    
+
     #Obtención de los precios de cierre
     def obtenerClosePrices(self):
         return self.closePrices
 
+    #Cálculo de los retornos logarítmicos
+    def calcularReturns(self):
+        self.logReturns = get_log_returns(self.closePrices)
+
     #Obtención de los retornos logarítmicos
     def obtenerReturns(self):
+        if self.logReturns is None:
+            self.calcularReturns()
         return self.logReturns
 
+    #Cálculo de los momentos de los retornos logarítmicos
+    def calcularMomentos(self):
+        with etapa("estadisticos", self.nombreActivo):
+            self.momentos = get_momentos(self.obtenerReturns())
+
+    #Obtención de los momentos de los retornos logarítmicos
+    def obtenerMomentos(self):
+        if self.momentos is None:
+            self.calcularMomentos()
+        return self.momentos
+
     #Cálculo de la media de los retornos logarítmicos
     def calcularMedia(self):
-        self.media = np.mean(self.logReturns)
+        self.media = self.obtenerMomentos()[1]
 
     #Obtención de la media de los retornos logarítmicos
     def obtenerMedia(self):
+        if self.media is None:
+            self.calcularMedia()
         return self.media
-    
+
     #Cálculo de la desviación típica de los retornos logarítmicos
     def calcularDesviacionTipica(self):
-        self.desviacionTipica = np.std(self.logReturns)
+        n, _, m2, _, _ = self.obtenerMomentos()
+        self.desviacionTipica = np.sqrt(m2 / n)
 
     #Obtención de la desviación típica de los retornos logarítmicos
     def obtenerDesviacionTipica(self):
+        if self.desviacionTipica is None:
+            self.calcularDesviacionTipica()
         return self.desviacionTipica
 
     #Cálculo de la cuasidesviación tipica de los retornos logarítmicos
     def calcularCuasiDesviacionTipica(self):
-        self.cuasiDesviacionTipica =  (self.longitud/(self.longitud - 1)) * self.desviacionTipica
+        self.cuasiDesviacionTipica =  (self.longitud/(self.longitud - 1)) * self.obtenerDesviacionTipica()
 
     #Obtención de la cuasidesviación típica de los retornos logarítmicos
     def obtenerCuasiDesviacionTipica(self):
+        if self.cuasiDesviacionTipica is None:
+            self.calcularCuasiDesviacionTipica()
         return self.cuasiDesviacionTipica
-    
+
+    #Cálculo y obtención de un indicador técnico de la serie (sma, ema, rsi, macd, bollinger o atr), con los parámetros dados. El resultado se guarda, de
+    #forma que volver a pedir el mismo indicador con los mismos parámetros no lo recalcula
+    def obtenerIndicador(self, nombre, **parametros):
+        clave = get_clave_indicador(nombre, parametros)
+        if not (clave in self.cacheIndicadores):
+            precios = {"close": self.closePrices, "high": self.highPrices, "low": self.lowPrices}
+            resultado = get_indicador(nombre, precios, **parametros)
+            #Los indicadores se calculan sobre una matriz de una sola fila, de la que nos quedamos con la serie
+            if isinstance(resultado, tuple):
+                resultado = tuple(componente[0] for componente in resultado)
+            elif resultado.size > 0:
+                resultado = resultado[0]
+            self.cacheIndicadores[clave] = resultado
+        return self.cacheIndicadores[clave]
+
     #Cálculo y obtención de las medias móviles simples de precios de cierre de n días
     def obtenerMediaMovilSimple(self, n):
-        #n debe ser positivo y menor o igual que la longitud de la serie
-        if n <= 0 or n > self.longitud:
-            print("El número de días debe ser positivo y menor o igual que la longitud de la serie")
-            return np.array([])
-
-        mediaMovil = np.convolve(self.closePrices, np.ones(n)/n, mode='valid')
-        return mediaMovil
-    
-    #Cálculo y obtención del RSI simple de los precios de cierre para períodos de 14 días
-    def obtenerRSI(self):
-        #Debemos asegurarnos que haya al menos 15 entradas de precios, para que nos queden 14 diferencias
-        if self.longitud < 15:
-            print("Debe haber al menos 15 entradas de precios")
-            return np.array([])
-
-        cambiosDiarios = np.diff(self.closePrices)
-        #Cuando haya una posición con pérdida, la sustituimos por 0
-        gananciasDiarias = [cambio if cambio > 0 else 0 for cambio in cambiosDiarios]
-        #Cuando haya una posición con ganancia, la sustituimos por 0. Como las pérdidas tienen todas signo negativo, se lo cambiamos
-        perdidasDiarias = [-cambio if cambio <= 0 else 0 for cambio in cambiosDiarios]
-        
-        matrizFiltro = np.ones(14)/14
-        mediaGanancias = np.convolve(gananciasDiarias, matrizFiltro, mode='valid')
-        mediaPerdidas = np.convolve(perdidasDiarias, matrizFiltro, mode='valid')
-
-        #Calculamos los RS (Relative Strength)
-        rs = mediaGanancias/mediaPerdidas
-        #Finalmente calculamos los RSI
-        rsi = 100 - 100/(1 + rs)
-        
-        return rsi
-
-    
+        return self.obtenerIndicador("sma", n=n)
+
+    #Cálculo y obtención del RSI de los precios de cierre para períodos de n días (14 por defecto), con suavizado simple (media de cada ventana) o de Wilder
+    def obtenerRSI(self, n=14, suavizado="simple"):
+        return self.obtenerIndicador("rsi", n=n, suavizado=suavizado)
+
+
     #Cálculo de la asimetría de los retornos logarítmicos
     def calcularAsimetria(self):
-        self.asimetria = skew(self.logReturns)
+        #Coeficiente de asimetría de Fisher-Pearson, igual que el calculado por scipy.stats.skew
+        n, _, m2, m3, _ = self.obtenerMomentos()
+        self.asimetria = (m3 / n) / (m2 / n)**1.5
 
     #Obtención de la asimetría de los retornos logarítmicos
     def obtenerAsimetria(self):
-        return self.asimetria 
-    
-    #Cálculo de la curtosis de los retornos logarítmicos 
+        if self.asimetria is None:
+            self.calcularAsimetria()
+        return self.asimetria
+
+    #Cálculo de la curtosis de los retornos logarítmicos
     def calcularCurtosis(self):
-        self.curtosis = kurtosis(self.logReturns)
+        #Exceso de curtosis respecto de una normal, igual que el calculado por scipy.stats.kurtosis
+        n, _, m2, _, m4 = self.obtenerMomentos()
+        self.curtosis = (m4 / n) / (m2 / n)**2 - 3
 
     #Obtención de la curtosis de los retornos logarítmicos
     def obtenerCurtosis(self):
+        if self.curtosis is None:
+            self.calcularCurtosis()
         return self.curtosis
-    
+
+    #Añade nuevas barras al final de la serie, en tiempo amortizado proporcional al número de barras nuevas. Si no queda capacidad en los buffers, se duplica.
+    #Los retornos (si ya se habían calculado) y los momentos se actualizan solo con los nuevos retornos, por lo que los estadísticos siguen siendo exactos
+    #Barras: Dataframe con las columnas de los CSV generados por extractor.py, con las fechas en la columna Date o en el índice. Solo se añaden las barras
+    #posteriores a la última fecha de la serie
+    #Devuelve el número de barras añadidas
+    def append(self, barras):
+        fechas = (barras['Date'] if 'Date' in barras.columns else barras.index).to_numpy().astype('datetime64[D]')
+        nuevas = fechas > self.dates[-1] if self.longitud > 0 else np.ones(fechas.shape[0], dtype=bool)
+        numNuevas = int(np.count_nonzero(nuevas))
+        if numNuevas == 0:
+            return 0
+        #Extraemos columna a columna, ya que seleccionar varias columnas del dataframe a la vez crea un dataframe intermedio
+        bloqueNuevo = np.array([barras[columna].to_numpy() for columna in COLUMNAS_OHLCV], dtype=np.float64)[:, nuevas]
+
+        longitudFinal = self.longitud + numNuevas
+        if longitudFinal > self.bufferOhlcv.shape[1]:
+            capacidad = max(2 * self.bufferOhlcv.shape[1], longitudFinal)
+            bufferOhlcv = np.empty((len(COLUMNAS_OHLCV), capacidad))
+            bufferOhlcv[:, :self.longitud] = self.ohlcv
+            bufferFechas = np.empty(capacidad, dtype='datetime64[D]')
+            bufferFechas[:self.longitud] = self.dates
+            self.bufferOhlcv, self.bufferFechas = bufferOhlcv, bufferFechas
+        self.bufferOhlcv[:, self.longitud:longitudFinal] = bloqueNuevo
+        self.bufferFechas[self.longitud:longitudFinal] = fechas[nuevas]
+
+        #Los nuevos retornos incluyen el del primer cierre nuevo respecto del último cierre anterior
+        cierres = self.bufferOhlcv[0, max(self.longitud - 1, 0):longitudFinal]
+        self.longitud = longitudFinal
+        returnsNuevos = get_log_returns(cierres)
+        if self.bufferReturns is not None:
+            numReturnsFinal = self.numReturns + returnsNuevos.shape[0]
+            if numReturnsFinal > self.bufferReturns.shape[0]:
+                bufferReturns = np.empty(max(2 * self.bufferReturns.shape[0], numReturnsFinal))
+                bufferReturns[:self.numReturns] = self.logReturns
+                self.bufferReturns = bufferReturns
+            self.bufferReturns[self.numReturns:numReturnsFinal] = returnsNuevos
+            self.numReturns = numReturnsFinal
+        if self.momentos is not None:
+            self.momentos = unir_momentos(self.momentos, get_momentos(returnsNuevos))
+
+        #Los estadísticos se recalculan a partir de los momentos cuando se pidan, y los indicadores desde cero
+        self.inicializarEstadisticos()
+        return numNuevas
+
     #Hay que declarar esté metodo porque va a ser llamado por el método homónimo en la clase Cartera, al tener como atributo una lista de instancias
     def to_dict(self):
         return {
             "nombreActivo": self.nombreActivo,
-            "dates": self.dates.tolist(),
+            "dates": [str(fecha) for fecha in self.dates],
             "longitud": self.longitud,
             "closePrices": self.closePrices.tolist(),
             "highPrices": self.highPrices.tolist(),
             "lowPrices": self.lowPrices.tolist(),
             "openPrices": self.openPrices.tolist(),
             "volume": self.volume.tolist(),
-            "logReturns": self.logReturns.tolist(),
-            "media": self.media,
-            "desviacionTipica": self.desviacionTipica,
-            "cuasiDesviacionTipica": self.cuasiDesviacionTipica,
-            "asimetria": self.asimetria,
-            "curtosis": self.curtosis
+            "logReturns": self.obtenerReturns().tolist(),
+            "media": self.obtenerMedia(),
+            "desviacionTipica": self.obtenerDesviacionTipica(),
+            "cuasiDesviacionTipica": self.obtenerCuasiDesviacionTipica(),
+            "asimetria": self.obtenerAsimetria(),
+            "curtosis": self.obtenerCurtosis()
         }
-    
+
     @classmethod
     #Hay que declarar este método de clase porque va a ser llamado por el método homónimo en la clase Cartera, al tener como atributo una lista de instancias
+    #Los precios pueden venir como un bloque OHLCV (clave ohlcv) o como un vector por tipo de precio, y los retornos y estadísticos son opcionales
     def from_dict(serie, datos):
         #No podemos llamar al constructor por defecto que crea dataclass porque ya lo hemos sobreescrito
         obj = serie.__new__(serie)
-        
+        obj.inicializarCalculos()
+
         obj.nombreActivo = datos["nombreActivo"]
-        obj.dates = np.array(datos["dates"])
+        #Usamos asarray para que, si ya nos pasan arrays (por ejemplo, mapeados en memoria desde un archivo binario), no se copien
+        obj.dates = np.asarray(datos["dates"], dtype='datetime64[D]')
         obj.longitud = datos["longitud"]
-        obj.closePrices = np.array(datos["closePrices"])
-        obj.highPrices = np.array(datos["highPrices"])
-        obj.lowPrices = np.array(datos["lowPrices"])
-        obj.openPrices = np.array(datos["openPrices"])
-        obj.volume = np.array(datos["volume"])
-        obj.logReturns = np.array(datos["logReturns"])
-        obj.media = datos["media"]
-        obj.desviacionTipica = datos["desviacionTipica"]
-        obj.cuasiDesviacionTipica = datos["cuasiDesviacionTipica"]
-        obj.asimetria = datos["asimetria"]
-        obj.curtosis = datos["curtosis"]
+        if "ohlcv" in datos:
+            obj.ohlcv = np.asarray(datos["ohlcv"], dtype=np.float64)
+        else:
+            obj.ohlcv = np.array([datos["closePrices"], datos["highPrices"], datos["lowPrices"], datos["openPrices"], datos["volume"]], dtype=np.float64)
+        if "logReturns" in datos:
+            obj.logReturns = np.asarray(datos["logReturns"])
+        obj.media = datos.get("media")
+        obj.desviacionTipica = datos.get("desviacionTipica")
+        obj.cuasiDesviacionTipica = datos.get("cuasiDesviacionTipica")
+        obj.asimetria = datos.get("asimetria")
+        obj.curtosis = datos.get("curtosis")
 
         return obj
 
@@ -211,4 +355,4 @@ if __name__ == "__main__":
     parser.add_argument('--archivoSerie', type=str, required=True, help='CSV conteniendo serie de precios')
     args = parser.parse_args()
 
-    serie = SeriePrecios(args.archivoSerie)
\ No newline at end of file
+    serie = SeriePrecios(args.archivoSerie)
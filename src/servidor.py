@@ -0,0 +1,162 @@
+import argparse
+import sys
+import os
+import io
+import json
+import contextlib
+import importlib
+from dataclasses import dataclass
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from data_utils import exists_route
+from cartera import cargar_cartera, EXTENSION_CARTERA
+from graficas import configurar_graficas, get_pyplot
+from perfil import cancelar_perfil
+import monteCarlo
+import optimizador
+import backtest
+
+#Dirección y puerto por defecto del servidor. Solo se escucha en la propia máquina, ya que el API no tiene autenticación
+DIRECCION_SERVIDOR = "127.0.0.1"
+PUERTO_SERVIDOR = 8765
+#Programas que puede ejecutar el servidor, con los mismos argumentos que en la línea de comandos
+programasServidor = {"monteCarlo": monteCarlo.main, "optimizador": optimizador.main, "backtest": backtest.main}
+
+#Función que devuelve una marca de la última versión del archivo de una cartera (binario o, si no existe, json), formada por su ruta, su fecha de
+#modificación y su tamaño, o None si no existe ninguno de los dos
+def get_marca_cartera(nombreCartera):
+    for ruta in [nombreCartera + EXTENSION_CARTERA, nombreCartera + ".json"]:
+        if exists_route(ruta):
+            estado = os.stat(ruta)
+            return (os.path.abspath(ruta), estado.st_mtime_ns, estado.st_size)
+    return None
+
+@dataclass
+class CacheCarteras:
+    #Esta clase mantiene en memoria las carteras ya cargadas, junto con sus indicadores calculados, para no volver a leerlas en cada petición. Antes de
+    #devolver una cartera se comprueba si su archivo ha cambiado (por ejemplo, porque se ha vuelto a ejecutar cartera.py) y, en ese caso, se recarga
+    #Los atributos van a ser:
+    #Carteras: Diccionario que asocia a la ruta absoluta de cada cartera una tupla (marca de su archivo, cartera)
+
+    carteras: dict
+
+    def __init__(self):
+        self.carteras = {}
+
+    #Obtención de una cartera a partir de su nombre, relativo al directorio actual, igual que con cargar_cartera. Devuelve None si no se puede cargar
+    def obtenerCartera(self, nombreCartera):
+        clave = os.path.abspath(nombreCartera)
+        marca = get_marca_cartera(nombreCartera)
+        if marca is None:
+            self.carteras.pop(clave, None)
+            return None
+        if clave in self.carteras and self.carteras[clave][0] == marca:
+            return self.carteras[clave][1]
+
+        #Los arrays se leen a memoria en lugar de mapear el archivo, para que pueda sobrescribirse mientras la cartera está cargada
+        cartera = cargar_cartera(nombreCartera, True)
+        if cartera is None:
+            return None
+        #Al cargar un json se genera también el binario, así que la marca se toma después de cargar
+        self.carteras[clave] = (get_marca_cartera(nombreCartera), cartera)
+        return cartera
+
+    #Obtención de las rutas de las carteras cargadas
+    def obtenerCarteras(self):
+        return sorted(self.carteras)
+
+    #Método que olvida las métricas de riesgo de las simulaciones hechas en peticiones anteriores, que cada cartera va acumulando para su informe. Así el
+    #informe de una petición solo incluye las simulaciones de esa petición, igual que al ejecutar el programa desde la línea de comandos
+    def reiniciarResumenesRiesgo(self):
+        for _, cartera in self.carteras.values():
+            cartera.resumenesRiesgo = {}
+
+#Función que importa de antemano las librerías de gráficas, que son las que más tardan en importarse, para que ninguna petición tenga que esperar por ellas
+def precargar_librerias():
+    configurar_graficas("png")
+    get_pyplot()
+    importlib.import_module("seaborn")
+    configurar_graficas("none")
+
+#Función que ejecuta una petición, devolviendo el código de salida (0 si ha ido bien, como un programa) y todo lo que se ha escrito por pantalla
+#Peticion: Diccionario con el programa a ejecutar ("monteCarlo", "optimizador", "backtest", "informe" o "carteras"), sus argumentos y el directorio desde el que se
+#ejecuta, respecto del que se interpretan las rutas y los nombres de las carteras
+def ejecutar_peticion(cache, peticion):
+    programa = peticion.get("programa")
+    argumentos = [str(argumento) for argumento in peticion.get("argumentos", [])]
+    salida = io.StringIO()
+    codigo = 0
+    directorioServidor = os.getcwd()
+    cache.reiniciarResumenesRiesgo()
+    try:
+        with contextlib.redirect_stdout(salida), contextlib.redirect_stderr(salida):
+            os.chdir(peticion.get("directorio", directorioServidor))
+            if programa in programasServidor:
+                #El servidor no puede mostrar gráficas en ventanas, así que por defecto no se generan
+                if not ("--graficas" in argumentos):
+                    argumentos += ["--graficas", "none"]
+                elif [formato.lower() for formato in argumentos[argumentos.index("--graficas") + 1:][:1]] == ["pantalla"]:
+                    print("El servidor no puede mostrar gráficas en pantalla, deben exportarse a png o svg, o no generarse (none)")
+                    return 1, salida.getvalue()
+                programasServidor[programa](argumentos, cache.obtenerCartera)
+            elif programa == "informe":
+                cartera = cache.obtenerCartera(argumentos[0]) if argumentos else None
+                if cartera is None:
+                    print("Ha habido un error al cargar la cartera solicitada")
+                    return 1, salida.getvalue()
+                cartera.report()
+            elif programa == "carteras":
+                for ruta in cache.obtenerCarteras():
+                    print(ruta)
+            else:
+                print("El programa debe ser monteCarlo, optimizador, backtest, informe o carteras")
+                codigo = 1
+    except SystemExit as e:
+        #Los programas terminan con sys.exit cuando los argumentos no son válidos
+        codigo = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except Exception as e:
+        print("Error al ejecutar la petición: " + str(e), file=salida)
+        codigo = 1
+    finally:
+        os.chdir(directorioServidor)
+        #Si el programa ha terminado antes de guardar su perfil, lo desactivamos para que no afecte a las siguientes peticiones
+        cancelar_perfil()
+    return codigo, salida.getvalue()
+
+#Función que construye la clase que atiende las peticiones HTTP, con acceso a la caché de carteras del servidor. Las peticiones se atienden de una en una,
+#ya que cada una cambia el directorio actual y redirige la salida del proceso. Cada simulación puede repartirse igualmente entre varios procesos con --workers
+def get_manejador(cache):
+    class ManejadorPeticiones(BaseHTTPRequestHandler):
+        #Las peticiones se envían por POST con un json en el cuerpo, y la respuesta es otro json con el código de salida y lo escrito por pantalla
+        def do_POST(self):
+            try:
+                peticion = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8"))
+                codigo, salida = ejecutar_peticion(cache, peticion)
+            except Exception as e:
+                codigo, salida = 1, "La petición no es válida\n"
+            respuesta = json.dumps({"codigo": codigo, "salida": salida}, ensure_ascii=False).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(respuesta)))
+            self.end_headers()
+            self.wfile.write(respuesta)
+
+    return ManejadorPeticiones
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--direccion', type=str, required=False, default=DIRECCION_SERVIDOR, help='Dirección en la que escucha el servidor')
+    parser.add_argument('--puerto', type=int, required=False, default=PUERTO_SERVIDOR, help='Puerto en el que escucha el servidor')
+    args = parser.parse_args()
+
+    #El puerto debe ser válido
+    if args.puerto <= 0 or args.puerto > 65535:
+        print("El puerto debe estar entre 1 y 65535")
+        sys.exit(1)
+
+    precargar_librerias()
+    servidor = HTTPServer((args.direccion, args.puerto), get_manejador(CacheCarteras()))
+    print("Servidor escuchando en http://" + args.direccion + ":" + str(args.puerto))
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        servidor.server_close()
@@ -0,0 +1,489 @@
+import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+#Número de simulaciones que se generan de una vez por defecto. Con 252 días y 20 activos, un bloque de 1024 simulaciones ocupa unos 40 MB en float64. Es
+#potencia de 2 para que sirva también con el muestreo sobol
+TAMANIO_BLOQUE = 1024
+#Modelos de generación de retornos disponibles: normal genera retornos normales con las medias, desviaciones típicas y correlaciones dadas, bootstrap remuestrea
+#días históricos de forma independiente y bloques remuestrea tramos de días históricos consecutivos, de longitud aleatoria (bootstrap estacionario)
+modelosSimulacion = ["normal", "bootstrap", "bloques"]
+#Longitud media por defecto de los tramos de días consecutivos del bootstrap estacionario
+LONGITUD_BLOQUE = 20
+#Precisiones con las que pueden generarse las simulaciones. En float32 cada bloque ocupa la mitad y los números aleatorios se generan más rápido, a cambio de
+#unos 7 dígitos significativos en lugar de 16 (ver la prueba precision de benchmark.py)
+precisionesSimulacion = ["float64", "float32"]
+#Formas de obtener las normales estándar del modelo normal, para reducir la varianza de las estimaciones:
+#Aleatorio: Normales pseudoaleatorias independientes
+#Antitetico: La segunda mitad de cada bloque son las normales de la primera mitad cambiadas de signo, de forma que cada simulación tiene su opuesta y los
+#errores de las estimaciones que dependen de forma monótona de los retornos se compensan
+#Sobol: Secuencia de Sobol aleatorizada (scrambled), una por bloque, transformada con la inversa de la función de distribución normal. Sus puntos cubren
+#el espacio de forma más uniforme que los aleatorios, por lo que los errores decrecen más deprisa. Solo mantiene su equilibrio con un número de puntos
+#potencia de 2, así que con este muestreo el tamaño de bloque se redondea a una potencia de 2 (ver get_tamanio_bloque_muestreo)
+muestreosSimulacion = ["aleatorio", "antitetico", "sobol"]
+#Dimensión máxima de las secuencias de Sobol de scipy. Cada simulación usa una dimensión por día y activo
+MAX_DIMENSION_SOBOL = 21201
+
+#Buffers de cada proceso que reutilizan los bloques de simulaciones, identificados por su nombre y su tipo. Al reutilizarlos, generar un bloque no reserva
+#memoria nueva salvo que sea mayor que los anteriores
+buffersProceso = {}
+
+#Función que devuelve un array de las dimensiones y el tipo pedidos. Si se pide reutilizarlo, es una vista sobre el buffer del proceso con ese nombre y tipo,
+#que solo se amplía cuando no es suficientemente grande, por lo que su contenido deja de ser válido al generar el siguiente bloque
+#Nombre: Nombre del buffer, para que los distintos arrays de un mismo bloque no compartan memoria
+#Forma: Dimensiones del array
+#Precision: Tipo del array (ver precisionesSimulacion)
+#Reutilizar: Si está a False se devuelve un array nuevo
+def get_buffer(nombre, forma, precision="float64", reutilizar=False):
+    if not reutilizar:
+        return np.empty(forma, dtype=precision)
+    tamanio = int(np.prod(forma))
+    clave = (nombre, np.dtype(precision).str)
+    if not (clave in buffersProceso) or buffersProceso[clave].shape[0] < tamanio:
+        buffersProceso[clave] = np.empty(tamanio, dtype=precision)
+    return buffersProceso[clave][:tamanio].reshape(forma)
+
+#Función para obtener una matriz L tal que L @ L.T es la matriz de covarianzas construida a partir de la matriz de correlación y las desviaciones típicas dadas
+#MatrizCorrelacion: Matriz de correlación de los retornos logarítmicos de los activos
+#Desviaciones_Tipicas: Lista de desviaciones típicas de los retornos logarítmicos de cada activo
+def get_factor_covarianzas(matrizCorrelacion, desviaciones_tipicas):
+    desviaciones = np.asarray(desviaciones_tipicas, dtype=float)
+    matrizCovarianzas = np.asarray(matrizCorrelacion, dtype=float) * np.outer(desviaciones, desviaciones)
+    try:
+        return np.linalg.cholesky(matrizCovarianzas)
+    except np.linalg.LinAlgError:
+        #Si la matriz no es definida positiva (por ejemplo, si hay activos perfectamente correlados) usamos su descomposición espectral,
+        #anulando los autovalores negativos que puedan aparecer por errores de redondeo
+        autovalores, autovectores = np.linalg.eigh(matrizCovarianzas)
+        return autovectores * np.sqrt(np.clip(autovalores, 0, None))
+
+#Función para obtener una secuencia de semillas de numpy a partir de la semilla pasada por el usuario, que puede ser un entero, None (en cuyo caso se toma
+#entropía del sistema) o directamente otra secuencia de semillas
+def get_secuencia_semillas(semilla=None):
+    if isinstance(semilla, np.random.SeedSequence):
+        return semilla
+    return np.random.SeedSequence(semilla)
+
+#Función para obtener una semilla independiente para cada uno de los bloques de una simulación. Como la semilla de cada bloque depende solo de su posición,
+#los resultados para una misma semilla son idénticos independientemente del número de procesos entre los que se repartan los bloques
+def get_semillas_bloques(semilla, numSimulaciones, tamanioBloque):
+    numBloques = -(-numSimulaciones // tamanioBloque)
+    return get_secuencia_semillas(semilla).spawn(numBloques)
+
+#Función que rellena un array de dimensiones (simulaciones, ...) con normales estándar, obtenidas según el muestreo indicado (ver muestreosSimulacion)
+#Generador: Generador de números aleatorios del bloque, del que se obtienen también la aleatorización de la secuencia de Sobol
+#Normales: Array a rellenar, contiguo, que se devuelve
+def get_normales(generador, normales, muestreo="aleatorio"):
+    if muestreo == "antitetico":
+        mitad = -(-normales.shape[0] // 2)
+        generador.standard_normal(out=normales[:mitad], dtype=normales.dtype)
+        np.negative(normales[:normales.shape[0] - mitad], out=normales[mitad:])
+    elif muestreo == "sobol":
+        #Se importa aquí porque scipy.stats tarda en importarse, y solo hace falta con este muestreo
+        from scipy.stats import qmc
+        from scipy.special import ndtri
+        dimension = int(np.prod(normales.shape[1:]))
+        try:
+            sobol = qmc.Sobol(dimension, scramble=True, rng=generador)
+        except TypeError:
+            #Versiones de scipy anteriores a la 1.15
+            sobol = qmc.Sobol(dimension, scramble=True, seed=generador)
+        #Si el bloque no tiene un número de puntos potencia de 2 (por ejemplo, el último cuando el número de simulaciones no es múltiplo del tamaño de
+        #bloque) scipy avisa de que se pierde el equilibrio de la secuencia
+        uniformes = sobol.random(normales.shape[0])
+        #Evitamos los extremos, en los que la inversa de la normal es infinita
+        np.clip(uniformes, np.finfo(float).eps, 1 - np.finfo(float).eps, out=uniformes)
+        normales.reshape(normales.shape[0], dimension)[...] = ndtri(uniformes)
+    else:
+        generador.standard_normal(out=normales, dtype=normales.dtype)
+    return normales
+
+#Función que devuelve el tamaño de bloque con el que se generan las simulaciones de un muestreo. Con sobol se redondea a la potencia de 2 más cercana,
+#ya que cada bloque es una secuencia independiente y partirla en bloques de otro tamaño rompe su equilibrio (con bloques de 1000 en lugar de 1024, la
+#reducción de varianza del valor final medio con 2048 simulaciones cae unas 4 veces)
+def get_tamanio_bloque_muestreo(tamanioBloque, muestreo="aleatorio"):
+    if muestreo != "sobol":
+        return tamanioBloque
+    inferior = 1 << (int(tamanioBloque).bit_length() - 1)
+    return inferior if tamanioBloque - inferior <= 2 * inferior - tamanioBloque else 2 * inferior
+
+#Función que devuelve el valor esperado teórico del valor final de una cartera sin rebalanceos cuyos activos siguen el modelo normal. Como el valor final de
+#cada activo sigue una lognormal, su media es valorInicial·exp(numDias·(media + desviación²/2)), y la de la cartera es la suma de las de sus activos, sean
+#cuales sean las correlaciones. Es la media conocida que se usa como variable de control
+#ValoresIniciales: Valor invertido en cada activo el día 0
+def get_media_valor_final(medias, desviaciones_tipicas, valoresIniciales, numDias):
+    medias = np.asarray(medias, dtype=float)
+    desviaciones = np.asarray(desviaciones_tipicas, dtype=float)
+    return float(np.sum(np.asarray(valoresIniciales, dtype=float) * np.exp(numDias * (medias + desviaciones ** 2 / 2))))
+
+#Función que genera un bloque de simulaciones conjuntas de todos los activos de una cartera. Recibe una única tupla de parámetros para poder ser
+#ejecutada en otro proceso. Los números aleatorios se generan directamente sobre un buffer de la precisión pedida, y el resto de operaciones se hacen sobre
+#otros dos, sin reservar ningún array intermedio
+def simular_bloque_cartera(tarea):
+    medias, factor, valoresIniciales, numSimulacionesBloque, numDias, semillaBloque, precision, reutilizar, muestreo = tarea
+    generador = np.random.default_rng(semillaBloque)
+    normales = get_buffer("normales", (numSimulacionesBloque, numDias, medias.shape[0]), precision, reutilizar)
+    get_normales(generador, normales, muestreo)
+    #Correlamos normales estándar independientes multiplicando por el factor de la matriz de covarianzas
+    returns = get_buffer("retornos", normales.shape, precision, reutilizar)
+    np.matmul(normales, factor.T, out=returns)
+    returns += medias
+    #Los retornos logarítmicos son aditivos, por lo que acumulamos a lo largo de los días y exponenciamos, todo sobre el mismo array
+    np.cumsum(returns, axis=1, out=returns)
+    np.exp(returns, out=returns)
+    returns *= valoresIniciales
+    return returns, returns.sum(axis=2, out=get_buffer("cartera", normales.shape[:2], precision, reutilizar))
+
+#Función que genera un bloque de simulaciones de los valores de un activo. Recibe una única tupla de parámetros para poder ser ejecutada en otro proceso
+#Todas las operaciones se hacen sobre el mismo buffer, de la precisión pedida, en el que se generan los números aleatorios
+def simular_bloque_valores(tarea):
+    media, desviacion_tipica, numSimulacionesBloque, numDias, valorInicial, semillaBloque, precision, reutilizar, muestreo = tarea
+    generador = np.random.default_rng(semillaBloque)
+    returns = get_buffer("valores", (numSimulacionesBloque, numDias), precision, reutilizar)
+    #Escalar y desplazar las normales estándar da los mismos números que generador.normal con la misma semilla
+    get_normales(generador, returns, muestreo)
+    returns *= desviacion_tipica
+    returns += media
+    np.cumsum(returns, axis=1, out=returns)
+    np.exp(returns, out=returns)
+    returns *= valorInicial
+    return returns
+
+#Función que genera las posiciones de los días históricos que se usan en cada día de cada simulación, de dimensiones (simulaciones, días)
+#NumHistoricos: Número de días históricos disponibles
+#LongitudBloque: Si es None, cada día se elige de forma independiente (bootstrap). Si no, se sigue el bootstrap estacionario de Politis y Romano: cada día
+#comienza un tramo nuevo, en una posición aleatoria, con probabilidad 1/longitudBloque, y si no se toma el día histórico siguiente al anterior (volviendo al
+#principio al llegar al final). Los tramos se obtienen a la vez para todas las simulaciones, localizando con un máximo acumulado el comienzo del tramo de
+#cada día
+def get_indices_historicos(generador, numSimulaciones, numDias, numHistoricos, longitudBloque=None):
+    if longitudBloque is None:
+        return generador.integers(0, numHistoricos, (numSimulaciones, numDias))
+
+    dias = np.arange(numDias)
+    nuevos = generador.random((numSimulaciones, numDias)) < 1 / longitudBloque
+    nuevos[:, 0] = True
+    comienzos = np.maximum.accumulate(np.where(nuevos, dias, 0), axis=1)
+    posicionesIniciales = generador.integers(0, numHistoricos, (numSimulaciones, numDias))
+    indices = np.take_along_axis(posicionesIniciales, comienzos, axis=1)
+    indices += dias - comienzos
+    indices %= numHistoricos
+    return indices
+
+#Función que genera un bloque de simulaciones conjuntas de todos los activos de una cartera remuestreando filas completas (todos los activos a la vez) de los
+#retornos históricos, de forma que se mantienen las correlaciones entre activos, así como la asimetría y la curtosis de cada uno. Recibe una única tupla de
+#parámetros para poder ser ejecutada en otro proceso
+def simular_bloque_historico(tarea):
+    returnsHistoricos, valoresIniciales, numSimulacionesBloque, numDias, longitudBloque, semillaBloque, precision, reutilizar = tarea
+    generador = np.random.default_rng(semillaBloque)
+    indices = get_indices_historicos(generador, numSimulacionesBloque, numDias, returnsHistoricos.shape[0], longitudBloque)
+    #Con una única indexación obtenemos el tensor de retornos de dimensiones (simulaciones, días, activos)
+    returns = get_buffer("retornos", indices.shape + returnsHistoricos.shape[1:], precision, reutilizar)
+    np.take(returnsHistoricos, indices, axis=0, out=returns)
+    np.cumsum(returns, axis=1, out=returns)
+    np.exp(returns, out=returns)
+    returns *= valoresIniciales
+    return returns, returns.sum(axis=2, out=get_buffer("cartera", indices.shape, precision, reutilizar))
+
+#Función generadora que ejecuta una función sobre una lista de tareas, devolviendo los resultados en el mismo orden que las tareas
+#Si workers es mayor que 1, las tareas se reparten entre un conjunto de procesos. Para que la memoria no crezca con el número de tareas, solo se mantienen
+#en vuelo dos tareas por proceso, enviando una nueva cada vez que se consume un resultado
+def get_resultados_paralelos(funcion, tareas, workers=1):
+    if workers <= 1:
+        for tarea in tareas:
+            yield funcion(tarea)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as ejecutor:
+        pendientes = deque()
+        tareas = iter(tareas)
+        for tarea in tareas:
+            pendientes.append(ejecutor.submit(funcion, tarea))
+            if len(pendientes) >= 2 * workers:
+                break
+        while pendientes:
+            resultado = pendientes.popleft().result()
+            tarea = next(tareas, None)
+            if tarea is not None:
+                pendientes.append(ejecutor.submit(funcion, tarea))
+            yield resultado
+
+#Función generadora que realiza una simulación de Monte Carlo conjunta de todos los activos de una cartera, por bloques de simulaciones
+#Los retornos logarítmicos de los activos se generan correlados, siguiendo una normal multivariante, y se devuelven en un tensor de dimensiones
+#(simulaciones, días, activos). Se supone que la cartera se construye el día 0 con los pesos dados y que después no se rebalancea, por lo que los pesos
+#de cada activo van variando a lo largo de cada simulación
+#Medias: Lista de medias de los retornos logarítmicos de cada activo
+#Desviaciones_Tipicas: Lista de desviaciones típicas de los retornos logarítmicos de cada activo
+#MatrizCorrelacion: Matriz de correlación de los retornos logarítmicos de los activos
+#Pesos: Pesos iniciales de cada activo en la cartera
+#NumSimulaciones: Número de simulaciones de Monte Carlo a realizar
+#NumDias: Número de días para los que se va a realizar cada simulación
+#ValorInicial: Valor inicial de la cartera
+#TamanioBloque: Número máximo de simulaciones que se generan a la vez, que es lo que determina la memoria necesaria
+#Semilla: Semilla para la generación de números aleatorios. Si no se pasa ninguna, cada ejecución dará resultados distintos
+#Workers: Número de procesos entre los que se reparten los bloques
+#Precision: Tipo de los valores simulados (ver precisionesSimulacion)
+#ReutilizarBuffers: Si está a True, todos los bloques de cada proceso se generan sobre los mismos buffers (ver get_buffer), por lo que cada bloque debe
+#consumirse (o copiarse) antes de pedir el siguiente. Con varios procesos los bloques llegan siempre copiados, así que los buffers se reutilizan en cualquier caso
+#Muestreo: Forma de obtener las normales estándar (ver muestreosSimulacion)
+#Por cada bloque se devuelve una tupla con los valores de cada activo, de dimensiones (simulaciones, días, activos), y los valores de la cartera,
+#de dimensiones (simulaciones, días)
+def get_bloques_simulacion_cartera(medias, desviaciones_tipicas, matrizCorrelacion, pesos, numSimulaciones, numDias, valorInicial, tamanioBloque=TAMANIO_BLOQUE,
+                                   semilla=None, workers=1, precision="float64", reutilizarBuffers=False, muestreo="aleatorio"):
+    #Los parámetros se pasan a la precisión de la simulación, para que ninguna operación la cambie
+    medias = np.asarray(medias, dtype=precision)
+    factor = get_factor_covarianzas(matrizCorrelacion, desviaciones_tipicas).astype(precision)
+    #Valor invertido en cada activo el día 0
+    valoresIniciales = (valorInicial * np.asarray(pesos, dtype=float)).astype(precision)
+
+    tamanioBloque = get_tamanio_bloque_muestreo(tamanioBloque, muestreo)
+    semillasBloques = get_semillas_bloques(semilla, numSimulaciones, tamanioBloque)
+    tareas = ((medias, factor, valoresIniciales, min(tamanioBloque, numSimulaciones - i*tamanioBloque), numDias, semillaBloque, precision,
+               reutilizarBuffers or workers > 1, muestreo)
+              for i, semillaBloque in enumerate(semillasBloques))
+    yield from get_resultados_paralelos(simular_bloque_cartera, tareas, workers)
+
+#Función generadora que realiza una simulación de Monte Carlo conjunta de todos los activos de una cartera por bloques de simulaciones, remuestreando sus
+#retornos logarítmicos históricos en lugar de generarlos con una normal. Devuelve los bloques igual que get_bloques_simulacion_cartera
+#ReturnsHistoricos: Matriz de retornos logarítmicos históricos alineados, de dimensiones (días históricos, activos)
+#LongitudBloque: Longitud media de los tramos de días consecutivos, o None para remuestrear cada día de forma independiente (ver get_indices_historicos)
+#El resto de parámetros son los mismos que los de get_bloques_simulacion_cartera
+def get_bloques_simulacion_historica(returnsHistoricos, pesos, numSimulaciones, numDias, valorInicial, longitudBloque=None, tamanioBloque=TAMANIO_BLOQUE,
+                                     semilla=None, workers=1, precision="float64", reutilizarBuffers=False):
+    returnsHistoricos = np.asarray(returnsHistoricos, dtype=float)
+    #Descartamos los días en los que falte el retorno de algún activo (los anteriores al comienzo de alguna serie, con la unión o los días hábiles), de
+    #forma que solo se remuestrean días en los que cotizan todos
+    returnsHistoricos = returnsHistoricos[~np.isnan(returnsHistoricos).any(axis=1)].astype(precision)
+    valoresIniciales = (valorInicial * np.asarray(pesos, dtype=float)).astype(precision)
+
+    semillasBloques = get_semillas_bloques(semilla, numSimulaciones, tamanioBloque)
+    tareas = ((returnsHistoricos, valoresIniciales, min(tamanioBloque, numSimulaciones - i*tamanioBloque), numDias, longitudBloque, semillaBloque, precision,
+               reutilizarBuffers or workers > 1)
+              for i, semillaBloque in enumerate(semillasBloques))
+    yield from get_resultados_paralelos(simular_bloque_historico, tareas, workers)
+
+#Función que junta los bloques de una simulación conjunta de todos los activos de una cartera, devolviendo los valores de la cartera, de
+#dimensiones (simulaciones, días), y los pesos de cada activo al final de cada simulación, de dimensiones (simulaciones, activos)
+#Bloques: Iterable de tuplas (valores de cada activo, valores de la cartera), como las de get_bloques_simulacion_cartera
+#Precision: Tipo de los valores de la cartera devueltos
+#ValoresActivos: Matriz de dimensiones (activos, simulaciones, días) en la que se copian también los valores de cada activo dentro de la cartera, o None si
+#solo se quieren los de la cartera. Se guarda con los activos en la primera dimensión para que las simulaciones de cada activo sean contiguas
+def juntar_bloques_cartera(bloques, numSimulaciones, numDias, numActivos, precision="float64", valoresActivos=None):
+    try:
+        valoresCartera = np.empty((numSimulaciones, numDias), dtype=precision)
+        pesosFinales = np.empty((numSimulaciones, numActivos))
+        fila = 0
+        for valoresActivosBloque, valoresCarteraBloque in bloques:
+            numSimulacionesBloque = valoresCarteraBloque.shape[0]
+            valoresCartera[fila:fila + numSimulacionesBloque] = valoresCarteraBloque
+            pesosFinales[fila:fila + numSimulacionesBloque] = valoresActivosBloque[:, -1, :] / valoresCarteraBloque[:, -1, np.newaxis]
+            if valoresActivos is not None:
+                valoresActivos[:, fila:fila + numSimulacionesBloque] = np.moveaxis(valoresActivosBloque, 2, 0)
+            fila += numSimulacionesBloque
+
+        return valoresCartera, pesosFinales
+    except Exception as e:
+        print("Error al realizar simulación de la cartera")
+        return np.array([]), np.array([])
+
+#Función generadora que recorre los bloques de una simulación conjunta de todos los activos de una cartera devolviendo solo los valores de la cartera, para
+#resumirlos como los de cualquier otra simulación, y que acumula a la vez lo que se quiere conservar de los valores de cada activo, sin juntar los bloques
+#Bloques: Iterable de tuplas (valores de cada activo, valores de la cartera), como las de get_bloques_simulacion_cartera
+#EstadisticasPesos: Instancia de EstadisticasOnline con un elemento por activo, en la que se acumulan los pesos de cada activo al final de cada simulación
+#EstadisticasActivos: Lista con una instancia de EstadisticasOnline por activo, en la que se acumulan los estadísticos por día de sus valores, o None
+#MuestrasActivos: Lista con una lista por activo, a la que se añaden sus valores en las primeras numMuestras simulaciones (las mismas que se guardan de la
+#cartera), o None
+def separar_bloques_cartera(bloques, estadisticasPesos, estadisticasActivos=None, muestrasActivos=None, numMuestras=0):
+    numMuestrasGuardadas = 0
+    for valoresActivosBloque, valoresCarteraBloque in bloques:
+        estadisticasPesos.actualizar(valoresActivosBloque[:, -1, :] / valoresCarteraBloque[:, -1, np.newaxis])
+        numMuestrasBloque = min(max(numMuestras - numMuestrasGuardadas, 0), valoresCarteraBloque.shape[0])
+        if estadisticasActivos is not None:
+            for i, estadisticas in enumerate(estadisticasActivos):
+                estadisticas.actualizar(valoresActivosBloque[:, :, i])
+                if muestrasActivos is not None and numMuestrasBloque > 0:
+                    muestrasActivos[i].append(valoresActivosBloque[:numMuestrasBloque, :, i].copy())
+        numMuestrasGuardadas += numMuestrasBloque
+        #El bloque se consume antes de pedir el siguiente, por lo que los buffers pueden seguir reutilizándose
+        yield valoresCarteraBloque
+
+#Función que realiza una simulación de Monte Carlo conjunta de todos los activos de una cartera, devolviendo únicamente los valores de la cartera, de
+#dimensiones (simulaciones, días), y los pesos de cada activo al final de cada simulación, de dimensiones (simulaciones, activos). Los parámetros son los
+#mismos que los de get_bloques_simulacion_cartera
+def get_simulacion_cartera(medias, desviaciones_tipicas, matrizCorrelacion, pesos, numSimulaciones, numDias, valorInicial, tamanioBloque=TAMANIO_BLOQUE,
+                           semilla=None, workers=1, precision="float64", muestreo="aleatorio"):
+    #Cada bloque se copia en la matriz final nada más generarse, así que pueden reutilizarse los buffers
+    bloques = get_bloques_simulacion_cartera(medias, desviaciones_tipicas, matrizCorrelacion, pesos, numSimulaciones, numDias, valorInicial, tamanioBloque,
+                                             semilla, workers, precision, True, muestreo)
+    return juntar_bloques_cartera(bloques, numSimulaciones, numDias, len(pesos), precision)
+
+#Función generadora que realiza una simulación de Monte Carlo de los valores de un activo por bloques de simulaciones, de forma que nunca se tiene en memoria
+#más de un bloque de dimensiones (tamanioBloque, numDias) por proceso
+#Media: Es la media de la distribución normal sobre la que se van a generar los retornos logarítmicos
+#Desviacion_Tipica: Es la desviación típica de dicha distribución
+#NumSimulaciones: Número de simulaciones de Monte Carlo a realizar
+#NumDias: Número de días para los que se va a realizar cada simulación
+#ValorInicial: Valor de partida para todas las simulaciones
+#TamanioBloque: Número máximo de simulaciones que se generan a la vez
+#Semilla: Semilla para la generación de números aleatorios. Si no se pasa ninguna, cada ejecución dará resultados distintos
+#Workers: Número de procesos entre los que se reparten los bloques
+#Precision, ReutilizarBuffers, Muestreo: Tipo de los valores simulados, si los bloques reutilizan los mismos buffers y forma de obtener las normales
+#estándar (ver get_bloques_simulacion_cartera)
+def get_bloques_simulacion_valores(media, desviacion_tipica, numSimulaciones, numDias, valorInicial, tamanioBloque=TAMANIO_BLOQUE, semilla=None, workers=1,
+                                   precision="float64", reutilizarBuffers=False, muestreo="aleatorio"):
+    tamanioBloque = get_tamanio_bloque_muestreo(tamanioBloque, muestreo)
+    semillasBloques = get_semillas_bloques(semilla, numSimulaciones, tamanioBloque)
+    tareas = ((media, desviacion_tipica, min(tamanioBloque, numSimulaciones - i*tamanioBloque), numDias, valorInicial, semillaBloque, precision,
+               reutilizarBuffers or workers > 1, muestreo)
+              for i, semillaBloque in enumerate(semillasBloques))
+    yield from get_resultados_paralelos(simular_bloque_valores, tareas, workers)
+
+#Función que realiza una simulación de Monte Carlo de los valores de un activo por bloques, juntándolos en una única matriz de dimensiones
+#(simulaciones, días). Los parámetros son los mismos que los de get_bloques_simulacion_valores
+def get_simulacion_valores_bloques(media, desviacion_tipica, numSimulaciones, numDias, valorInicial, tamanioBloque=TAMANIO_BLOQUE, semilla=None, workers=1,
+                                   precision="float64", muestreo="aleatorio"):
+    bloques = get_bloques_simulacion_valores(media, desviacion_tipica, numSimulaciones, numDias, valorInicial, tamanioBloque, semilla, workers, precision, True,
+                                             muestreo)
+    return juntar_bloques_valores(bloques, numSimulaciones, numDias, precision)
+
+#Función que junta los bloques de una simulación de los valores de un activo en una única matriz de dimensiones (simulaciones, días)
+#Bloques: Iterable de bloques de simulaciones, de dimensiones (simulaciones, días)
+#Precision: Tipo de la matriz devuelta
+def juntar_bloques_valores(bloques, numSimulaciones, numDias, precision="float64"):
+    try:
+        precios_simulados = np.empty((numSimulaciones, numDias), dtype=precision)
+        fila = 0
+        for bloque in bloques:
+            precios_simulados[fila:fila + bloque.shape[0]] = bloque
+            fila += bloque.shape[0]
+
+        return precios_simulados
+    except Exception as e:
+        print("Error al realizar simulación de precios")
+        return np.array([])
+
+@dataclass
+class EstadisticasOnline:
+    #Esta clase va acumulando, bloque a bloque, estadísticos por día de un conjunto de simulaciones sin necesidad de guardarlas todas
+    #Los atributos van a ser:
+    #NumSimulaciones: Número de simulaciones acumuladas hasta el momento
+    #Media: Media de los valores de cada día
+    #M2: Suma de los cuadrados de las desviaciones respecto a la media de cada día (a partir de ella se obtiene la varianza)
+    #Minimo: Valor mínimo de cada día
+    #Maximo: Valor máximo de cada día
+    #NumIntervalos: Número de intervalos del histograma de cada día que se usa para aproximar los percentiles
+    #LimiteInferior: Extremo inferior del histograma de cada día, en escala logarítmica
+    #AnchoIntervalo: Ancho de los intervalos del histograma de cada día, en escala logarítmica
+    #Histograma: Matriz (días, intervalos) con el número de simulaciones que caen en cada intervalo del histograma de cada día
+
+    numSimulaciones: int
+    media: np.array
+    m2: np.array
+    minimo: np.array
+    maximo: np.array
+    numIntervalos: int
+    limiteInferior: np.array
+    anchoIntervalo: np.array
+    histograma: np.array
+
+    def __init__(self, numDias, numIntervalos=4096):
+        self.numSimulaciones = 0
+        self.media = np.zeros(numDias)
+        self.m2 = np.zeros(numDias)
+        self.minimo = np.full(numDias, np.inf)
+        self.maximo = np.full(numDias, -np.inf)
+        self.numIntervalos = numIntervalos
+        self.limiteInferior = None
+        self.anchoIntervalo = None
+        self.histograma = np.zeros((numDias, numIntervalos), dtype=np.int64)
+
+    #Incorpora un bloque de simulaciones, de dimensiones (simulaciones, días), a los estadísticos acumulados
+    def actualizar(self, bloque):
+        numSimulacionesBloque = bloque.shape[0]
+        if numSimulacionesBloque == 0:
+            return
+
+        #Combinamos media y varianza del bloque con las acumuladas (algoritmo de Chan et al.)
+        mediaBloque = bloque.mean(axis=0)
+        m2Bloque = ((bloque - mediaBloque) ** 2).sum(axis=0)
+        total = self.numSimulaciones + numSimulacionesBloque
+        delta = mediaBloque - self.media
+        self.media += delta * numSimulacionesBloque / total
+        self.m2 += m2Bloque + delta ** 2 * self.numSimulaciones * numSimulacionesBloque / total
+        self.numSimulaciones = total
+
+        np.minimum(self.minimo, bloque.min(axis=0), out=self.minimo)
+        np.maximum(self.maximo, bloque.max(axis=0), out=self.maximo)
+
+        #Como los valores simulados siguen una distribución lognormal, el histograma se construye sobre sus logaritmos. Su rango se fija con el primer
+        #bloque, ampliándolo por ambos lados tanto como su amplitud, y los valores que queden fuera se acumulan en los intervalos de los extremos
+        logBloque = np.log(np.maximum(bloque, np.finfo(float).tiny))
+        if self.limiteInferior is None:
+            minimoLog = logBloque.min(axis=0)
+            amplitud = np.maximum(logBloque.max(axis=0) - minimoLog, 1e-6)
+            self.limiteInferior = minimoLog - amplitud
+            self.anchoIntervalo = 3 * amplitud / self.numIntervalos
+
+        intervalos = ((logBloque - self.limiteInferior) / self.anchoIntervalo).astype(np.int64)
+        np.clip(intervalos, 0, self.numIntervalos - 1, out=intervalos)
+        #Desplazamos el intervalo de cada día para poder contar todos los días de una sola vez
+        intervalos += np.arange(self.histograma.shape[0]) * self.numIntervalos
+        self.histograma += np.bincount(intervalos.ravel(), minlength=self.histograma.size).reshape(self.histograma.shape)
+
+    #Obtención del número de simulaciones acumuladas
+    def obtenerNumSimulaciones(self):
+        return self.numSimulaciones
+
+    #Obtención de la media de cada día
+    def obtenerMedia(self):
+        return self.media
+
+    #Obtención de la desviación típica de cada día
+    def obtenerDesviacionTipica(self):
+        if self.numSimulaciones == 0:
+            return np.full(self.media.shape, np.nan)
+        return np.sqrt(self.m2 / self.numSimulaciones)
+
+    #Obtención del mínimo de cada día
+    def obtenerMinimo(self):
+        return self.minimo
+
+    #Obtención del máximo de cada día
+    def obtenerMaximo(self):
+        return self.maximo
+
+    #Obtención aproximada del percentil p (entre 0 y 100) de cada día, interpolando linealmente dentro del intervalo del histograma en el que cae
+    def obtenerPercentil(self, p):
+        if self.numSimulaciones == 0:
+            return np.full(self.media.shape, np.nan)
+
+        acumulado = np.cumsum(self.histograma, axis=1)
+        objetivo = p / 100 * self.numSimulaciones
+        intervalo = np.minimum((acumulado < objetivo).sum(axis=1), self.numIntervalos - 1)
+        dias = np.arange(self.histograma.shape[0])
+        anterior = np.where(intervalo > 0, acumulado[dias, np.maximum(intervalo - 1, 0)], 0)
+        fraccion = (objetivo - anterior) / np.maximum(self.histograma[dias, intervalo], 1)
+        percentil = np.exp(self.limiteInferior + (intervalo + np.clip(fraccion, 0, 1)) * self.anchoIntervalo)
+        #Los intervalos de los extremos pueden contener valores fuera de rango, pero nunca más allá del mínimo y máximo exactos
+        return np.clip(percentil, self.minimo, self.maximo)
+
+#Función que recorre bloques de simulaciones, de dimensiones (simulaciones, días), acumulando sus estadísticos y guardando una muestra de ellas
+#Bloques: Iterable de bloques de simulaciones
+#NumDias: Número de días de cada simulación
+#NumMuestras: Número de simulaciones que se quieren conservar completas. Se conservan las primeras, que al ser independientes forman una muestra aleatoria
+#Riesgo: Si se pasa una instancia de RiesgoSimulacion (ver riesgo.py), también se acumulan en ella las métricas de riesgo de cada bloque
+#Devuelve una tupla con las estadísticas acumuladas y la muestra de simulaciones, de dimensiones (numMuestras, días)
+def get_resumen_simulacion(bloques, numDias, numMuestras=0, riesgo=None):
+    estadisticas = EstadisticasOnline(numDias)
+    muestras = []
+    numMuestrasGuardadas = 0
+    for bloque in bloques:
+        estadisticas.actualizar(bloque)
+        if riesgo is not None:
+            riesgo.actualizar(bloque)
+        if numMuestrasGuardadas < numMuestras:
+            muestras.append(bloque[:numMuestras - numMuestrasGuardadas].copy())
+            numMuestrasGuardadas += muestras[-1].shape[0]
+
+    muestra = np.concatenate(muestras) if muestras else np.empty((0, numDias))
+    return estadisticas, muestra
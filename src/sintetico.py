@@ -0,0 +1,82 @@
+import argparse
+import sys
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from data_utils import exists_route
+
+#Nombre del "API" con el que se identifican las series sintéticas en el nombre de sus CSVs
+API_SINTETICO = "sintetico"
+#Número aproximado de sesiones bursátiles en un año
+SESIONES_POR_ANIO = 252
+
+#Función que genera una serie sintética de precios OHLCV, siguiendo un movimiento browniano geométrico para los precios de cierre
+#Fechas: Fechas (días hábiles) de la serie
+#Media: Media de los retornos logarítmicos diarios
+#Desviacion_Tipica: Desviación típica de los retornos logarítmicos diarios
+#PrecioInicial: Precio de cierre del día anterior a la primera fecha
+#Generador: Generador de números aleatorios de numpy
+#Devuelve un dataframe con las mismas columnas que los generados por extractor.py
+def get_serie_sintetica(fechas, media, desviacion_tipica, precioInicial, generador):
+    numDias = len(fechas)
+    cierres = precioInicial * np.exp(np.cumsum(generador.normal(media, desviacion_tipica, numDias)))
+    #La apertura es el cierre anterior con un pequeño salto, y el máximo y el mínimo envuelven a la apertura y al cierre
+    aperturas = np.concatenate(([precioInicial], cierres[:-1])) * np.exp(generador.normal(0, desviacion_tipica / 4, numDias))
+    maximos = np.maximum(aperturas, cierres) * np.exp(np.abs(generador.normal(0, desviacion_tipica / 2, numDias)))
+    minimos = np.minimum(aperturas, cierres) * np.exp(-np.abs(generador.normal(0, desviacion_tipica / 2, numDias)))
+    volumen = generador.integers(100000, 10000000, numDias)
+
+    data = pd.DataFrame({"Close": cierres, "High": maximos, "Low": minimos, "Open": aperturas, "Volume": volumen},
+                        index=pd.Index(fechas.strftime("%Y-%m-%d"), name="Date"))
+    #Misma precisión que la de los CSVs generados por extractor.py
+    return data.round({'Close': 2, 'High': 2, 'Low': 2, 'Open': 2})
+
+#Función que genera los CSVs de un conjunto de series sintéticas en el formato api_activo_fechaInicio_fechaFin.csv que esperan SeriePrecios y Cartera.
+#Todas las series comparten fechas, de forma que pueden juntarse en una misma cartera
+#RutaCSV: Directorio donde se guardan los CSVs
+#NumActivos: Número de series a generar
+#NumAnios: Número de años de cada serie
+#Semilla: Semilla del generador de números aleatorios, para poder reproducir las series
+#FechaInicio: Primera fecha de las series (datetime)
+#Devuelve la lista de nombres de los CSVs generados
+def generar_series_sinteticas(rutaCSV, numActivos, numAnios, semilla=None, fechaInicio=datetime(2000, 1, 3)):
+    generador = np.random.default_rng(semilla)
+    fechas = pd.bdate_range(start=fechaInicio, periods=numAnios * SESIONES_POR_ANIO)
+    sufijo = "_" + fechas[0].strftime("%d-%m-%Y") + "_" + fechas[-1].strftime("%d-%m-%Y") + ".csv"
+
+    archivos = []
+    for i in range(numActivos):
+        #Cada activo tiene su propia rentabilidad y volatilidad diarias, en rangos realistas
+        media = generador.uniform(-0.0002, 0.0008)
+        desviacionTipica = generador.uniform(0.008, 0.03)
+        precioInicial = generador.uniform(10, 500)
+        data = get_serie_sintetica(fechas, media, desviacionTipica, precioInicial, generador)
+
+        #El nombre del activo no puede contener guiones bajos, ya que separan los campos del nombre del archivo
+        archivo = API_SINTETICO + "_Activo" + str(i + 1).zfill(len(str(numActivos))) + sufijo
+        #Guardamos igual que save_csv, pero sin mostrar un mensaje por cada archivo
+        data.to_csv(rutaCSV + "\\" + archivo, index=True, encoding="latin-1")
+        archivos.append(archivo)
+
+    return archivos
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rutaCSV', type=str, required=True, help='Ruta de almacenamiento de los CSVs generados')
+    parser.add_argument('--numActivos', type=int, required=True, help='Número de series sintéticas a generar')
+    parser.add_argument('--numAnios', type=int, required=True, help='Número de años de cada serie')
+    parser.add_argument('--semilla', type=int, required=False, help='Semilla para poder reproducir las series')
+    args = parser.parse_args()
+
+    #La carpeta donde se quieran almacenar los CSVs generados debe existir
+    if not exists_route(args.rutaCSV):
+        print("La ruta de los CSV introducida no existe")
+        sys.exit(1)
+
+    #El número de activos y el de años deben ser positivos
+    if args.numActivos <= 0 or args.numAnios <= 0:
+        print("El número de activos y el de años deben ser positivos")
+        sys.exit(1)
+
+    archivos = generar_series_sinteticas(args.rutaCSV, args.numActivos, args.numAnios, args.semilla)
+    print("Se han generado " + str(len(archivos)) + " series sintéticas en " + args.rutaCSV)